@@ -0,0 +1,151 @@
+import numpy as np
+
+from Analysis.run_ida import _nonlinear_ida_record
+
+def _interp_crossing(pga_lo: float, pga_hi: float, drift_lo: float, drift_hi: float, threshold: float) -> float:
+    """Linear interpolation of the PGA at which the drift reaches threshold within a bracket."""
+    if not np.isfinite(drift_hi) or drift_hi <= drift_lo:
+        return pga_hi
+    return pga_lo + (threshold - drift_lo) / (drift_hi - drift_lo) * (pga_hi - pga_lo)
+
+def hunt_and_fill_ida(record_g: np.ndarray,
+                      model: dict,
+                      dt: float,
+                      drift_thresholds: np.ndarray,
+                      collapse_drift: float,
+                      pga_orig_g: float | None = None,
+                      pga_start: float = 0.05,
+                      pga_step: float = 0.1,
+                      step_increment: float = 0.05,
+                      pga_max: float = 5.0,
+                      pga_tol: float = 0.01,
+                      max_runs: int = 12,
+                      cache_dir: str | None = None
+                      ) -> dict:
+    """
+    Adaptive (hunt-and-fill) nonlinear IDA of one record.
+
+    Hunt: step the PGA up with a growing increment until collapse (max PIDR >= collapse_drift, a
+    non-converged step or a non-finite drift). Fill: bisect the bracket around the first crossing
+    of every damage-state threshold (and of collapse), always refining the widest open bracket,
+    until every bracket is narrower than pga_tol or max_runs analyses have been spent.
+
+    Args:
+        record_g (np.ndarray): Ground acceleration (g) (n_steps,).
+        model (dict): Structural model as for run_ida.
+        dt (float): Time step (s).
+        drift_thresholds (np.ndarray): Damage-state PIDR thresholds.
+        collapse_drift (float): PIDR treated as collapse; the hunt stops there.
+        pga_orig_g (float | None, optional): Unscaled PGA of the record (g). Defaults to max(|record|).
+        pga_start (float, optional): First PGA level (g). Defaults to 0.05.
+        pga_step, step_increment (float, optional): Initial hunt step and its growth per run (g).
+                                                     Defaults to 0.1 and 0.05.
+        pga_max (float, optional): Highest PGA the hunt will try (g). Defaults to 5.0.
+        pga_tol (float, optional): Target bracket width (g). Defaults to 0.01.
+        max_runs (int, optional): Analysis budget. Defaults to 12.
+        cache_dir (str | None, optional): Result cache folder; cached levels are not re-run
+                                          (see run_ida). Defaults to None.
+
+    Returns:
+        dict: A dictionary containing results:
+            'pga' (np.ndarray): Analysed PGA levels, sorted (g).
+            'maxPIDR' (np.ndarray): Max PIDR at each analysed level (inf for collapse).
+            'threshold_pga' (np.ndarray): PGA at the first crossing of each threshold; inf if it
+                                          was not reached below the hunt limit (censored).
+            'threshold_bracket' (np.ndarray): (n_thresholds x 2) final [lower, upper] brackets.
+            'collapse_pga' (float): PGA at collapse (inf if not reached).
+            'n_runs' (int): Number of nonlinear analyses run.
+    """
+    record_g = np.asarray(record_g, dtype=float).flatten()
+    if pga_orig_g is None:
+        pga_orig_g = np.max(np.abs(record_g))
+    pga_orig_g = pga_orig_g if pga_orig_g != 0 else 1e-6
+    thresholds = np.append(np.asarray(drift_thresholds, dtype=float).flatten(), collapse_drift)
+
+    runs = {} # pga -> max PIDR (inf for collapse)
+
+    def analyse(pga):
+        PIDR, converged, _, _ = _nonlinear_ida_record(record_g, np.array([pga / pga_orig_g]), model, dt,
+                                                      collapse_drift=collapse_drift, # Stop as soon as it collapses
+                                                      cache_dir=cache_dir)
+        drift = float(np.max(PIDR[0]))
+        runs[pga] = drift if converged[0] and np.isfinite(drift) and drift < collapse_drift else np.inf
+
+    # --- Hunt up ---
+    pga, step = pga_start, pga_step
+    while len(runs) < max_runs and pga <= pga_max:
+        analyse(pga)
+        if np.isinf(runs[pga]):
+            break
+        pga, step = pga + step, step + step_increment
+
+    # --- Fill: bisect the first-crossing bracket of every threshold ---
+    def bracket(threshold):
+        levels = sorted(runs)
+        drifts = [runs[p] for p in levels]
+        for i, d in enumerate(drifts):
+            if d >= threshold:
+                return (levels[i - 1] if i > 0 else 0.0), levels[i]
+        return None # Not reached within the hunted range
+
+    while len(runs) < max_runs:
+        open_brackets = [b for b in map(bracket, thresholds) if b is not None and b[1] - b[0] > pga_tol]
+        if not open_brackets:
+            break
+        lo, hi = max(open_brackets, key=lambda b: b[1] - b[0])
+        analyse(0.5 * (lo + hi))
+
+    # --- Threshold-crossing intensities ---
+    threshold_pga = np.full(len(thresholds), np.inf)
+    brackets = np.full((len(thresholds), 2), np.nan)
+    for i, threshold in enumerate(thresholds):
+        b = bracket(threshold)
+        if b is None:
+            continue
+        lo, hi = b
+        brackets[i] = b
+        drift_lo = runs.get(lo, 0.0)
+        threshold_pga[i] = _interp_crossing(lo, hi, drift_lo, runs[hi], threshold)
+
+    levels = np.array(sorted(runs))
+    return {
+        'pga': levels,
+        'maxPIDR': np.array([runs[p] for p in levels]),
+        'threshold_pga': threshold_pga[:-1],
+        'threshold_bracket': brackets[:-1],
+        'collapse_pga': float(threshold_pga[-1]),
+        'n_runs': len(runs),
+    }
+
+def run_adaptive_ida(records_g: np.ndarray,
+                     model: dict,
+                     dt: float,
+                     drift_thresholds: np.ndarray,
+                     collapse_drift: float,
+                     pga_orig_g: np.ndarray | None = None,
+                     **kwargs
+                     ) -> dict:
+    """
+    Hunt-and-fill IDA over a record suite.
+
+    Args:
+        records_g (np.ndarray): Ground accelerations (g), shape (n_records, n_steps).
+        model, dt, drift_thresholds, collapse_drift: As for hunt_and_fill_ida.
+        pga_orig_g (np.ndarray | None, optional): Unscaled PGA of each record (g). Defaults to max(|record|).
+        **kwargs: Passed to hunt_and_fill_ida (pga_start, pga_step, pga_tol, max_runs, cache_dir, ...).
+
+    Returns:
+        dict: 'threshold_pga' (n_records x n_thresholds), 'collapse_pga' (n_records,),
+              'n_runs' (n_records,) and 'records' (list of per-record hunt_and_fill_ida results).
+    """
+    records_g = np.atleast_2d(np.asarray(records_g, dtype=float))
+    if pga_orig_g is None:
+        pga_orig_g = np.max(np.abs(records_g), axis=1)
+    per_record = [hunt_and_fill_ida(rec, model, dt, drift_thresholds, collapse_drift, pga_orig_g=pga, **kwargs)
+                  for rec, pga in zip(records_g, pga_orig_g)]
+    return {
+        'threshold_pga': np.array([r['threshold_pga'] for r in per_record]),
+        'collapse_pga': np.array([r['collapse_pga'] for r in per_record]),
+        'n_runs': np.array([r['n_runs'] for r in per_record]),
+        'records': per_record,
+    }
@@ -0,0 +1,64 @@
+import numpy as np
+
+def is_sym_tridiagonal(A: np.ndarray) -> bool:
+    """True if A is a symmetric tridiagonal matrix (shear-building form)."""
+    return bool(np.allclose(A, A.T) and not np.any(np.triu(A, 2)))
+
+def tridiagonal_bands(A: np.ndarray, name: str = "Matrix") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Banded storage of a symmetric tridiagonal matrix.
+
+    Args:
+        A (np.ndarray): n x n symmetric tridiagonal matrix.
+        name (str, optional): Name used in the error message. Defaults to "Matrix".
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Diagonal (n,) and off-diagonal (n-1,) with A[i,i+1] = A[i+1,i] = off[i].
+    """
+    if not is_sym_tridiagonal(A):
+        raise ValueError(f"{name} must be symmetric tridiagonal (shear building form) for banded storage.")
+    return np.ascontiguousarray(np.diag(A), dtype=float), np.ascontiguousarray(np.diag(A, 1), dtype=float)
+
+def sym_tridiagonal_matvec(diag: np.ndarray, off: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """A @ x along the last axis of x for a symmetric tridiagonal A in banded storage (O(n))."""
+    y = diag * x
+    y[..., :-1] += off * x[..., 1:]
+    y[..., 1:] += off * x[..., :-1]
+    return y
+
+def factor_sym_tridiagonal(diag: np.ndarray, off: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    LDL^T factorization of symmetric tridiagonal matrices, vectorized over leading axes.
+
+    Args:
+        diag (np.ndarray): Diagonals (..., n).
+        off (np.ndarray): Off-diagonals (..., n-1).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Pivots d (..., n) and multipliers l (..., n-1), A = L D L^T.
+    """
+    diag = np.asarray(diag, dtype=float)
+    off = np.broadcast_to(off, diag.shape[:-1] + (diag.shape[-1] - 1,))
+    pivots = np.empty_like(diag)
+    mult = np.empty(off.shape)
+    pivots[..., 0] = diag[..., 0]
+    for i in range(1, diag.shape[-1]):
+        mult[..., i-1] = off[..., i-1] / pivots[..., i-1]
+        pivots[..., i] = diag[..., i] - mult[..., i-1] * off[..., i-1]
+    return pivots, mult
+
+def solve_factored_sym_tridiagonal(pivots: np.ndarray, mult: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    """Solves A x = rhs (last axis) given factor_sym_tridiagonal(A); O(n) per right-hand side."""
+    x = np.array(rhs, dtype=float)
+    n = x.shape[-1]
+    for i in range(1, n): # Forward substitution with L
+        x[..., i] -= mult[..., i-1] * x[..., i-1]
+    x /= pivots
+    for i in range(n - 2, -1, -1): # Back substitution with L^T
+        x[..., i] -= mult[..., i] * x[..., i+1]
+    return x
+
+def solve_sym_tridiagonal(diag: np.ndarray, off: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    """Thomas algorithm for symmetric tridiagonal systems, vectorized over leading axes."""
+    pivots, mult = factor_sym_tridiagonal(diag, off)
+    return solve_factored_sym_tridiagonal(pivots, mult, rhs)
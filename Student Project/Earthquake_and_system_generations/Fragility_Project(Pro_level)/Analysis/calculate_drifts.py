@@ -0,0 +1,170 @@
+import warnings
+
+import numpy as np
+
+from Analysis.hysteresis import G_ACCEL, bilinear_story_response
+
+def story_drifts(u: np.ndarray) -> np.ndarray:
+    """Interstory drifts along the last axis (story i: u[i] - u[i-1])."""
+    delta = np.array(u, dtype=float) # Copy
+    delta[..., 1:] -= u[..., :-1]
+    return delta
+
+def drift_ratios_from_peaks(peak_abs: np.ndarray, H: np.ndarray) -> tuple:
+    """
+    PIDR per story and maxPIDR from peak absolute interstory drifts of shape (..., num_dof).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: PIDR per story (..., num_dof) and maxPIDR (...).
+    """
+    with warnings.catch_warnings(): # All-NaN slices are reported as NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        H_safe = np.where(np.abs(H) > 1e-9, H, np.nan)
+        PIDR = peak_abs / H_safe
+        maxPIDR = np.nanmax(PIDR, axis=-1)
+    return PIDR, maxPIDR
+
+def peak_drift_ratios(disp: np.ndarray, H: np.ndarray) -> tuple:
+    """
+    Peak interstory drift ratios from displacement histories of shape (..., n_steps, num_dof).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: PIDR per story (..., num_dof) and maxPIDR (...).
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        peak_abs = np.nanmax(np.abs(story_drifts(disp)), axis=-2)
+    return drift_ratios_from_peaks(peak_abs, H)
+
+def _last_finite_step(values: np.ndarray) -> np.ndarray:
+    """Values of the last step that is finite in every DOF, from (..., n_steps, num_dof); NaN if none."""
+    finite = np.all(np.isfinite(values), axis=-1) # (..., n_steps)
+    n_steps = finite.shape[-1]
+    last = n_steps - 1 - np.argmax(finite[..., ::-1], axis=-1) # Histories stopped early end in NaN
+    out = np.take_along_axis(values, last[..., np.newaxis, np.newaxis], axis=-2)[..., 0, :]
+    return np.where(np.any(finite, axis=-1)[..., np.newaxis], out, np.nan)
+
+def _floor_accelerations(disp: np.ndarray, dt: float) -> np.ndarray:
+    """
+    Relative floor accelerations (m/s^2) from displacement histories (..., n_steps, num_dof).
+
+    For the average acceleration Newmark method the central second difference of the displacement
+    equals (a[n-1] + 2 a[n] + a[n+1]) / 4, the solver's acceleration smoothed over one step; the
+    first and last steps repeat their neighbours.
+    """
+    accel = np.empty_like(disp)
+    accel[..., 1:-1, :] = (disp[..., 2:, :] - 2 * disp[..., 1:-1, :] + disp[..., :-2, :]) / dt**2
+    accel[..., 0, :] = accel[..., 1, :]
+    accel[..., -1, :] = accel[..., -2, :]
+    return accel
+
+def _smooth_one_step(accel_g: np.ndarray) -> np.ndarray:
+    """(a[n-1] + 2 a[n] + a[n+1]) / 4 along the last axis, ends as in _floor_accelerations."""
+    out = np.empty_like(accel_g)
+    out[..., 1:-1] = (accel_g[..., :-2] + 2 * accel_g[..., 1:-1] + accel_g[..., 2:]) / 4
+    out[..., 0] = out[..., 1]
+    out[..., -1] = out[..., -2]
+    return out
+
+def cumulative_plastic_drift(drifts: np.ndarray, model: dict) -> np.ndarray:
+    """
+    Cumulative plastic interstory drift, sum(|d_plastic increments|), per story.
+
+    The bilinear hysteresis of the solvers (Analysis.hysteresis) is replayed on the drift histories (one pass over
+    the steps, vectorized over records and stories); the plastic part of a drift increment is the
+    increment minus the elastic part, delta_fs / k_story. Non-finite steps (after an early stop)
+    add nothing and leave the hysteretic state as it was.
+
+    Args:
+        drifts (np.ndarray): Interstory drift histories (m) (..., n_steps, num_dof).
+        model (dict): Structural model with 'k_story', 'Fy' and 'alpha'
+                      (e.g. from Analysis.shear_building.define_shear_building).
+
+    Returns:
+        np.ndarray: Cumulative plastic drift (m) (..., num_dof).
+    """
+    k_story = np.asarray(model['k_story'], dtype=float)
+    Fy = np.asarray(model['Fy'], dtype=float)
+    delta_y = Fy / k_story
+    drifts = np.asarray(drifts, dtype=float)
+    shape = drifts.shape[:-2] + drifts.shape[-1:]
+
+    fs = np.zeros(shape)
+    peak_pos = np.zeros(shape)
+    peak_neg = np.zeros(shape)
+    delta_prev = np.zeros(shape)
+    total = np.zeros(shape)
+    for j in range(1, drifts.shape[-2]):
+        ok = np.isfinite(drifts[..., j, :])
+        delta = np.where(ok, drifts[..., j, :], delta_prev)
+        fs_new, _ = bilinear_story_response(delta, delta_prev, fs, peak_pos, peak_neg, k_story, delta_y, Fy, model['alpha'])
+        total += np.where(ok, np.abs((delta - delta_prev) - (fs_new - fs) / k_story), 0.0)
+        np.maximum(peak_pos, delta, out=peak_pos)
+        np.minimum(peak_neg, delta, out=peak_neg)
+        fs, delta_prev = np.where(ok, fs_new, fs), delta
+    return total
+
+def calculate_drifts(disp: np.ndarray,
+                     H: np.ndarray,
+                     dt: float | None = None,
+                     accel_gm_g: np.ndarray | None = None,
+                     model: dict | None = None
+                     ) -> dict:
+    """
+    Engineering demand parameters of batched displacement histories.
+
+    Interstory drifts are formed once and every EDP is reduced from them (or from the floor
+    accelerations) along the step axis, vectorized over records and stories. Histories that
+    stopped early (NaN after the stop, as from run_time_history_batch) are reduced up to the stop.
+
+    Args:
+        disp (np.ndarray): Relative floor displacements (m), (n_steps, num_dof) or
+                           (n_records, n_steps, num_dof), full (not decimated) histories.
+        H (np.ndarray): Story heights (m) (num_dof,).
+        dt (float | None, optional): Time step (s); with accel_gm_g enables 'PFA'. Defaults to None.
+        accel_gm_g (np.ndarray | None, optional): Ground acceleration (g) of each record, scaled as
+                                                  analysed, (n_steps,) or (n_records, n_steps). Defaults to None.
+        model (dict | None, optional): Structural model ('k_story', 'Fy', 'alpha'); enables 'CPDR'
+                                       (nonlinear analyses). Defaults to None.
+
+    Returns:
+        dict: A dictionary containing results (leading axes as disp without the step axis):
+            'PIDR' (np.ndarray): Peak interstory drift ratio per story (..., num_dof).
+            'maxPIDR' (np.ndarray): Maximum PIDR over the stories (...).
+            'RIDR' (np.ndarray): Residual interstory drift ratio per story, |drift| / H at the
+                                 last step (..., num_dof).
+            'maxRIDR' (np.ndarray): Maximum RIDR over the stories (...).
+            'PFA' (np.ndarray | None): Peak absolute floor acceleration per floor (g) (..., num_dof),
+                                       estimated from the displacements: the second difference is
+                                       the solver's acceleration averaged over one step, so this is
+                                       a lower bound (typically 0.2-2% low at dt = 0.01 s). The
+                                       exact peaks are the solvers' own 'PFA' (run_time_history,
+                                       run_time_history_batch).
+            'maxPFA' (np.ndarray | None): Maximum PFA over the floors (g) (...).
+            'CPDR' (np.ndarray | None): Cumulative plastic drift / H per story (..., num_dof).
+    """
+    disp = np.asarray(disp, dtype=float)
+    H = np.asarray(H, dtype=float).flatten()
+    if disp.ndim not in (2, 3) or disp.shape[-1] != H.shape[0]:
+        raise ValueError("disp must have shape (n_steps, num_dof) or (n_records, n_steps, num_dof) matching H.")
+    drifts = story_drifts(disp)
+
+    with warnings.catch_warnings(): # All-NaN slices are reported as NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        PIDR, maxPIDR = drift_ratios_from_peaks(np.nanmax(np.abs(drifts), axis=-2), H)
+        RIDR, maxRIDR = drift_ratios_from_peaks(np.abs(_last_finite_step(drifts)), H)
+
+        PFA = maxPFA = None
+        if dt is not None and accel_gm_g is not None:
+            accel_gm_g = np.asarray(accel_gm_g, dtype=float)
+            if accel_gm_g.shape != disp.shape[:-1]: raise ValueError("accel_gm_g must have shape disp.shape[:-1].")
+            # Absolute (g): the ground motion is smoothed like the relative acceleration, so that the
+            # sum is the solver's absolute acceleration smoothed over one step (the relative part alone
+            # is nearly -ground acceleration at high frequencies, and the two must cancel)
+            accel_abs = _floor_accelerations(disp, dt) / G_ACCEL + _smooth_one_step(accel_gm_g)[..., np.newaxis]
+            PFA = np.nanmax(np.abs(accel_abs), axis=-2)
+            maxPFA = np.nanmax(PFA, axis=-1)
+
+    CPDR = cumulative_plastic_drift(drifts, model) / H if model is not None else None
+    return {'PIDR': PIDR, 'maxPIDR': maxPIDR, 'RIDR': RIDR, 'maxRIDR': maxRIDR,
+            'PFA': PFA, 'maxPFA': maxPFA, 'CPDR': CPDR}
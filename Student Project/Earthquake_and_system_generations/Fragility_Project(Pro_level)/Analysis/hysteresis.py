@@ -0,0 +1,33 @@
+import numpy as np
+
+G_ACCEL = 9.81 # m/s^2
+
+def bilinear_story_response(dk, dk_prev, fs_prev, d_max, d_min, k_init_stories, delta_y, Fy, alpha):
+    """
+    Vectorized bilinear hysteresis rule shared by every solver path (scalar form in nonlinear_kernel).
+
+    All drift/force arguments broadcast against each other (e.g. (n_records, num_dof)).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Story forces fs and tangent stiffnesses kt.
+    """
+    k_post = alpha * k_init_stories
+    on_backbone = (dk > d_max) | (dk < d_min) # Loading beyond previous peaks
+    kt = np.where(on_backbone, k_post, k_init_stories)
+    fs_trial = fs_prev + kt * (dk - dk_prev)
+
+    f_backbone = np.where(np.abs(dk) <= delta_y, k_init_stories * dk,
+                          np.where(dk > delta_y, Fy + k_post * (dk - delta_y),
+                                   -Fy + k_post * (dk + delta_y)))
+
+    # Unloading/reloading must not exceed the backbone
+    fs_elastic = np.where(dk > dk_prev, np.minimum(fs_trial, f_backbone),
+                          np.where(dk < dk_prev, np.maximum(fs_trial, f_backbone), fs_prev))
+    fs = np.where(on_backbone, f_backbone, fs_elastic)
+    return fs, kt
+
+def story_to_global_force(fs: np.ndarray) -> np.ndarray:
+    """Global restoring force from story forces along the last axis (floor i takes fs[i] - fs[i+1])."""
+    Fs = fs.copy()
+    Fs[..., :-1] -= fs[..., 1:]
+    return Fs
@@ -0,0 +1,151 @@
+import os
+
+import numpy as np
+
+# An IDA results store is a folder with one sub-folder per column and a manifest:
+#   <column>/<chunk>.npy  - the column's values for the rows of one appended chunk
+#   chunks.npy            - row count of every committed chunk
+# One row is one IDA point (record, PGA level, model type). A chunk counts only once the manifest
+# lists it, so a crash during an append leaves the store readable and the chunk is rewritten.
+# 'fingerprint' identifies the inputs the point was computed from (see run_ida), so that a rerun
+# with another model or other options does not take it for its own.
+IDA_COLUMNS = ('record_id', 'pga', 'model_type', 'PIDR', 'MIDR', 'converged', 'failed_steps', 'nr_iterations',
+               'fingerprint')
+MANIFEST_FILE = "chunks.npy"
+# Values read from chunks written before these columns existed: -1 (unknown count), '' (unknown inputs)
+LATE_COLUMNS = {'failed_steps': -1, 'nr_iterations': -1, 'fingerprint': ''}
+
+def _chunk_path(path: str, column: str, chunk: int) -> str:
+    return os.path.join(path, column, f"{chunk:06d}.npy")
+
+def _read_manifest(path: str) -> np.ndarray:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    return np.load(manifest_path) if os.path.exists(manifest_path) else np.array([], dtype=np.int64)
+
+def _save_atomic(file_path: str, array: np.ndarray):
+    tmp_path = file_path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, file_path)
+
+def append_ida_results(path: str,
+                       record_ids: list,
+                       pga_levels: np.ndarray,
+                       model_type: str,
+                       PIDR: np.ndarray,
+                       converged: np.ndarray | None = None,
+                       failed_steps: np.ndarray | None = None,
+                       nr_iterations: np.ndarray | None = None,
+                       fingerprints: list | None = None):
+    """
+    Appends the IDA points of one or more records to an IDA results store as one chunk.
+
+    Args:
+        path (str): IDA results store folder (created if needed).
+        record_ids (list): Record identifiers (n_records,).
+        pga_levels (np.ndarray): PGA levels (g) (n_levels,).
+        model_type (str): 'linear' or 'nonlinear'.
+        PIDR (np.ndarray): PIDR per story (n_records x n_levels x DOF).
+        converged (np.ndarray | None, optional): Convergence flags (n_records x n_levels).
+                                                 Defaults to all True.
+        failed_steps (np.ndarray | None, optional): Non-converged NR steps per point
+                                                    (n_records x n_levels). Defaults to 0.
+        nr_iterations (np.ndarray | None, optional): Total NR iterations per point
+                                                     (n_records x n_levels). Defaults to 0.
+        fingerprints (list | None, optional): Hash of the inputs of each record's results (n_records,).
+                                              Defaults to '' (unknown).
+    """
+    record_ids = [str(rid) for rid in record_ids]
+    pga_levels = np.asarray(pga_levels, dtype=float).flatten()
+    n_records, n_levels = len(record_ids), len(pga_levels)
+    PIDR = np.asarray(PIDR, dtype=float).reshape(n_records, n_levels, -1)
+    converged = (np.ones((n_records, n_levels), dtype=bool) if converged is None
+                 else np.asarray(converged, dtype=bool).reshape(n_records, n_levels))
+    counts = {}
+    for column, values in (('failed_steps', failed_steps), ('nr_iterations', nr_iterations)):
+        counts[column] = (np.zeros(n_records * n_levels, dtype=np.int64) if values is None
+                          else np.asarray(values, dtype=np.int64).reshape(n_records * n_levels))
+
+    columns = {
+        'record_id': np.repeat(np.array(record_ids, dtype=str), n_levels),
+        'pga': np.tile(pga_levels, n_records),
+        'model_type': np.full(n_records * n_levels, model_type, dtype=f"<U{len(model_type)}"),
+        'PIDR': PIDR.reshape(n_records * n_levels, -1),
+        'MIDR': np.max(PIDR, axis=-1).ravel(),
+        'converged': converged.ravel(),
+        **counts,
+        'fingerprint': np.repeat(np.array([''] * n_records if fingerprints is None else fingerprints, dtype=str),
+                                 n_levels),
+    }
+
+    manifest = _read_manifest(path)
+    chunk = len(manifest)
+    for column, values in columns.items():
+        os.makedirs(os.path.join(path, column), exist_ok=True)
+        _save_atomic(_chunk_path(path, column, chunk), values)
+    _save_atomic(os.path.join(path, MANIFEST_FILE), np.append(manifest, n_records * n_levels).astype(np.int64))
+
+def read_ida_results(path: str, columns: tuple | None = None, model_type: str | None = None) -> dict:
+    """
+    Reads columns of an IDA results store; only the requested columns are loaded.
+
+    Args:
+        path (str): IDA results store folder.
+        columns (tuple | None, optional): Columns to read. Defaults to IDA_COLUMNS.
+        model_type (str | None, optional): Keep only rows of this model type. Defaults to None (all).
+
+    Returns:
+        dict: Column name -> values, one entry per row (PIDR: n_rows x DOF).
+    """
+    columns = IDA_COLUMNS if columns is None else tuple(columns)
+    unknown = set(columns) - set(IDA_COLUMNS)
+    if unknown: raise ValueError(f"Unknown IDA result columns: {sorted(unknown)}.")
+    manifest = _read_manifest(path)
+    needed = columns + (('model_type',) if model_type is not None and 'model_type' not in columns else ())
+
+    out = {}
+    for column in needed:
+        parts = [np.load(_chunk_path(path, column, chunk))
+                 if column not in LATE_COLUMNS or os.path.exists(_chunk_path(path, column, chunk))
+                 else np.full(n_rows, LATE_COLUMNS[column])
+                 for chunk, n_rows in enumerate(manifest)]
+        out[column] = np.concatenate(parts) if parts else np.array([])
+    if model_type is not None:
+        keep = out['model_type'] == model_type
+        out = {column: out[column][keep] for column in columns}
+    return out
+
+def ida_matrix(path: str, model_type: str = 'nonlinear', column: str = 'MIDR') -> dict:
+    """
+    Pivots one column of an IDA results store to (record x PGA level), as run_ida returns it.
+
+    Records keep the order in which they were first appended; levels are sorted. Missing points
+    are NaN (False for 'converged', -1 for the solver counters, '' for 'fingerprint'); a point
+    appended twice keeps its latest value.
+
+    Args:
+        path (str): IDA results store folder.
+        model_type (str, optional): 'linear' or 'nonlinear'. Defaults to 'nonlinear'.
+        column (str, optional): 'MIDR', 'PIDR', 'converged', 'failed_steps', 'nr_iterations' or
+                                'fingerprint'. Defaults to 'MIDR'.
+
+    Returns:
+        dict: 'record_ids' (list), 'PGA_levels' (np.ndarray) and column
+              (n_records x n_levels [x DOF]).
+    """
+    if column not in ('MIDR', 'PIDR', 'converged') + tuple(LATE_COLUMNS):
+        raise ValueError("column must be 'MIDR', 'PIDR', 'converged', 'failed_steps', 'nr_iterations' or 'fingerprint'.")
+    rows = read_ida_results(path, ('record_id', 'pga', column), model_type=model_type)
+    unique_ids, first, inverse = np.unique(rows['record_id'], return_index=True, return_inverse=True)
+    order = np.argsort(first) # First-appended order
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    record_ids = unique_ids[order]
+    pga_levels = np.unique(rows['pga'])
+
+    r = rank[inverse]
+    c = np.searchsorted(pga_levels, rows['pga'])
+    values = rows[column]
+    fill = False if column == 'converged' else LATE_COLUMNS[column] if column in LATE_COLUMNS else np.nan
+    matrix = np.full((len(record_ids), len(pga_levels)) + values.shape[1:], fill, dtype=values.dtype)
+    matrix[r, c] = values # Later rows overwrite earlier ones
+    return {'record_ids': record_ids.tolist(), 'PGA_levels': pga_levels, column: matrix}
@@ -0,0 +1,75 @@
+import numpy as np
+
+from Analysis.run_time_history import run_time_history_batch
+
+def run_linear_ida(records_g: np.ndarray | list,
+                   pga_levels: np.ndarray,
+                   M: np.ndarray,
+                   K: np.ndarray,
+                   dt: float,
+                   H: np.ndarray,
+                   alpha_M: float,
+                   beta_K: float,
+                   K_init: np.ndarray | None = None,
+                   pga_orig_g: np.ndarray | None = None,
+                   chunk_size: int = 256
+                   ) -> dict:
+    """
+    Linear IDA using scale invariance: each record is analysed once, every PGA level by multiplication.
+
+    A linear system starting at rest responds in exact proportion to the ground motion scale
+    factor, so the PIDR at PGA level x is PIDR_unit * x / PGA_orig. Each record is solved once
+    with the modal recurrence path of run_time_history_batch (linear_method='modal'). Records of
+    different lengths (e.g. from a record store) are batched by length, each over its own duration.
+
+    Args:
+        records_g (np.ndarray | list): Ground accelerations (g), shape (n_records, n_steps), or a list
+                                       of 1-D records of any lengths.
+        pga_levels (np.ndarray): Target PGA levels (g), e.g. np.arange(0.05, 1.55, 0.05).
+        M, K, dt, H, alpha_M, beta_K, K_init: As for run_time_history (linear model).
+        pga_orig_g (np.ndarray | None, optional): Unscaled PGA of each record (g).
+                                                 Defaults to max(|record|).
+        chunk_size (int, optional): Records solved per batch (bounds memory). Defaults to 256.
+
+    Returns:
+        dict: A dictionary containing results:
+            'PGA_levels' (np.ndarray): PGA levels (g) (n_levels,).
+            'PIDR_unit' (np.ndarray): PIDR per story at the record's unscaled PGA (n_records x DOF).
+            'PIDR' (np.ndarray): PIDR per story at every level (n_records x n_levels x DOF).
+            'MIDR_Linear' (np.ndarray): Maximum PIDR at every level (n_records x n_levels).
+    """
+    if isinstance(records_g, (list, tuple)):
+        records_g = [np.asarray(record, dtype=float).ravel() for record in records_g]
+    else:
+        records_g = np.atleast_2d(np.asarray(records_g, dtype=float))
+    pga_levels = np.asarray(pga_levels, dtype=float).flatten()
+    n_records = len(records_g)
+
+    if pga_orig_g is None:
+        pga_orig_g = np.array([np.max(np.abs(record)) for record in records_g])
+    pga_orig_g = np.asarray(pga_orig_g, dtype=float).flatten()
+    if pga_orig_g.shape != (n_records,): raise ValueError("pga_orig_g must have one entry per record.")
+    pga_orig_g = np.where(pga_orig_g == 0, 1e-6, pga_orig_g) # Avoid division by zero
+
+    by_length = {} # A batch needs one length; zero padding would add free vibration to shorter records
+    for i, record in enumerate(records_g):
+        by_length.setdefault(len(record), []).append(i)
+    PIDR_unit = np.empty((n_records, M.shape[0]))
+    for rows in by_length.values():
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            batch = (records_g[chunk[0]:chunk[-1] + 1] if isinstance(records_g, np.ndarray) # Single group, in order
+                     else np.stack([records_g[i] for i in chunk]))
+            results = run_time_history_batch('linear', M, K, dt, batch, H, alpha_M, beta_K,
+                                             K_init=K_init, linear_method='modal', record='peaks')
+            PIDR_unit[chunk] = results['PIDR']
+
+    scale = pga_levels[np.newaxis, :] / pga_orig_g[:, np.newaxis] # (n_records, n_levels)
+    PIDR = PIDR_unit[:, np.newaxis, :] * scale[:, :, np.newaxis]
+
+    return {
+        'PGA_levels': pga_levels,
+        'PIDR_unit': PIDR_unit,
+        'PIDR': PIDR,
+        'MIDR_Linear': np.max(PIDR, axis=-1),
+    }
@@ -0,0 +1,257 @@
+import math
+import numpy as np
+
+from Analysis.banded import tridiagonal_bands
+from numba_compat import njit
+
+
+@njit(cache=True)
+def _bilinear_story(dk, dk_prev, fs_prev, d_max, d_min, ki, dy, fy, alpha):
+    """Bilinear hysteresis for one story (scalar form of hysteresis.bilinear_story_response). Returns (fs, kt)."""
+    k_post = alpha * ki
+    on_backbone = dk > d_max or dk < d_min
+    kt = k_post if on_backbone else ki
+
+    if abs(dk) <= dy:
+        f_backbone = ki * dk
+    elif dk > dy:
+        f_backbone = fy + k_post * (dk - dy)
+    else:
+        f_backbone = -fy + k_post * (dk + dy)
+
+    if on_backbone:
+        fs = f_backbone
+    elif dk > dk_prev:
+        fs = min(fs_prev + kt * (dk - dk_prev), f_backbone)
+    elif dk < dk_prev:
+        fs = max(fs_prev + kt * (dk - dk_prev), f_backbone)
+    else:
+        fs = fs_prev
+    return fs, kt
+
+
+@njit(cache=True)
+def _solve_sym_tridiagonal(diag, off, rhs, out, work):
+    """Thomas algorithm for A x = rhs with A[i,i] = diag[i], A[i,i+1] = A[i+1,i] = off[i]."""
+    n = diag.shape[0]
+    pivot = diag[0]
+    out[0] = rhs[0] / pivot
+    for i in range(1, n):
+        work[i - 1] = off[i - 1] / pivot
+        pivot = diag[i] - off[i - 1] * work[i - 1]
+        out[i] = (rhs[i] - off[i - 1] * out[i - 1]) / pivot
+    for i in range(n - 2, -1, -1):
+        out[i] -= work[i] * out[i + 1]
+
+
+@njit(cache=True)
+def _story_state(u, u_prev, vel_prev, acc_prev, delta_prev, story_force, peak_pos, peak_neg,
+                 k_stories, delta_y, Fy, alpha, a0, a1, a2, a7, a8, a9, fs, kt, v, a):
+    """Story forces/tangents and Newmark velocity/acceleration for trial displacement u."""
+    n = u.shape[0]
+    for i in range(n):
+        dk = u[i] - u[i - 1] if i > 0 else u[i]
+        fs[i], kt[i] = _bilinear_story(dk, delta_prev[i], story_force[i], peak_pos[i], peak_neg[i],
+                                       k_stories[i], delta_y[i], Fy[i], alpha)
+        du = u[i] - u_prev[i]
+        v[i] = a7 * du - a8 * vel_prev[i] - a9 * acc_prev[i]
+        a[i] = a0 * du - a1 * vel_prev[i] - a2 * acc_prev[i]
+
+
+@njit(cache=True)
+def nonlinear_newmark_kernel(accel_gm, m_diag, m_off, c_diag, c_off, k_stories, delta_y, Fy, alpha,
+                             a0, a1, a2, a7, a8, a9, tol_nr, max_iter_nr, inv_H, stop_drift, record_every):
+    """
+    Newmark/Newton-Raphson integration of a bilinear shear building with tridiagonal M and C.
+
+    Same algorithm as the nonlinear branch of run_time_history (including acceptance of the
+    last iterate when NR does not converge), with banded storage and an O(n) tridiagonal solve.
+    Only the current state is kept; peak drifts and floor accelerations are tracked on the fly.
+
+    Args:
+        accel_gm (np.ndarray): Ground acceleration (m/s^2) (n_steps,).
+        m_diag, m_off, c_diag, c_off (np.ndarray): Diagonal (n,) and off-diagonal (n-1,) bands of M and C.
+        k_stories, delta_y, Fy (np.ndarray): Story stiffness, yield drift and yield force (n,).
+        alpha (float): Post-yield stiffness ratio.
+        a0, a1, a2, a7, a8, a9 (float): Newmark constants (see _newmark_constants).
+        tol_nr (float), max_iter_nr (int): Newton-Raphson tolerance and iteration limit.
+        inv_H (np.ndarray): 1 / story height (n,).
+        stop_drift (float): Stop once any story drift ratio reaches this value or the
+                            displacement becomes non-finite (np.inf: never stop early).
+        record_every (int): Store the displacement of every record_every-th step (0: none).
+
+    Returns:
+        tuple: recorded displacements (n_recorded x n), displacement of the last step (n,), peak
+               absolute story drifts (n,), peak absolute floor accelerations (relative plus ground,
+               m/s^2) (n,), the number of non-converged steps, the first of them
+               (-1 if none), the step at which integration stopped early (-1 if it ran to the end)
+               and the total number of NR iterations (residual evaluations, as counted by
+               run_time_history's solver_stats).
+    """
+    n_steps = accel_gm.shape[0]
+    n = k_stories.shape[0]
+    n_rec = (n_steps - 1) // record_every + 1 if record_every > 0 else 0
+    disp = np.zeros((n_rec, n))
+    peak_abs = np.zeros(n)
+    peak_acc = np.zeros(n) # a(0) + accel_gm[0] = 0
+    n_failed = 0
+    first_failed = -1
+    n_iter = 0
+
+    m_iota = m_diag.copy() # Row sums of M (M @ influence vector)
+    for i in range(n - 1):
+        m_iota[i] += m_off[i]
+        m_iota[i + 1] += m_off[i]
+
+    u = np.zeros(n) # Converged state of the current step
+    v = np.zeros(n)
+    a = np.zeros(n)
+    for i in range(n):
+        a[i] = -accel_gm[0]
+
+    story_force = np.zeros(n)
+    peak_pos = np.zeros(n)
+    peak_neg = np.zeros(n)
+    delta_prev = np.zeros(n)
+    u_k = np.zeros(n)
+    fs = np.zeros(n)
+    kt = np.zeros(n)
+    v_k = np.zeros(n)
+    a_k = np.zeros(n)
+    residual = np.zeros(n)
+    kd = np.zeros(n)
+    ko = np.zeros(max(n - 1, 1))
+    delta_u = np.zeros(n)
+    work = np.zeros(n)
+    stop_step = -1
+
+    for j in range(n_steps - 1):
+        for i in range(n):
+            u_k[i] = u[i]
+            delta_prev[i] = u[i] - u[i - 1] if i > 0 else u[i]
+
+        converged = False
+        for iter_nr in range(max_iter_nr):
+            n_iter += 1
+            _story_state(u_k, u, v, a, delta_prev, story_force, peak_pos, peak_neg,
+                         k_stories, delta_y, Fy, alpha, a0, a1, a2, a7, a8, a9, fs, kt, v_k, a_k)
+
+            # R = P_ext - Fs - C @ v - M @ a
+            finite = True
+            norm_sq = 0.0
+            for i in range(n):
+                r = -m_iota[i] * accel_gm[j + 1] - fs[i] - c_diag[i] * v_k[i] - m_diag[i] * a_k[i]
+                if i < n - 1:
+                    r += fs[i + 1] - c_off[i] * v_k[i + 1] - m_off[i] * a_k[i + 1]
+                if i > 0:
+                    r -= c_off[i - 1] * v_k[i - 1] + m_off[i - 1] * a_k[i - 1]
+                residual[i] = r
+                if not math.isfinite(r):
+                    finite = False
+                norm_sq += r * r
+            if not finite:
+                break
+            if math.sqrt(norm_sq) < tol_nr:
+                converged = True
+                break
+
+            # K_eff_T = K_T + a0*M + a7*C (tridiagonal)
+            for i in range(n):
+                kd[i] = kt[i] + a0 * m_diag[i] + a7 * c_diag[i]
+                if i < n - 1:
+                    kd[i] += kt[i + 1]
+                    ko[i] = -kt[i + 1] + a0 * m_off[i] + a7 * c_off[i]
+            _solve_sym_tridiagonal(kd, ko, residual, delta_u, work)
+
+            finite = True
+            for i in range(n):
+                if not math.isfinite(delta_u[i]):
+                    finite = False
+            if not finite:
+                break
+            for i in range(n):
+                u_k[i] += delta_u[i]
+
+        if not converged: # Accept the last iterate and its hysteretic state
+            n_failed += 1
+            if first_failed < 0:
+                first_failed = j + 1
+            _story_state(u_k, u, v, a, delta_prev, story_force, peak_pos, peak_neg,
+                         k_stories, delta_y, Fy, alpha, a0, a1, a2, a7, a8, a9, fs, kt, v_k, a_k)
+
+        decided = False
+        for i in range(n):
+            u[i] = u_k[i]
+            v[i] = v_k[i]
+            a[i] = a_k[i]
+            story_force[i] = fs[i]
+            drift = u_k[i] - u_k[i - 1] if i > 0 else u_k[i]
+            peak_pos[i] = max(peak_pos[i], drift)
+            peak_neg[i] = min(peak_neg[i], drift)
+            if abs(drift) > peak_abs[i]: # NaN drifts are skipped, as np.nanmax does
+                peak_abs[i] = abs(drift)
+            if abs(a_k[i] + accel_gm[j + 1]) > peak_acc[i]:
+                peak_acc[i] = abs(a_k[i] + accel_gm[j + 1])
+            if stop_drift < math.inf and (not math.isfinite(drift) or abs(drift) * inv_H[i] >= stop_drift):
+                decided = True # Early termination
+        if record_every > 0 and (j + 1) % record_every == 0:
+            disp[(j + 1) // record_every] = u
+        if decided:
+            stop_step = j + 1
+            break
+
+    return disp, u, peak_abs, peak_acc, n_failed, first_failed, stop_step, n_iter
+
+
+def run_nonlinear_kernel(model: dict,
+                         accel_gm: np.ndarray,
+                         H: np.ndarray,
+                         tol_nr: float = 1e-5,
+                         max_iter_nr: int = 50,
+                         stop_drift: float = np.inf,
+                         record_every: int = 1
+                         ) -> dict:
+    """
+    Runs nonlinear_newmark_kernel for a model prepared by run_time_history._prepare_model.
+
+    Args:
+        model (dict): Prepared nonlinear model.
+        accel_gm (np.ndarray): Ground acceleration (m/s^2) (n_steps,).
+        H (np.ndarray): Story heights (m).
+        tol_nr (float, optional): Newton-Raphson tolerance. Defaults to 1e-5.
+        max_iter_nr (int, optional): Newton-Raphson iteration limit. Defaults to 50.
+        stop_drift (float, optional): Drift ratio at which to stop early. Defaults to np.inf.
+        record_every (int, optional): Keep the displacement of every record_every-th step
+                                      (1: full history, 0: peaks only). Defaults to 1.
+
+    Returns:
+        dict: A dictionary containing results:
+            'disp' (np.ndarray): Recorded displacements (m) (n_recorded x DOF), truncated at the stop.
+            'final_disp' (np.ndarray): Displacement of the last integrated step (m) (DOF,).
+            'peak_drift' (np.ndarray): Peak absolute interstory drift per story (m) (DOF,).
+            'peak_accel' (np.ndarray): Peak absolute floor acceleration per floor (m/s^2) (DOF,).
+            'n_failed' (int): Number of non-converged NR steps.
+            'nr_iterations' (int): Total NR iterations over all steps.
+            'first_failed' (int | None): First non-converged step.
+            'stop_step' (int | None): Step at which integration stopped early.
+    """
+    m_diag, m_off = tridiagonal_bands(model['M'], "M")
+    c_diag, c_off = tridiagonal_bands(model['C'], "C")
+    a0, a1, a2, a7, a8, a9 = model['newmark']
+    inv_H = 1.0 / np.asarray(H, dtype=float).flatten()
+    disp, final_disp, peak_drift, peak_accel, n_failed, first_failed, stop_step, n_iter = nonlinear_newmark_kernel(
+        np.ascontiguousarray(accel_gm, dtype=float).ravel(), m_diag, m_off, c_diag, c_off,
+        model['k_stories'], model['delta_y'], model['Fy'], float(model['alpha']),
+        a0, a1, a2, a7, a8, a9, tol_nr, max_iter_nr, inv_H, float(stop_drift), int(record_every))
+    if stop_step >= 0 and record_every > 0:
+        disp = disp[:stop_step // record_every + 1]
+    return {
+        'disp': disp,
+        'final_disp': final_disp,
+        'peak_drift': peak_drift,
+        'peak_accel': peak_accel,
+        'n_failed': int(n_failed),
+        'nr_iterations': int(n_iter),
+        'first_failed': None if first_failed < 0 else int(first_failed),
+        'stop_step': None if stop_step < 0 else int(stop_step),
+    }
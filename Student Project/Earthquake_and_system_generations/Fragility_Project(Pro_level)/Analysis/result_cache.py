@@ -0,0 +1,171 @@
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+from Analysis.run_time_history import run_time_history
+
+DEFAULT_MAX_BYTES = 1 << 30 # 1 GiB
+
+def cache_key(**parts) -> str:
+    """
+    Content hash (SHA-256 hex digest) of named arrays and scalars.
+
+    Arrays (and lists/tuples) contribute their dtype, shape and bytes, numbers their float value
+    and everything else its repr, so the key changes with any input that changes the result.
+    """
+    h = hashlib.sha256()
+    for name in sorted(parts):
+        value = parts[name]
+        h.update(name.encode())
+        if isinstance(value, (np.ndarray, list, tuple)):
+            value = np.ascontiguousarray(value)
+            h.update(f"{value.dtype.str}{value.shape}".encode())
+            h.update(value.tobytes())
+        elif isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            h.update(repr(float(value)).encode())
+        else:
+            h.update(repr(value).encode())
+    return h.hexdigest()
+
+def record_digest(record_g: np.ndarray) -> str:
+    """Content hash of a ground motion record (stands in for the record id in cache keys)."""
+    return cache_key(record=np.asarray(record_g, dtype=float))
+
+def _entry_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f"{key}.npz")
+
+def cache_get(cache_dir: str, key: str) -> dict | None:
+    """
+    Cached result for key, or None. A hit refreshes the entry's modification time (LRU order).
+    """
+    path = _entry_path(cache_dir, key)
+    try:
+        with np.load(path) as saved:
+            result = {name: saved[name] for name in saved.files}
+        os.utime(path)
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile): # Missing, evicted meanwhile, truncated or corrupt
+        return None
+    return result
+
+def cache_put(cache_dir: str, key: str, result: dict, max_bytes: int | None = None):
+    """
+    Stores a result (dict of arrays/scalars, None values skipped) under key, written atomically.
+
+    Args:
+        cache_dir (str): Cache folder (created if needed).
+        key (str): Entry key (see cache_key).
+        result (dict): Result to store.
+        max_bytes (int | None, optional): Evict least recently used entries above this size.
+                                          Defaults to None (no eviction here).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _entry_path(cache_dir, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, **{name: value for name, value in result.items() if value is not None})
+    os.replace(tmp_path, path)
+    if max_bytes is not None:
+        evict_lru(cache_dir, max_bytes)
+
+def evict_lru(cache_dir: str, max_bytes: int) -> int:
+    """
+    Deletes least recently used entries until the cache holds at most max_bytes.
+
+    Returns:
+        int: Number of entries evicted.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".npz") and not entry.name.endswith(".tmp.npz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    n_evicted = 0
+    for _, size, path in sorted(entries): # Oldest first
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        n_evicted += 1
+    return n_evicted
+
+def cached_run_time_history(cache_dir: str,
+                            model_type: str,
+                            M: np.ndarray,
+                            K_or_Fy: np.ndarray,
+                            dt: float,
+                            accel_gm_g: np.ndarray,
+                            H: np.ndarray,
+                            alpha_M: float,
+                            beta_K: float,
+                            K_init: np.ndarray | None = None,
+                            alpha: float | None = None,
+                            scale_factor: float = 1.0,
+                            record_id: str | None = None,
+                            store_history: bool = False,
+                            max_bytes: int = DEFAULT_MAX_BYTES,
+                            **kwargs
+                            ) -> dict:
+    """
+    run_time_history behind a content-addressed on-disk cache.
+
+    The key hashes the model (M, K_or_Fy, K_init, alpha, alpha_M, beta_K, H), dt, the record
+    (record_id, or the record's content hash), the scale factor and the solver options in kwargs.
+    An entry holds the peak drifts and, with store_history, the displacement history; a cached
+    entry without history is recomputed when the history is requested. Entries above max_bytes
+    are evicted least recently used first.
+
+    Args:
+        cache_dir (str): Cache folder.
+        model_type, M, K_or_Fy, dt, H, alpha_M, beta_K, K_init, alpha: As for run_time_history.
+        accel_gm_g (np.ndarray): Unscaled ground acceleration (g).
+        scale_factor (float, optional): Factor applied to accel_gm_g. Defaults to 1.0.
+        record_id (str | None, optional): Identifier of the record; it must change whenever the
+                                          record does. Defaults to the record's content hash.
+        store_history (bool, optional): Also cache and return 'time' and 'disp'. Defaults to False.
+        max_bytes (int, optional): Cache size bound. Defaults to 1 GiB.
+        **kwargs: Other run_time_history options (linear_method, nonlinear_kernel, drift_thresholds, ...);
+                  record/record_every are ignored (set by store_history).
+
+    Returns:
+        dict: 'PIDR', 'maxPIDR', 'time' and 'disp' (None unless store_history) and
+              'cache_hit' (bool).
+    """
+    accel_gm_g = np.asarray(accel_gm_g, dtype=float).flatten()
+    kwargs.pop('record', None) # Output options do not change the peak drifts
+    kwargs.pop('record_every', None)
+    key = cache_key(model_type=model_type, M=M, K_or_Fy=K_or_Fy, K_init=K_init, alpha=alpha,
+                    alpha_M=alpha_M, beta_K=beta_K, H=H, dt=dt, scale_factor=scale_factor,
+                    record=record_digest(accel_gm_g) if record_id is None else str(record_id),
+                    **{f"option_{name}": value for name, value in kwargs.items()})
+
+    cached = cache_get(cache_dir, key)
+    if cached is not None and (not store_history or 'disp' in cached):
+        return {
+            'PIDR': cached['PIDR'],
+            'maxPIDR': float(cached['maxPIDR']),
+            'time': cached.get('time') if store_history else None,
+            'disp': cached.get('disp') if store_history else None,
+            'cache_hit': True,
+        }
+
+    results = run_time_history(model_type, M, K_or_Fy, dt, accel_gm_g * scale_factor, H, alpha_M, beta_K,
+                               K_init=K_init, alpha=alpha, record='full' if store_history else 'peaks', **kwargs)
+    entry = {'PIDR': results['PIDR'], 'maxPIDR': results['maxPIDR']}
+    if store_history:
+        entry.update(time=results['time'], disp=results['disp'])
+    cache_put(cache_dir, key, entry, max_bytes=max_bytes)
+    return {
+        'PIDR': results['PIDR'],
+        'maxPIDR': float(results['maxPIDR']),
+        'time': results['time'] if store_history else None,
+        'disp': results['disp'] if store_history else None,
+        'cache_hit': False,
+    }
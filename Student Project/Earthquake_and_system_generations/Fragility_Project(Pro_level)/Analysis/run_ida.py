@@ -0,0 +1,497 @@
+import math
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from Analysis.ida_results_store import append_ida_results, ida_matrix, read_ida_results
+from Analysis.hysteresis import G_ACCEL
+from Analysis.linear_ida import run_linear_ida
+from Analysis.nonlinear_kernel import run_nonlinear_kernel
+from Analysis.result_cache import DEFAULT_MAX_BYTES, cache_get, cache_key, cache_put, evict_lru, record_digest
+from Analysis.run_time_history import (_drift_ratios_from_peaks, _prepare_model, _stop_limit,
+                                       merge_profiles, run_time_history, run_time_history_batch)
+from GroundMotions.record_store import get_record, open_record_store
+from numba_compat import NUMBA_AVAILABLE
+
+# Per-process state set by _init_worker (records are attached from shared memory, not pickled per task)
+_WORKER = {}
+# Per-level results of _nonlinear_ida_record, also the names of its checkpoint and results store fields
+NONLINEAR_RESULTS = ('PIDR', 'converged', 'failed_steps', 'nr_iterations')
+
+def _nonlinear_ida_record(record_g: np.ndarray,
+                          scale_factors: np.ndarray,
+                          model: dict,
+                          dt: float,
+                          drift_thresholds: np.ndarray | None = None,
+                          collapse_drift: float | None = None,
+                          cache_dir: str | None = None,
+                          prepared: dict | None = None,
+                          profiles: list | None = None
+                          ) -> tuple:
+    """
+    Nonlinear analyses of one record at every scale factor.
+
+    Uses the compiled kernel per analysis when Numba is available, otherwise one batched
+    run over all scale factors. drift_thresholds/collapse_drift enable early termination
+    (see run_time_history); the PIDR of a stopped analysis is the peak up to the stop.
+    With cache_dir, scale factors found in the result cache (Analysis.result_cache) are not re-run
+    and new results are added to it, keyed on the solver path that produced them. prepared (from _worker_prepared_model) skips re-deriving the
+    model matrices for every record. With a profiles list, the analyses run are profiled instead
+    (run_time_history step loop with profile=True) and their profiles appended to it.
+
+    Returns:
+        tuple[np.ndarray, ...]: PIDR (n_levels x DOF), converged flags, non-converged NR steps and
+                                total NR iterations (n_levels,).
+    """
+    if cache_dir is None:
+        return _nonlinear_ida_levels(record_g, scale_factors, model, dt, drift_thresholds, collapse_drift, prepared, profiles)
+
+    common = dict(M=model['M'], K_init=model['K_initial'], Fy=model['Fy'], alpha=model['alpha'],
+                  alpha_M=model['alpha_M'], beta_K=model['beta_K'], H=model['H'], dt=dt,
+                  record=record_digest(record_g), drift_thresholds=drift_thresholds, collapse_drift=collapse_drift,
+                  solver=_nonlinear_solver(profiles))
+    keys = [cache_key(scale_factor=sf, **common) for sf in scale_factors]
+    PIDR = np.empty((len(scale_factors), model['M'].shape[0]))
+    converged = np.ones(len(scale_factors), dtype=bool)
+    failed_steps = np.zeros(len(scale_factors), dtype=np.int64)
+    nr_iterations = np.zeros(len(scale_factors), dtype=np.int64)
+    missing = []
+    for i, key in enumerate(keys):
+        cached = cache_get(cache_dir, key)
+        if cached is None or 'nr_iterations' not in cached: # Entries from before the solver counters are re-run
+            missing.append(i)
+        else:
+            PIDR[i], converged[i] = cached['PIDR'], cached['converged']
+            failed_steps[i], nr_iterations[i] = cached['failed_steps'], cached['nr_iterations']
+    if missing:
+        PIDR[missing], converged[missing], failed_steps[missing], nr_iterations[missing] = _nonlinear_ida_levels(
+            record_g, np.asarray(scale_factors)[missing], model, dt, drift_thresholds, collapse_drift, prepared, profiles)
+        for i in missing:
+            cache_put(cache_dir, keys[i], {'PIDR': PIDR[i], 'converged': converged[i],
+                                           'failed_steps': failed_steps[i], 'nr_iterations': nr_iterations[i]})
+    return PIDR, converged, failed_steps, nr_iterations
+
+def _nonlinear_solver(profiles: list | None) -> str:
+    """Solver path _nonlinear_ida_levels takes: 'step_loop' when profiling, else 'kernel' (Numba) or 'batch'."""
+    return 'step_loop' if profiles is not None else 'kernel' if NUMBA_AVAILABLE else 'batch'
+
+def _nonlinear_ida_levels(record_g: np.ndarray,
+                          scale_factors: np.ndarray,
+                          model: dict,
+                          dt: float,
+                          drift_thresholds: np.ndarray | None,
+                          collapse_drift: float | None,
+                          prepared: dict | None = None,
+                          profiles: list | None = None
+                          ) -> tuple:
+    """Uncached body of _nonlinear_ida_record."""
+    args = dict(model_type='nonlinear', M=model['M'], K_or_Fy=model['Fy'], dt=dt, alpha_M=model['alpha_M'],
+                beta_K=model['beta_K'], K_init=model['K_initial'], alpha=model['alpha'])
+    PIDR = np.empty((len(scale_factors), model['M'].shape[0]))
+    failed_steps = np.zeros(len(scale_factors), dtype=np.int64)
+    nr_iterations = np.zeros(len(scale_factors), dtype=np.int64)
+    solver = _nonlinear_solver(profiles)
+    if solver == 'step_loop': # Instrumented step loop, one analysis per level
+        with warnings.catch_warnings(): # Non-convergence is reported through the converged flags
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            for i, sf in enumerate(scale_factors):
+                out = run_time_history(accel_gm_g=record_g * sf, H=model['H'], drift_thresholds=drift_thresholds,
+                                       collapse_drift=collapse_drift, record='peaks', profile=True, **args)
+                stats = out['solver_stats']
+                PIDR[i], failed_steps[i], nr_iterations[i] = out['PIDR'], stats['failed_steps'], stats['nr_iterations'].sum()
+                profiles.append(out['profile'])
+        return PIDR, failed_steps == 0, failed_steps, nr_iterations
+
+    if solver == 'kernel':
+        stop_drift = _stop_limit(drift_thresholds, collapse_drift)
+        if prepared is None:
+            prepared = _prepare_model(**args)
+        for i, sf in enumerate(scale_factors):
+            out = run_nonlinear_kernel(prepared, record_g * (sf * G_ACCEL), model['H'],
+                                       stop_drift=stop_drift, record_every=0) # Peaks only
+            PIDR[i], _ = _drift_ratios_from_peaks(out['peak_drift'], model['H'])
+            failed_steps[i], nr_iterations[i] = out['n_failed'], out['nr_iterations']
+        return PIDR, failed_steps == 0, failed_steps, nr_iterations
+
+    with warnings.catch_warnings(): # Non-convergence is reported through the converged flags
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        results = run_time_history_batch(accel_gm_g=record_g, H=model['H'], scale_factors=scale_factors,
+                                         drift_thresholds=drift_thresholds, collapse_drift=collapse_drift,
+                                         record='peaks', **args)
+    return results['PIDR'], results['converged'], results['failed_steps'], results['nr_iterations']
+
+def _record_checkpoint_path(checkpoint_dir: str, record_id) -> str:
+    return os.path.join(checkpoint_dir, f"record_{record_id}.npz")
+
+def _record_fingerprint(record_g: np.ndarray, pga_orig_g: float, model: dict, dt: float,
+                        drift_thresholds: np.ndarray | None, collapse_drift: float | None) -> str:
+    """
+    Hash of everything a record's nonlinear IDA results depend on besides the PGA levels: the model,
+    dt, the stop options, the record's content and its unscaled PGA. Saved results are only resumed
+    when it matches.
+    """
+    return cache_key(M=model['M'], K_init=model['K_initial'], Fy=model['Fy'], alpha=model['alpha'],
+                     alpha_M=model['alpha_M'], beta_K=model['beta_K'], H=model['H'], dt=dt,
+                     record=record_digest(record_g), pga_orig_g=pga_orig_g,
+                     drift_thresholds=drift_thresholds, collapse_drift=collapse_drift)
+
+def _init_worker(shm_name: str, shape: tuple, dtype: str, context: dict):
+    """Pool initializer: attaches the shared record array and stores the analysis context."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER['shm'] = shm # Keep a reference so the buffer stays mapped
+    _WORKER['records'] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _WORKER.update(context)
+
+def _init_store_worker(store_path: str, offsets: np.ndarray, lengths: np.ndarray, context: dict):
+    """Pool initializer for a record store: each worker memory-maps the store and slices every record from it."""
+    data = open_record_store(store_path)['data']
+    _WORKER['records'] = [data[offset:offset + n] for offset, n in zip(offsets, lengths)] # Zero-copy views
+    _WORKER.update(context)
+
+def _worker_prepared_model() -> dict | None:
+    """Nonlinear model matrices for the compiled kernel, derived once per worker and run (None without Numba)."""
+    if NUMBA_AVAILABLE and _WORKER.get('prepared') is None:
+        model = _WORKER['model']
+        _WORKER['prepared'] = _prepare_model('nonlinear', model['M'], model['Fy'], _WORKER['dt'], model['alpha_M'],
+                                             model['beta_K'], K_init=model['K_initial'], alpha=model['alpha'])
+    return _WORKER.get('prepared')
+
+def _run_chunk(record_indices: list) -> tuple:
+    """
+    Runs the nonlinear IDA for a chunk of records.
+
+    Returns:
+        tuple[list, dict | None]: [(index, (PIDR, converged, failed_steps, nr_iterations)), ...] as
+                                  returned by _nonlinear_ida_record, and the merged profile of the
+                                  chunk's analyses (None unless profiling).
+    """
+    out = []
+    profiles = [] if _WORKER.get('profile') else None
+    for idx in record_indices:
+        scale_factors = _WORKER['pga_levels'] / _WORKER['pga_orig_g'][idx]
+        result = _nonlinear_ida_record(_WORKER['records'][idx], scale_factors, _WORKER['model'], _WORKER['dt'],
+                                       _WORKER['drift_thresholds'], _WORKER['collapse_drift'], _WORKER['cache_dir'],
+                                       _worker_prepared_model(), profiles)
+        if _WORKER['checkpoint_dir'] is not None: # Per-record checkpoint for resuming
+            path = _record_checkpoint_path(_WORKER['checkpoint_dir'], _WORKER['record_ids'][idx])
+            tmp_path = path + ".tmp.npz"
+            np.savez(tmp_path, **dict(zip(NONLINEAR_RESULTS, result)), pga_levels=_WORKER['pga_levels'],
+                     fingerprint=_WORKER['fingerprints'][idx])
+            os.replace(tmp_path, path)
+        out.append((idx, result))
+    return out, None if profiles is None else merge_profiles(profiles)
+
+def _store_record_result(results_store: str, record_id, pga_levels: np.ndarray, result: tuple, fingerprint: str):
+    """Appends the nonlinear IDA points of one finished record (_nonlinear_ida_record output) to the results store."""
+    PIDR, converged, failed_steps, nr_iterations = result
+    append_ida_results(results_store, [record_id], pga_levels, 'nonlinear', PIDR[np.newaxis], converged,
+                       failed_steps, nr_iterations, fingerprints=[fingerprint])
+
+def _check_store_fingerprints(results_store: str, record_ids: list, fingerprints: list):
+    """Raises ValueError if the results store holds points of these records computed from other inputs."""
+    if not os.path.exists(results_store):
+        return
+    rows = read_ida_results(results_store, ('record_id', 'fingerprint'))
+    expected = dict(zip((str(rid) for rid in record_ids), fingerprints))
+    stale = sorted({rid for rid, mark in zip(rows['record_id'].tolist(), rows['fingerprint'].tolist())
+                    if mark and expected.get(rid, mark) != mark}) # '' marks points that predate fingerprints
+    if stale: raise ValueError(f"results_store {results_store} holds results of records {stale} for another model, "
+                               "dt, stop options, record or pga_orig_g; use another folder.")
+
+def _stored_nonlinear_results(results_store: str, pga_levels: np.ndarray) -> dict:
+    """
+    record_id -> _nonlinear_ida_record output of the records that have every PGA level in the results
+    store with a known fingerprint (_check_store_fingerprints has checked that it is theirs).
+    """
+    if not os.path.exists(results_store):
+        return {}
+    matrices = [ida_matrix(results_store, 'nonlinear', column) for column in NONLINEAR_RESULTS + ('fingerprint',)]
+    if not np.all(np.isin(pga_levels, matrices[0]['PGA_levels'])):
+        return {}
+    columns = np.searchsorted(matrices[0]['PGA_levels'], pga_levels)
+    stored = {}
+    for i, rid in enumerate(matrices[0]['record_ids']):
+        *values, marks = (m[column][i, columns] for m, column in zip(matrices, NONLINEAR_RESULTS + ('fingerprint',)))
+        if np.all(marks != '') and not np.isnan(values[0]).all(axis=-1).any():
+            stored[rid] = tuple(values)
+    return stored
+
+def _store_linear_results(results_store: str, record_ids: list, pga_levels: np.ndarray, PIDR: np.ndarray,
+                          fingerprints: list):
+    """
+    Appends the linear IDA points (record, PGA level) not in the results store yet with the record's
+    fingerprint (PIDR: n_records x n_levels x DOF).
+    """
+    rows = (read_ida_results(results_store, ('record_id', 'pga', 'fingerprint'), model_type='linear')
+            if os.path.exists(results_store) else None)
+    have = set() if rows is None else {(rid, pga) for rid, pga, mark in
+                                       zip(rows['record_id'].tolist(), rows['pga'].tolist(), rows['fingerprint'].tolist())
+                                       if mark}
+    missing = np.array([[(str(rid), pga) not in have for pga in pga_levels.tolist()] for rid in record_ids],
+                       dtype=bool).reshape(len(record_ids), len(pga_levels))
+    patterns = {} # Records missing the same levels are appended as one chunk
+    for idx in np.flatnonzero(missing.any(axis=1)):
+        patterns.setdefault(missing[idx].tobytes(), []).append(idx)
+    for group in patterns.values():
+        levels = missing[group[0]]
+        append_ida_results(results_store, [record_ids[idx] for idx in group], pga_levels[levels], 'linear',
+                           PIDR[np.ix_(group, levels)], fingerprints=[fingerprints[idx] for idx in group])
+
+def _resolve_records(records_g: np.ndarray | str, dt: float, pga_orig_g: np.ndarray | None,
+                     record_ids: list | None) -> dict:
+    """
+    Records of run_ida/run_msa: an (n_records x n_steps) array, or the records of a record store folder.
+
+    Returns:
+        dict: 'records' (contiguous array, or zero-copy views of the store's memory map), 'pga_orig_g'
+              (n_records,), 'record_ids' (list), 'store' (open_record_store, or None for an array),
+              'store_path', 'offsets' and 'lengths' (index entries of the records, None for an array).
+    """
+    store = store_path = offsets = lengths = None
+    if isinstance(records_g, (str, os.PathLike)): # Record store
+        store_path = os.fspath(records_g)
+        store = open_record_store(store_path)
+        if record_ids is None:
+            record_ids = store['index']['record_id'].tolist()
+        positions = [store['position'][str(rid)] for rid in record_ids]
+        if not np.allclose(store['index']['dt'][positions], dt): raise ValueError("Record store dt differs from dt.")
+        if pga_orig_g is None:
+            pga_orig_g = store['index']['pga_orig_g'][positions]
+        offsets, lengths = store['index']['offset'][positions], store['index']['n_steps'][positions]
+        records_g = [get_record(store, rid) for rid in record_ids] # Zero-copy views of the memory map
+    else:
+        records_g = np.ascontiguousarray(np.atleast_2d(records_g), dtype=float)
+    n_records = len(records_g)
+    if pga_orig_g is None:
+        pga_orig_g = np.max(np.abs(records_g), axis=1)
+    pga_orig_g = np.asarray(pga_orig_g, dtype=float).flatten()
+    if pga_orig_g.shape != (n_records,): raise ValueError("pga_orig_g must have one entry per record.")
+    pga_orig_g = np.where(pga_orig_g == 0, 1e-6, pga_orig_g) # Avoid division by zero
+    record_ids = list(range(n_records)) if record_ids is None else list(record_ids)
+    if len(record_ids) != n_records: raise ValueError("record_ids must have one entry per record.")
+    return {'records': records_g, 'pga_orig_g': pga_orig_g, 'record_ids': record_ids, 'store': store,
+            'store_path': store_path, 'offsets': offsets, 'lengths': lengths}
+
+def _split_chunks(tasks: list, n_workers: int | None, chunk_size: int | None) -> tuple:
+    """Worker count (at most one per task) and tasks split into chunks of chunk_size (default ~4 per worker)."""
+    n_workers = (os.cpu_count() or 1) if n_workers is None else max(1, n_workers)
+    n_workers = min(n_workers, max(1, len(tasks)))
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(tasks) / (4 * n_workers)))
+    return n_workers, [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+def _worker_context():
+    """Start method of the worker pools: 'forkserver' (preloading this module) where available, else 'spawn'."""
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__]) # Workers fork from a server that has imported this module
+    return context
+
+def _run_chunks(func, chunks: list, source: dict, context: dict, n_workers: int):
+    """
+    Yields func(chunk) for every chunk, as each finishes.
+
+    With one worker the chunks run in-process; otherwise in a ProcessPoolExecutor whose workers
+    attach the records once (source from _resolve_records: the record store is memory-mapped by
+    every worker, an array is copied into shared memory), so a task only pickles its chunk.
+    func reads the records and context from _WORKER. Workers are started by a fork server (spawned
+    where there is none), never forked from the caller, which may be running other threads
+    (main_workflow runs independent stages concurrently) whose locks a fork would copy held.
+    """
+    if n_workers == 1:
+        _WORKER.update(context, records=source['records'])
+        for chunk in chunks:
+            yield func(chunk)
+        return
+    shm = None
+    if source['store_path'] is not None: # Workers memory-map the store
+        initializer, initargs = _init_store_worker, (source['store_path'], source['offsets'], source['lengths'], context)
+    else: # Records are copied into shared memory once
+        records_g = source['records']
+        shm = shared_memory.SharedMemory(create=True, size=records_g.nbytes)
+        np.ndarray(records_g.shape, dtype=records_g.dtype, buffer=shm.buf)[:] = records_g
+        initializer, initargs = _init_worker, (shm.name, records_g.shape, records_g.dtype.str, context)
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=_worker_context(),
+                                 initializer=initializer, initargs=initargs) as pool:
+            futures = [pool.submit(func, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+def run_ida(records_g: np.ndarray | str,
+            pga_levels: np.ndarray,
+            model: dict,
+            dt: float,
+            pga_orig_g: np.ndarray | None = None,
+            record_ids: list | None = None,
+            n_workers: int | None = None,
+            chunk_size: int | None = None,
+            checkpoint_dir: str | None = None,
+            run_linear: bool = True,
+            drift_thresholds: np.ndarray | None = None,
+            collapse_drift: float | None = None,
+            cache_dir: str | None = None,
+            cache_max_bytes: int = DEFAULT_MAX_BYTES,
+            results_store: str | None = None,
+            profile: bool = False
+            ) -> dict:
+    """
+    Incremental dynamic analysis over a record suite (Python counterpart of Run_IDA_Analysis.m).
+
+    Nonlinear analyses are fanned out over a ProcessPoolExecutor in chunks of records. The record
+    array is placed in shared memory once and attached by every worker, so only record indices are
+    sent per task. Given a record store (GroundMotions.record_store) instead, every worker
+    memory-maps the store and slices each record from it (offset and length from the index), so
+    no record is copied, and each record is analysed over its own length.
+    Linear IDA uses scale invariance (run_linear_ida) in the parent process.
+
+    Args:
+        records_g (np.ndarray | str): Ground accelerations (g), shape (n_records, n_steps), or the
+                                      folder of a record store (pga_orig_g and record_ids then
+                                      default to the store index; record_ids selects records).
+        pga_levels (np.ndarray): Target PGA levels (g).
+        model (dict): Structural model with 'M', 'K_initial', 'H', 'alpha_M', 'beta_K', 'Fy',
+                      'alpha' (e.g. from Analysis.shear_building.define_shear_building).
+        dt (float): Time step (s).
+        pga_orig_g (np.ndarray | None, optional): Unscaled PGA of each record (g). Defaults to max(|record|).
+        record_ids (list | None, optional): Record identifiers (used for checkpoints). Defaults to 0..n-1.
+        n_workers (int | None, optional): Worker processes; 1 runs in-process. Defaults to os.cpu_count().
+        chunk_size (int | None, optional): Records per task. Defaults to ~4 tasks per worker, or 1
+                                           with results_store so that every record is stored as
+                                           soon as it finishes.
+        checkpoint_dir (str | None, optional): If given, each finished record is saved there and
+                                               records already saved for the same PGA levels, model,
+                                               dt, stop options, record and pga_orig_g are skipped
+                                               on rerun. Defaults to None.
+        run_linear (bool, optional): Also compute MIDR_Linear. Defaults to True.
+        drift_thresholds (np.ndarray | None, optional): Damage-state PIDR thresholds; nonlinear analyses
+                                                        stop once all are exceeded. Defaults to None.
+        collapse_drift (float | None, optional): Nonlinear analyses stop at this PIDR. Defaults to None.
+        cache_dir (str | None, optional): Result cache folder (Analysis.result_cache). Nonlinear analyses
+                                          already cached for the same model, record, scale factor, dt and
+                                          stop options are looked up instead of re-run. Defaults to None.
+        cache_max_bytes (int, optional): Cache size bound, enforced (least recently used first)
+                                         after the analyses. Defaults to 1 GiB.
+        results_store (str | None, optional): IDA results store folder (Analysis.ida_results_store).
+                                              Nonlinear results (with the NR counters) are appended as
+                                              each record finishes and linear points not stored yet at
+                                              the end; records already stored at every PGA level are
+                                              skipped on rerun. Every point carries the fingerprint of
+                                              its inputs (as for checkpoint_dir); a store holding these
+                                              records' points for other inputs raises ValueError, and
+                                              points without a fingerprint are recomputed. Defaults to None.
+        profile (bool, optional): Run the nonlinear analyses through the instrumented step loop of
+                                  run_time_history (instead of the compiled kernel or batch solver)
+                                  and return their merged profile. For diagnosis only: slower.
+                                  Defaults to False.
+
+    Returns:
+        dict: A dictionary containing results:
+            'PGA_levels' (np.ndarray): PGA levels (g).
+            'record_ids' (list): Record identifiers.
+            'MIDR_Linear' (np.ndarray | None): Linear max PIDR (n_records x n_levels).
+            'MIDR_Nonlinear' (np.ndarray): Nonlinear max PIDR (n_records x n_levels).
+            'PIDR_Nonlinear' (np.ndarray): Nonlinear PIDR per story (n_records x n_levels x DOF).
+            'converged' (np.ndarray): Nonlinear convergence flags (n_records x n_levels).
+            'failed_steps' (np.ndarray): Non-converged NR steps per analysis (n_records x n_levels).
+            'nr_iterations' (np.ndarray): Total NR iterations per analysis (n_records x n_levels).
+            'profile' (dict): With profile=True, merge_profiles of the nonlinear analyses run
+                              (not those resumed or taken from the cache).
+    """
+    source = _resolve_records(records_g, dt, pga_orig_g, record_ids)
+    records_g, pga_orig_g, record_ids = source['records'], source['pga_orig_g'], source['record_ids']
+    pga_levels = np.asarray(pga_levels, dtype=float).flatten()
+    n_records = len(records_g)
+    num_dof = model['M'].shape[0]
+
+    PIDR_nl = np.full((n_records, len(pga_levels), num_dof), np.nan)
+    converged = np.zeros((n_records, len(pga_levels)), dtype=bool)
+    failed_steps = np.full((n_records, len(pga_levels)), -1, dtype=np.int64)
+    nr_iterations = np.full((n_records, len(pga_levels)), -1, dtype=np.int64)
+    nonlinear = (PIDR_nl, converged, failed_steps, nr_iterations) # Filled per record, in NONLINEAR_RESULTS order
+
+    # --- Resume from checkpoints / the results store ---
+    pending = []
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    fingerprints = None
+    if checkpoint_dir is not None or results_store is not None:
+        fingerprints = [_record_fingerprint(records_g[idx], pga_orig_g[idx], model, dt, drift_thresholds, collapse_drift)
+                        for idx in range(n_records)]
+    stored = {}
+    if results_store is not None:
+        _check_store_fingerprints(results_store, record_ids, fingerprints)
+        stored = _stored_nonlinear_results(results_store, pga_levels)
+    for idx, rid in enumerate(record_ids):
+        if str(rid) in stored:
+            for out, values in zip(nonlinear, stored[str(rid)]):
+                out[idx] = values
+            continue
+        path = _record_checkpoint_path(checkpoint_dir, rid) if checkpoint_dir is not None else None
+        if path is not None and os.path.exists(path):
+            with np.load(path) as saved:
+                # Checkpoints of other inputs, or from before the fingerprint, are re-run
+                if (np.array_equal(saved['pga_levels'], pga_levels) and 'fingerprint' in saved
+                        and saved['fingerprint'].item() == fingerprints[idx]):
+                    for out, name in zip(nonlinear, NONLINEAR_RESULTS):
+                        out[idx] = saved[name]
+                    continue
+        pending.append(idx)
+
+    # --- Nonlinear IDA ---
+    context = {'pga_levels': pga_levels, 'pga_orig_g': pga_orig_g, 'model': model, 'dt': dt,
+               'record_ids': record_ids, 'checkpoint_dir': checkpoint_dir, 'fingerprints': fingerprints,
+               'drift_thresholds': drift_thresholds, 'collapse_drift': collapse_drift, 'cache_dir': cache_dir,
+               'prepared': None, 'profile': profile}
+    if chunk_size is None and results_store is not None:
+        chunk_size = 1 # Every record is stored as soon as it finishes
+    n_workers, chunks = _split_chunks(pending, n_workers, chunk_size)
+
+    chunk_profiles = []
+    for done, chunk_profile in _run_chunks(_run_chunk, chunks, source, context, n_workers):
+        chunk_profiles.append(chunk_profile)
+        for idx, result in done:
+            for out, values in zip(nonlinear, result):
+                out[idx] = values
+            if results_store is not None:
+                _store_record_result(results_store, record_ids[idx], pga_levels, result, fingerprints[idx])
+
+    if cache_dir is not None:
+        evict_lru(cache_dir, cache_max_bytes)
+
+    n_failed = np.count_nonzero(~converged)
+    if n_failed:
+        warnings.warn(f"Newton-Raphson did not converge in {n_failed} of {converged.size} nonlinear analyses.", RuntimeWarning)
+
+    # --- Linear IDA (one analysis per record) ---
+    MIDR_lin = None
+    if run_linear:
+        # Store records keep their own lengths (batched by length), as in the nonlinear IDA
+        linear = run_linear_ida(records_g, pga_levels, model['M'], model['K_initial'], dt, model['H'],
+                                model['alpha_M'], model['beta_K'], K_init=model['K_initial'], pga_orig_g=pga_orig_g)
+        MIDR_lin = linear['MIDR_Linear']
+        if results_store is not None: # Linear points are not resumed, only deduplicated
+            _store_linear_results(results_store, record_ids, pga_levels, linear['PIDR'], fingerprints)
+
+    results = {
+        'PGA_levels': pga_levels,
+        'record_ids': record_ids,
+        'MIDR_Linear': MIDR_lin,
+        'MIDR_Nonlinear': np.max(PIDR_nl, axis=-1),
+        'PIDR_Nonlinear': PIDR_nl,
+        'converged': converged,
+        'failed_steps': failed_steps,
+        'nr_iterations': nr_iterations,
+    }
+    if profile:
+        results['profile'] = merge_profiles(chunk_profiles)
+    return results
@@ -0,0 +1,149 @@
+import warnings
+
+import numpy as np
+
+from Analysis.run_ida import (_WORKER, _nonlinear_ida_levels, _resolve_records, _run_chunks, _split_chunks,
+                              _worker_prepared_model)
+from Analysis.run_time_history import run_time_history_batch
+from Fragility.fit_fragility_batch import fit_fragility_curves_batch
+from numba_compat import NUMBA_AVAILABLE
+
+def _run_msa_chunk(tasks: list) -> list:
+    """
+    Runs the nonlinear analyses of a chunk of records; tasks are [(record index, scale factors), ...].
+
+    With Numba every analysis reuses the worker's prepared model; otherwise the analyses of the
+    chunk's records of equal length go through one run_time_history_batch call each, which
+    prepares the model once.
+
+    Returns:
+        list: [(record index, PIDR (n_sf x DOF), converged (n_sf,)), ...].
+    """
+    model, dt, records = _WORKER['model'], _WORKER['dt'], _WORKER['records']
+    if NUMBA_AVAILABLE:
+        prepared = _worker_prepared_model()
+        return [(idx, *_nonlinear_ida_levels(records[idx], sfs, model, dt, _WORKER['drift_thresholds'],
+                                             _WORKER['collapse_drift'], prepared)[:2]) for idx, sfs in tasks]
+
+    by_length = {} # Records of a record store may differ in length; a batch needs one length
+    for idx, sfs in tasks:
+        by_length.setdefault(len(records[idx]), []).append((idx, sfs))
+    out = []
+    for group in by_length.values():
+        rows = np.concatenate([np.full(len(sfs), idx) for idx, sfs in group])
+        with warnings.catch_warnings(): # Non-convergence is reported through the converged flags
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            results = run_time_history_batch('nonlinear', model['M'], model['Fy'], dt, np.stack([records[i] for i in rows]),
+                                             model['H'], model['alpha_M'], model['beta_K'], K_init=model['K_initial'],
+                                             alpha=model['alpha'], scale_factors=np.concatenate([sfs for _, sfs in group]),
+                                             drift_thresholds=_WORKER['drift_thresholds'],
+                                             collapse_drift=_WORKER['collapse_drift'], record='peaks')
+        bounds = np.cumsum([0] + [len(sfs) for _, sfs in group])
+        out.extend((idx, results['PIDR'][lo:hi], results['converged'][lo:hi])
+                   for (idx, _), lo, hi in zip(group, bounds[:-1], bounds[1:]))
+    return out
+
+def run_msa(records_g: np.ndarray | str,
+            stripes: list,
+            model: dict,
+            dt: float,
+            pga_orig_g: np.ndarray | None = None,
+            record_ids: list | None = None,
+            damage_states: dict | None = None,
+            n_workers: int | None = None,
+            chunk_size: int | None = None,
+            drift_thresholds: np.ndarray | None = None,
+            collapse_drift: float | None = None
+            ) -> dict:
+    """
+    Multiple-stripe analysis: a (possibly different) record set analysed at each intensity.
+
+    Each distinct (record, PGA) pair is analysed once, however many stripes list it, and a record
+    appearing in several stripes is one task with all its scale factors. All tasks run in one
+    ProcessPoolExecutor, with records shared as in run_ida (shared memory or a memory-mapped record
+    store) and the model matrices derived once per worker. With damage_states, the exceedance
+    counts of every stripe are fitted for all damage states at once (fit_fragility_curves_batch).
+
+    Args:
+        records_g (np.ndarray | str): Ground accelerations (g), shape (n_records, n_steps), or the
+                                      folder of a record store (as for run_ida).
+        stripes (list): Stripe definitions, dicts with 'pga' (target PGA, g) and 'records' (ids of
+                        the records analysed at that intensity, from record_ids).
+        model (dict): Structural model as for run_ida.
+        dt (float): Time step (s).
+        pga_orig_g (np.ndarray | None, optional): Unscaled PGA of each record (g). Defaults to max(|record|)
+                                                  or the record store index.
+        record_ids (list | None, optional): Record identifiers. Defaults to 0..n-1 or the record store index.
+        damage_states (dict | None, optional): Damage state name -> max PIDR limit; enables the
+                                               counts and the fit. Defaults to None.
+        n_workers (int | None, optional): Worker processes; 1 runs in-process. Defaults to os.cpu_count().
+        chunk_size (int | None, optional): Records per task. Defaults to ~4 tasks per worker.
+        drift_thresholds, collapse_drift: Early termination, as for run_ida. Defaults to None.
+
+    Returns:
+        dict: A dictionary containing results:
+            'PGA_levels' (np.ndarray): PGA of each stripe (g) (n_stripes,).
+            'stripe_records' (list): Record ids of each stripe.
+            'MIDR' (list): Max PIDR of each stripe's records (list of (n_i,) arrays).
+            'PIDR' (list): PIDR per story of each stripe's records (list of (n_i x DOF) arrays).
+            'converged' (list): Convergence flags of each stripe's records.
+            'n_analyses' (int): Nonlinear analyses run (distinct record/PGA pairs).
+            'damage_states' (list): Damage state names (with damage_states).
+            'num_exceed' (np.ndarray): Exceedances per damage state and stripe (n_DS x n_stripes).
+            'num_trials' (np.ndarray): Analyses with a finite drift per stripe (n_stripes,).
+            'theta', 'beta' (np.ndarray): Fitted fragility parameters per damage state (n_DS,).
+    """
+    source = _resolve_records(records_g, dt, pga_orig_g, record_ids)
+    pga_orig_g, record_ids = source['pga_orig_g'], source['record_ids']
+    position = {str(rid): i for i, rid in enumerate(record_ids)}
+
+    # --- Distinct (record, PGA) pairs ---
+    pga_levels = np.array([float(stripe['pga']) for stripe in stripes])
+    stripe_records = [[str(rid) for rid in stripe['records']] for stripe in stripes]
+    unknown = {rid for ids in stripe_records for rid in ids} - set(position)
+    if unknown: raise ValueError(f"Stripe records not in record_ids: {sorted(unknown)}.")
+    levels_of = {} # record index -> sorted distinct PGA levels
+    for pga, ids in zip(pga_levels, stripe_records):
+        for rid in ids:
+            levels_of.setdefault(position[rid], set()).add(pga)
+    tasks = [(idx, np.array(sorted(levels)) / pga_orig_g[idx]) for idx, levels in sorted(levels_of.items())]
+
+    # --- Nonlinear analyses ---
+    context = {'model': model, 'dt': dt, 'drift_thresholds': drift_thresholds, 'collapse_drift': collapse_drift,
+               'prepared': None}
+    n_workers, chunks = _split_chunks(tasks, n_workers, chunk_size)
+    done = [out for chunk_out in _run_chunks(_run_msa_chunk, chunks, source, context, n_workers) for out in chunk_out]
+
+    results_of = {} # (record index, PGA) -> (PIDR, converged)
+    for idx, PIDR, conv in done:
+        for pga, p, c in zip(sorted(levels_of[idx]), PIDR, conv):
+            results_of[idx, pga] = (p, c)
+    n_failed = sum(not c for _, c in results_of.values())
+    if n_failed:
+        warnings.warn(f"Newton-Raphson did not converge in {n_failed} of {len(results_of)} nonlinear analyses.", RuntimeWarning)
+
+    PIDR = [np.array([results_of[position[rid], pga][0] for rid in ids]).reshape(len(ids), -1)
+            for pga, ids in zip(pga_levels, stripe_records)]
+    converged = [np.array([results_of[position[rid], pga][1] for rid in ids], dtype=bool)
+                 for pga, ids in zip(pga_levels, stripe_records)]
+    with warnings.catch_warnings(): # All-NaN rows (no finite drift) are reported as NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        MIDR = [np.nanmax(p, axis=-1) if p.size else np.array([]) for p in PIDR]
+    out = {
+        'PGA_levels': pga_levels,
+        'stripe_records': stripe_records,
+        'MIDR': MIDR,
+        'PIDR': PIDR,
+        'converged': converged,
+        'n_analyses': len(results_of),
+    }
+
+    # --- Binomial counts and fit (all damage states at once) ---
+    if damage_states is not None:
+        limits = np.array(list(damage_states.values()), dtype=float)
+        num_trials = np.array([np.sum(~np.isnan(m)) for m in MIDR])
+        num_exceed = np.array([[np.sum(m[~np.isnan(m)] > limit) for m in MIDR] for limit in limits])
+        fit = fit_fragility_curves_batch(pga_levels, num_exceed, np.broadcast_to(num_trials, num_exceed.shape))
+        out.update(damage_states=list(damage_states), num_exceed=num_exceed, num_trials=num_trials,
+                   theta=fit['theta'], beta=fit['beta'])
+    return out
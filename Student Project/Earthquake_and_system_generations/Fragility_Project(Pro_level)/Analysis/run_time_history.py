@@ -1,469 +1,1219 @@
-import numpy as np
-from scipy.linalg import solve, eig
-import warnings
-
-def run_time_history(model_type: str,
-                       M: np.ndarray,
-                       K_or_Fy: np.ndarray, # K (linear) or Fy (nonlinear)
-                       dt: float,
-                       accel_gm_g: np.ndarray,
-                       H: np.ndarray,
-                       alpha_M: float, # Rayleigh damping coefficient for Mass
-                       beta_K: float,  # Rayleigh damping coefficient for Initial Stiffness
-                       K_init: np.ndarray | None = None, # Initial stiffness (required for nonlinear AND linear if passing beta_K)
-                       alpha: float | None = None      # Post-yield stiffness ratio (required if nonlinear)
-                       ) -> dict:
-    """
-    Performs time history analysis using the Newmark-Beta method with provided Rayleigh damping coefficients.
-
-    Args:
-        model_type (str): 'linear' or 'nonlinear'.
-        M (np.ndarray): 3x3 Mass matrix (kg).
-        K_or_Fy (np.ndarray): If 'linear', 3x3 Stiffness matrix K (N/m).
-                              If 'nonlinear', 3x1 Yield force vector Fy (N).
-        dt (float): Time step of the ground motion (seconds).
-        accel_gm_g (np.ndarray): Ground acceleration column vector (units: g).
-        H (np.ndarray): 3x1 Story height vector (m).
-        alpha_M (float): Rayleigh damping coefficient proportional to mass (C = alpha_M*M + beta_K*K_initial).
-        beta_K (float): Rayleigh damping coefficient proportional to initial stiffness (C = alpha_M*M + beta_K*K_initial).
-        K_init (np.ndarray | None, optional): Initial stiffness matrix (N/m).
-                                             Required if model_type='nonlinear'.
-                                             Also needed for linear if beta_K != 0. Defaults to None.
-        alpha (float | None, optional): Post-yield stiffness ratio.
-                                        Required if model_type='nonlinear'. Defaults to None.
-
-    Returns:
-        dict: A dictionary containing results:
-            'time' (np.ndarray): Time vector (seconds).
-            'disp' (np.ndarray): Displacement time histories (m) (n_steps x DOF).
-            'PIDR' (np.ndarray): Peak Interstory Drift Ratio per story (DOF x 1).
-            'maxPIDR' (float): Maximum PIDR across all stories.
-    """
-    g = 9.81 # m/s^2
-
-    # --- Input Validation & Setup ---
-    if accel_gm_g.ndim > 1 and accel_gm_g.shape[1] != 1:
-         if accel_gm_g.shape[0] == 1: accel_gm_g = accel_gm_g.T # Transpose row vector
-         else: raise ValueError("accel_gm_g must be a column vector.")
-    accel_gm_g = accel_gm_g.reshape(-1, 1)
-    accel_gm = accel_gm_g * g # Convert g to m/s^2
-
-    n_steps = len(accel_gm)
-    num_dof = M.shape[0]
-    if H.shape != (num_dof,): H = H.flatten() # Ensure H is 1D array
-
-    if M.shape != (num_dof, num_dof): raise ValueError("M matrix shape mismatch.")
-
-    time = np.arange(n_steps) * dt
-    influence_vector = np.ones((num_dof, 1))
-
-    # Initialize result arrays
-    disp = np.zeros((n_steps, num_dof))
-    vel = np.zeros((n_steps, num_dof))
-    acc = np.zeros((n_steps, num_dof)) # Relative acceleration
-
-    # Newmark-Beta parameters (Average Acceleration)
-    gamma = 0.5
-    beta = 0.25
-    # Newmark constants for implicit formulation
-    a0 = 1.0 / (beta * dt**2)
-    a1 = 1.0 / (beta * dt)
-    a2 = 1.0 / (2.0 * beta) - 1.0
-    a3 = dt * (1.0 - gamma)
-    a4 = dt * gamma
-    a5 = dt / 2.0 * (1.0 - gamma / beta)
-    a6 = dt * (1.0 - gamma / (2.0*beta)) # Used for explicit v/a calculation if needed? Check Chopra
-    a7 = gamma / (beta * dt)
-    a8 = 1.0 - gamma / beta
-    a9 = dt * (1.0 - gamma / (2.0 * beta))
-
-    # --- Initial Conditions ---
-    # Assume u(0)=0, v(0)=0
-    # M*a(0) + C*v(0) + Fs(u(0)) = -M*I*accel_gm(0)
-    # Since Fs(0)=0, v(0)=0 => M*a(0) = -M*I*accel_gm(0) => a(0) = -I*accel_gm(0)
-    acc[0, :] = -influence_vector.flatten() * accel_gm[0]
-
-    # Transformation matrix: delta = T_mat @ u (Define before model type check)
-    T_mat = np.zeros((num_dof, num_dof))
-    for i in range(num_dof):
-        T_mat[i, i] = 1.0
-        if i > 0: T_mat[i, i-1] = -1.0
-
-    # --- Model Specific Setup ---
-    if model_type == 'linear':
-        K = K_or_Fy
-        if K.shape != (num_dof, num_dof): raise ValueError("K matrix shape mismatch for linear model.")
-        # Use K itself as K_initial for linear damping calculation if K_init not explicitly provided
-        if K_init is None:
-             K_init_for_damping = K
-             if beta_K != 0:
-                 warnings.warn("K_init not provided for linear analysis with non-zero beta_K. Using K for damping calculation.", RuntimeWarning)
-        else:
-             K_init_for_damping = K_init
-             if K_init.shape != (num_dof, num_dof): raise ValueError("Provided K_init matrix shape mismatch for linear model.")
-
-        # Damping Matrix (using provided coefficients and appropriate K)
-        C = alpha_M * M + beta_K * K_init_for_damping
-        K_eff = K + a0 * M + a7 * C # Effective stiffness matrix
-        K_eff_inv = None # Reset placeholder
-
-    elif model_type == 'nonlinear':
-        Fy = K_or_Fy.flatten() # Ensure Fy is 1D array
-        if K_init is None or alpha is None:
-            raise ValueError("K_init and alpha are required for nonlinear analysis.")
-        if K_init.shape != (num_dof, num_dof): raise ValueError("K_init matrix shape mismatch.")
-        if Fy.shape != (num_dof,): raise ValueError("Fy vector shape mismatch.")
-
-        # Extract initial story stiffnesses from K_init
-        k_init_stories = np.zeros(num_dof)
-        try:
-            # Assume standard shear building K_init structure to extract story stiffness
-            k_init_stories[num_dof - 1] = K_init[num_dof - 1, num_dof - 1]
-            for i in range(num_dof - 2, -1, -1):
-                 # K_init[i, i] = k_i + k_{i+1} => k_i = K_init[i,i] - k_{i+1}
-                 # Also check off-diagonal: K_init[i, i+1] == -k_{i+1}
-                 if not np.isclose(K_init[i, i+1], -k_init_stories[i + 1]):
-                     warnings.warn(f"Off-diagonal term K_init[{i},{i+1}] does not match -k_{i+1} from diagonal. K_init might not be standard shear building form.", RuntimeWarning)
-                 k_init_stories[i] = K_init[i, i] - k_init_stories[i + 1]
-        except IndexError:
-             raise ValueError("Error extracting story stiffnesses from K_init. Is it 3x3?")
-
-        if np.any(k_init_stories <= 0): raise ValueError("Derived initial story stiffnesses must be positive.")
-
-        delta_y = Fy / k_init_stories # Yield displacements for each story
-
-        # Damping Matrix (using provided coefficients and K_init)
-        C = alpha_M * M + beta_K * K_init
-
-        # Initialize nonlinear state variables per story
-        story_force = np.zeros(num_dof) # Force in each story from previous converged step
-        story_peak_pos_drift = np.zeros(num_dof) # Max positive drift reached
-        story_peak_neg_drift = np.zeros(num_dof) # Min negative drift reached
-        
-        # Tolerances for Newton-Raphson
-        tol_nr = 1e-5
-        max_iter_nr = 50
-
-    else:
-        raise ValueError("model_type must be 'linear' or 'nonlinear'.")
-
-    # --- Time Stepping Loop ---
-    for j in range(n_steps - 1):
-        # External force vector for step j+1
-        P_ext = -M @ influence_vector * accel_gm[j+1] # Shape (3, 1)
-
-        # Effective force P_hat from previous step properties (used in linear and NR initial guess)
-        term_M = M @ (a0 * disp[j, :] + a1 * vel[j, :] + a2 * acc[j, :]) # Shape (3,)
-        term_C = C @ (a7 * disp[j, :] + a8 * vel[j, :] + a9 * acc[j, :]) # Shape (3,)
-        P_hat = P_ext.flatten() + term_M + term_C # Flatten P_ext to (3,)
-
-        if model_type == 'linear':
-            # --- Linear Step ---
-            if K_eff_inv is None: # Calculate inverse/factorization only once
-                 try:
-                     K_eff_inv = np.linalg.inv(K_eff)
-                 except np.linalg.LinAlgError:
-                     raise RuntimeError("Effective stiffness matrix K_eff is singular.")
-            
-            # Solve for displacement at j+1
-            disp[j+1, :] = K_eff_inv @ P_hat
-            
-            # Update velocity and acceleration using Newmark equations
-            vel[j+1, :] = a7 * (disp[j+1, :] - disp[j, :]) - a8 * vel[j, :] - a9 * acc[j, :]
-            acc[j+1, :] = a0 * (disp[j+1, :] - disp[j, :]) - a1 * vel[j, :] - a2 * acc[j, :]
-
-        elif model_type == 'nonlinear':
-            # --- Nonlinear Step (Newton-Raphson) ---
-            # Initial guess for iteration (k=0)
-            u_k = disp[j, :] # Guess for u[j+1]
-            
-            iter_nr = 0
-            converged_nr = False
-            
-            while iter_nr < max_iter_nr and not converged_nr:
-                 iter_nr += 1
-                 
-                 # Calculate interstory drifts for current guess u_k
-                 delta_k = T_mat @ u_k
-                 
-                 # Interstory drift from previous *converged* step j
-                 delta_prev = T_mat @ disp[j, :]
-
-                 # Calculate tangent stiffness and restoring force for each story using hysteresis
-                 kt_stories = np.zeros(num_dof)
-                 fs_stories = np.zeros(num_dof)
-                 
-                 for story_i in range(num_dof):
-                     ki = k_init_stories[story_i]
-                     dy = delta_y[story_i]
-                     fy = Fy[story_i]
-                     ai = alpha
-                     k_post = ai * ki
-                     dk = delta_k[story_i]       # Current iteration drift guess
-                     dk_prev = delta_prev[story_i] # Previous converged step drift
-                     fs_prev = story_force[story_i]  # Previous converged step force
-                     d_max = story_peak_pos_drift[story_i]
-                     d_min = story_peak_neg_drift[story_i]
-
-                     # --- Hysteresis Logic ---
-                     # 1. Determine Tangent Stiffness (kt) based on loading path
-                     if dk > d_max or dk < d_min:  # Loading on backbone beyond previous peaks
-                         kt = k_post
-                     else: # Unloading or reloading within bounds [d_min, d_max]
-                         kt = ki
-
-                     # 2. Determine Force (fs) based on path
-                     # Potential force assuming current stiffness applies from prev step
-                     fs_trial = fs_prev + kt * (dk - dk_prev)
-
-                     # Calculate backbone force at current drift dk
-                     if abs(dk) <= dy:
-                         f_backbone = ki * dk
-                     elif dk > dy:
-                         f_backbone = fy + k_post * (dk - dy)
-                     else: # dk < -dy
-                         f_backbone = -fy + k_post * (dk + dy)
-
-                     # Apply constraints / Select force
-                     if kt == k_post: # Must be on the backbone
-                         fs = f_backbone
-                     else: # Unloading/reloading (kt = ki), ensure doesn't exceed backbone
-                         if dk > dk_prev: # Loading positively
-                              fs = min(fs_trial, f_backbone)
-                         elif dk < dk_prev: # Loading negatively
-                              fs = max(fs_trial, f_backbone)
-                         else: # No change in drift
-                              fs = fs_prev # Or fs_trial, should be same
-
-                     fs_stories[story_i] = fs
-                     kt_stories[story_i] = kt
-                     # --- End Hysteresis Logic ---
-
-                 # Assemble global tangent stiffness K_T
-                 K_T = np.zeros((num_dof, num_dof))
-                 K_T[num_dof-1, num_dof-1] = kt_stories[num_dof-1]
-                 for i in range(num_dof - 2, -1, -1):
-                     K_T[i, i] = kt_stories[i] + kt_stories[i+1]
-                     K_T[i, i+1] = -kt_stories[i+1]
-                     K_T[i+1, i] = -kt_stories[i+1]
-                     
-                 # Assemble global restoring force Fs
-                 Fs_k = T_mat.T @ fs_stories # Fs = T^T * fs_story
-                 
-                 # Calculate corresponding velocity and acceleration for u_k using Newmark
-                 # These are needed if residual is defined based on EoM at j+1
-                 v_k = a7 * (u_k - disp[j,:]) - a8 * vel[j,:] - a9 * acc[j,:]
-                 a_k = a0 * (u_k - disp[j,:]) - a1 * vel[j,:] - a2 * acc[j,:]
-                 
-                 # Calculate Residual Force Vector
-                 # R = P_ext - Fs_k - C @ v_k - M @ a_k
-                 Residual = P_ext.flatten() - Fs_k - C @ v_k - M @ a_k # Flatten P_ext
-
-                 # Check for NaN/Inf in Residual before checking norm
-                 if np.isnan(Residual).any() or np.isinf(Residual).any():
-                     warnings.warn(f"NaN or Inf detected in Residual at step {j+1}, iter {iter_nr}. Aborting NR.", RuntimeWarning)
-                     converged_nr = False # Mark as not converged
-                     break # Exit NR loop immediately
-
-                 # Check convergence
-                 residual_norm = np.linalg.norm(Residual)
-                 if residual_norm < tol_nr:
-                     converged_nr = True
-                     disp[j+1, :] = u_k
-                     vel[j+1, :] = v_k
-                     acc[j+1, :] = a_k
-
-                     # --- Update State Variables upon Convergence ---
-                     final_delta = T_mat @ disp[j+1, :] # Final drifts for step j+1
-                     story_force = fs_stories # Store converged forces for next step
-                     for story_i in range(num_dof):
-                         story_peak_pos_drift[story_i] = max(story_peak_pos_drift[story_i], final_delta[story_i])
-                         story_peak_neg_drift[story_i] = min(story_peak_neg_drift[story_i], final_delta[story_i])
-                     # --- End State Update ---
-                     break # Exit NR loop
-                     
-                 # Calculate Effective Tangent Stiffness
-                 K_eff_T = K_T + a0 * M + a7 * C
-                 
-                 # Solve for correction
-                 try:
-                     # Check if K_eff_T contains NaN/Inf before solving
-                     if np.isnan(K_eff_T).any() or np.isinf(K_eff_T).any():
-                         warnings.warn(f"NaN or Inf detected in K_eff_T at step {j+1}, iter {iter_nr}. Aborting NR.", RuntimeWarning)
-                         converged_nr = False
-                         break # Exit NR loop
-                         
-                     delta_u = solve(K_eff_T, Residual, assume_a='sym') # Assume symmetric
-                     
-                     # Check for NaN/Inf in correction
-                     if np.isnan(delta_u).any() or np.isinf(delta_u).any():
-                         warnings.warn(f"NaN or Inf detected in delta_u at step {j+1}, iter {iter_nr}. Aborting NR.", RuntimeWarning)
-                         converged_nr = False
-                         break # Exit NR loop
-                         
-                 except np.linalg.LinAlgError:
-                     print(f"Warning: K_eff_T singular at step {j+1}, iter {iter_nr}. Using pseudo-inverse.")
-
-                 # Update displacement guess
-                 u_k = u_k + delta_u
-                 
-            # End of Newton-Raphson loop
-            if not converged_nr:
-                 warnings.warn(f"Newton-Raphson failed to converge at time step {j+1} (t={time[j+1]:.3f}s). Results may be inaccurate.", RuntimeWarning)
-                 # Use the last iteration's results? Or stop? Let's use last results for now.
-                 # Using last calculated u_k, v_k, a_k from the final iteration attempt
-                 disp[j+1, :] = u_k
-                 vel[j+1, :] = a7 * (u_k - disp[j,:]) - a8 * vel[j,:] - a9 * acc[j,:]
-                 acc[j+1, :] = a0 * (u_k - disp[j,:]) - a1 * vel[j,:] - a2 * acc[j,:]
-
-                 # Calculate story forces based on the non-converged displacement u_k
-                 # Use the same hysteresis logic with the final u_k to get consistent forces
-                 final_delta_nonconv = T_mat @ u_k
-                 fs_stories_nonconv = np.zeros(num_dof)
-                 delta_prev = T_mat @ disp[j, :] # Previous converged step drift
-                 for story_i in range(num_dof):
-                     # Simplified recalculation for non-converged step: Use backbone directly?
-                     # Or apply the same hysteresis logic as above? Let's use hysteresis for consistency
-                     ki = k_init_stories[story_i]; dy = delta_y[story_i]; fy = Fy[story_i]; ai = alpha; k_post = ai * ki
-                     dk = final_delta_nonconv[story_i]; dk_prev = delta_prev[story_i]; fs_prev = story_force[story_i]
-                     d_max = story_peak_pos_drift[story_i]; d_min = story_peak_neg_drift[story_i]
-
-                     if dk > d_max or dk < d_min: kt = k_post
-                     else: kt = ki
-
-                     fs_trial = fs_prev + kt * (dk - dk_prev)
-
-                     if abs(dk) <= dy: f_backbone = ki * dk
-                     elif dk > dy: f_backbone = fy + k_post * (dk - dy)
-                     else: f_backbone = -fy + k_post * (dk + dy)
-
-                     if kt == k_post: fs = f_backbone
-                     else:
-                         if dk > dk_prev: fs = min(fs_trial, f_backbone)
-                         elif dk < dk_prev: fs = max(fs_trial, f_backbone)
-                         else: fs = fs_prev
-                     fs_stories_nonconv[story_i] = fs
-
-                 story_force = fs_stories_nonconv # Store these forces for next step
-                 # Update peak drifts based on this non-converged step's displacement
-                 for story_i in range(num_dof):
-                     story_peak_pos_drift[story_i] = max(story_peak_pos_drift[story_i], final_delta_nonconv[story_i])
-                     story_peak_neg_drift[story_i] = min(story_peak_neg_drift[story_i], final_delta_nonconv[story_i])
-
-    # --- Post-Processing: Calculate PIDR ---
-    # Calculate all interstory drifts
-    with warnings.catch_warnings(): # Suppress potential warnings from NaN comparisons if analysis failed
-        warnings.simplefilter("ignore", category=RuntimeWarning)
-        interstory_drifts = disp @ T_mat.T # disp is N x Dof, T_mat is Dof x Dof => drifts N x Dof
-
-        # Find peak absolute drift for each story, ignoring NaNs
-        try:
-            peak_abs_interstory_drifts = np.nanmax(np.abs(interstory_drifts), axis=0)
-        except ValueError: # Handle case where all drifts might be NaN
-             peak_abs_interstory_drifts = np.full(num_dof, np.nan)
-
-        # Calculate PIDR, handle division by zero or NaN/Inf heights (unlikely but safe)
-        H_safe = np.where(np.abs(H) > 1e-9, H, np.nan) # Avoid division by zero/small H
-        PIDR_stories = peak_abs_interstory_drifts / H_safe
-
-        # Find overall maximum PIDR, ignoring NaNs
-        try:
-            maxPIDR = np.nanmax(PIDR_stories)
-        except ValueError: # Handle case where all PIDRs are NaN
-            maxPIDR = np.nan
-
-    # --- Assemble Results ---
-    results = {
-        'time': time,
-        'disp': disp,       # meters
-        'PIDR': PIDR_stories, # dimensionless
-        'maxPIDR': maxPIDR    # dimensionless
-        # Optional: return velocity, acceleration, story forces etc.
-        # 'vel': vel,
-        # 'acc': acc,
-    }
-
-    return results
-
-# Example Usage (Optional)
-# if __name__ == '__main__':
-#     from ..02_StructuralModels.define_linear_3dof import define_linear_3dof
-#     from ..02_StructuralModels.define_nonlinear_3dof import define_nonlinear_3dof
-#
-#     # 1. Define Models
-#     try:
-#         M_l, K_l, T1_l, H_l = define_linear_3dof(target_T1=0.6)
-#         M_nl, K_init_nl, Fy_nl, alpha_nl, H_nl = define_nonlinear_3dof(M_l, K_l, H_l, yield_drift_ratio=0.005, alpha_post_yield=0.05)
-#     except Exception as e:
-#         print(f"Error defining models: {e}")
-#         exit()
-#
-#     # 2. Create Sample Ground Motion (e.g., sine wave in g)
-#     dt_gm = 0.01
-#     sim_time = 10.0
-#     time_gm = np.arange(0, sim_time, dt_gm)
-#     freq_gm = 1.0 / T1_l # Excite near resonance
-#     accel_input_g = 0.5 * np.sin(2 * np.pi * freq_gm * time_gm)
-#     accel_input_g = accel_input_g.reshape(-1, 1)
-#
-#     print(f"\n--- Running Linear Analysis ---")
-#     try:
-#         results_lin = run_time_history(
-#             model_type='linear',
-#             M=M_l,
-#             K_or_Fy=K_l,
-#             dt=dt_gm,
-#             accel_gm_g=accel_input_g,
-#             H=H_l,
-#             alpha_M=0.05, # Pass coeffs
-#             beta_K=0.05,  # Pass coeffs
-#             K_init=K_l # Pass K_l as K_init for damping calc
-#         )
-#         print(f"Linear Analysis Max PIDR: {results_lin['maxPIDR']:.6f}")
-#         print(f"Linear Story PIDRs: {results_lin['PIDR']}")
-#     except Exception as e:
-#         print(f"Linear analysis failed: {e}")
-#
-#
-#     print(f"\n--- Running Nonlinear Analysis ---")
-#     try:
-#         results_nl = run_time_history(
-#             model_type='nonlinear',
-#             M=M_nl,
-#             K_or_Fy=Fy_nl, # Pass Fy vector
-#             dt=dt_gm,
-#             accel_gm_g=accel_input_g,
-#             H=H_nl,
-#             alpha_M=0.05, # Pass coeffs
-#             beta_K=0.05,  # Pass coeffs
-#             K_init=K_init_nl, # Pass K_init
-#             alpha=alpha_nl      # Pass alpha
-#         )
-#         print(f"Nonlinear Analysis Max PIDR: {results_nl['maxPIDR']:.6f}")
-#         print(f"Nonlinear Story PIDRs: {results_nl['PIDR']}")
-#     except Exception as e:
-#         print(f"Nonlinear analysis failed: {e}")
-#
-#     # Plotting (optional)
-#     import matplotlib.pyplot as plt
-#     plt.figure(figsize=(10, 6))
-#
-#     plt.subplot(2, 1, 1)
-#     plt.plot(results_lin['time'], results_lin['disp'][:, -1], label=f'Linear Top Floor Disp (Max PIDR={results_lin["maxPIDR"]:.4f})')
-#     if 'results_nl' in locals():
-#          plt.plot(results_nl['time'], results_nl['disp'][:, -1], '--', label=f'Nonlinear Top Floor Disp (Max PIDR={results_nl["maxPIDR"]:.4f})')
-#     plt.ylabel('Displacement (m)')
-#     plt.title('Top Floor Displacement Comparison')
-#     plt.legend()
-#     plt.grid(True)
-#
-#     plt.subplot(2, 1, 2)
-#     plt.plot(results_lin['time'], accel_input_g, label='Ground Motion (g)', color='gray')
-#     plt.ylabel('Accel (g)')
-#     plt.xlabel('Time (s)')
-#     plt.legend()
-#     plt.grid(True)
-#
-#     plt.tight_layout()
-#     plt.show()
-#
+import numpy as np
+from scipy.linalg import solve, eigh
+from scipy.signal import lfilter, ss2tf
+import warnings
+from time import perf_counter
+
+from Analysis.banded import (is_sym_tridiagonal, tridiagonal_bands, sym_tridiagonal_matvec,
+                             factor_sym_tridiagonal, solve_factored_sym_tridiagonal, solve_sym_tridiagonal)
+from Analysis.calculate_drifts import (drift_ratios_from_peaks as _drift_ratios_from_peaks,
+                                       peak_drift_ratios as _peak_drift_ratios, story_drifts as _story_drifts)
+from Analysis.hysteresis import (G_ACCEL, bilinear_story_response as _bilinear_story_response,
+                                 story_to_global_force as _story_to_global_force)
+from Analysis.nonlinear_kernel import run_nonlinear_kernel
+
+def _newmark_constants(dt: float, gamma: float = 0.5, beta: float = 0.25) -> tuple:
+    """Returns the implicit Newmark constants (a0, a1, a2, a7, a8, a9) used by the solvers."""
+    a0 = 1.0 / (beta * dt**2)
+    a1 = 1.0 / (beta * dt)
+    a2 = 1.0 / (2.0 * beta) - 1.0
+    a7 = gamma / (beta * dt)
+    # Signs chosen so that v[j+1] = a7*(u[j+1]-u[j]) - a8*v[j] - a9*a[j] and
+    # P_hat uses C @ (a7*u + a8*v + a9*a) (Chopra, Table 5.4.2)
+    a8 = gamma / beta - 1.0
+    a9 = dt * (gamma / (2.0 * beta) - 1.0)
+    return a0, a1, a2, a7, a8, a9
+
+def _shear_story_stiffness(K_init: np.ndarray) -> np.ndarray:
+    """Extracts story stiffnesses k_i from a shear-building stiffness matrix (K[i,i] = k_i + k_{i+1})."""
+    num_dof = K_init.shape[0]
+    k_stories = np.zeros(num_dof)
+    k_stories[num_dof - 1] = K_init[num_dof - 1, num_dof - 1]
+    for i in range(num_dof - 2, -1, -1):
+        if not np.isclose(K_init[i, i+1], -k_stories[i + 1]):
+            warnings.warn(f"Off-diagonal term K_init[{i},{i+1}] does not match -k_{i+1} from diagonal. K_init might not be standard shear building form.", RuntimeWarning)
+        k_stories[i] = K_init[i, i] - k_stories[i + 1]
+    if np.any(k_stories <= 0): raise ValueError("Derived initial story stiffnesses must be positive.")
+    return k_stories
+
+def _record_stride(record: str, record_every: int | None) -> int:
+    """Step stride of the stored displacement history for a record mode (0: no history)."""
+    if record == 'full':
+        if record_every not in (None, 1): raise ValueError("record_every requires record='peaks'.")
+        return 1
+    if record != 'peaks': raise ValueError("record must be 'full' or 'peaks'.")
+    if record_every is None:
+        return 0
+    if int(record_every) < 1: raise ValueError("record_every must be a positive integer.")
+    return int(record_every)
+
+def _n_recorded(n_steps: int, stride: int) -> int:
+    """Rows of a history that keeps steps 0, stride, 2*stride, ... (0 if stride is 0)."""
+    return 0 if stride == 0 else (n_steps - 1) // stride + 1
+
+def _stop_limit(drift_thresholds, collapse_drift) -> float:
+    """Drift ratio at which an analysis outcome is decided (np.inf: never stop early)."""
+    limits = []
+    if drift_thresholds is not None and np.size(drift_thresholds):
+        limits.append(float(np.max(drift_thresholds))) # Every damage-state threshold exceeded
+    if collapse_drift is not None:
+        limits.append(float(collapse_drift))
+    return min(limits) if limits else np.inf
+
+def _stop_reason(u: np.ndarray, H: np.ndarray, stop_drift: float, collapse_drift: float | None) -> str | None:
+    """Reason to stop after a step with displacement u: 'diverged', 'collapse', 'thresholds' or None."""
+    if not np.all(np.isfinite(u)):
+        return 'diverged'
+    ratio = np.max(np.abs(_story_drifts(u)) / H)
+    if ratio < stop_drift:
+        return None
+    return 'collapse' if collapse_drift is not None and ratio >= collapse_drift else 'thresholds'
+
+def _peak_floor_accels(peak_abs_accel: np.ndarray) -> tuple:
+    """PFA per floor (g) and maxPFA from peak absolute floor accelerations (m/s^2) of shape (..., num_dof)."""
+    PFA = peak_abs_accel / G_ACCEL
+    return PFA, np.max(PFA, axis=-1)
+
+def _peak_abs_over_steps(values: np.ndarray) -> np.ndarray:
+    """
+    Peak |value| over the step axis of (..., n_steps, num_dof) histories, skipping NaN as np.nanmax
+    does. Reduced one DOF at a time: with the short DOF axis innermost the reduction is several
+    times slower.
+    """
+    return np.stack([np.fmax.reduce(np.abs(values[..., i]), axis=-1) for i in range(values.shape[-1])], axis=-1)
+
+def _first_stop_step(disp: np.ndarray, H: np.ndarray, stop_drift: float) -> np.ndarray:
+    """First step of (..., n_steps, num_dof) histories at which the analysis would have stopped (-1: none)."""
+    with np.errstate(invalid='ignore'):
+        ratio = np.max(np.abs(_story_drifts(disp)) / H, axis=-1)
+        hit = ~np.isfinite(ratio) | (ratio >= stop_drift)
+    return np.where(hit.any(axis=-1), np.argmax(hit, axis=-1), -1)
+
+# --- Profiling (run_time_history(profile=True)) ---
+PROFILE_PHASES = ('step_setup', 'hysteresis', 'assembly', 'solve', 'checks', 'state_update', 'recording')
+
+def _phase_timer(phase_time: dict):
+    """lap(phase) that adds the wall time since the previous lap (or since this call) to phase_time[phase]."""
+    last = perf_counter()
+    def lap(phase: str):
+        nonlocal last
+        now = perf_counter()
+        phase_time[phase] += now - last
+        last = now
+    return lap
+
+def _no_lap(phase: str):
+    """lap when profiling is off: does nothing."""
+
+def merge_profiles(profiles: list) -> dict:
+    """
+    Aggregates 'profile' dicts of several run_time_history analyses (e.g. all analyses of an IDA).
+
+    Args:
+        profiles (list): Profiles from run_time_history(..., profile=True); None entries are skipped.
+
+    Returns:
+        dict: Profile with the same keys, phase times and counters summed and NR histograms added.
+    """
+    profiles = [p for p in profiles if p is not None]
+    n_bins = max((p['nr_histogram'].size for p in profiles), default=0)
+    nr_histogram = np.zeros(n_bins, dtype=np.int64)
+    for p in profiles:
+        nr_histogram[:p['nr_histogram'].size] += p['nr_histogram']
+    merged = {'phase_time': {phase: sum(p['phase_time'][phase] for p in profiles) for phase in PROFILE_PHASES},
+              'nr_histogram': nr_histogram}
+    for key in ('total_time', 'n_analyses', 'n_steps', 'failed_steps', 'step_rejections', 'factorizations', 'tangent_reuses'):
+        merged[key] = sum(p[key] for p in profiles)
+    return merged
+
+def _substep_constants(model: dict, dt: float, level: int, cache: dict) -> dict:
+    """Newmark constants, K_dyn = a0*M + a7*C and a tangent cache for sub-steps of dt / 2**level (memoized in cache)."""
+    if level not in cache:
+        a0, a1, a2, a7, a8, a9 = newmark = _newmark_constants(dt / 2**level)
+        cache[level] = {'newmark': newmark, 'K_dyn': a0 * model['M'] + a7 * model['C'], 'tangent': {},
+                        'M_iota': model['M'] @ np.ones(model['M'].shape[0])}
+    return cache[level]
+
+def _nonlinear_nr_step(model: dict,
+                       consts: dict,
+                       u_prev: np.ndarray,
+                       v_prev: np.ndarray,
+                       a_prev: np.ndarray,
+                       ag_next: float,
+                       hysteresis: tuple,
+                       tol_nr: float,
+                       max_iter_nr: int,
+                       stats: dict,
+                       lap=_no_lap
+                       ) -> tuple:
+    """
+    One Newmark step of the nonlinear model solved by Newton-Raphson with a cached tangent.
+
+    The inverse of K_eff_T = K_T + a0*M + a7*C is kept in consts['tangent'] and reused (modified
+    Newton) while every story stays on the same branch (elastic or post-yield), i.e. while the
+    cached tangent is still the exact one; it is recomputed only when a story changes branch.
+    A non-converged step returns its last iterate, as the default loop accepts it.
+
+    Args:
+        model (dict): Prepared nonlinear model (see _prepare_model).
+        consts (dict): Sub-step constants from _substep_constants.
+        u_prev, v_prev, a_prev (np.ndarray): Converged state at the start of the step (DOF,).
+        ag_next (float): Ground acceleration at the end of the step (m/s^2).
+        hysteresis (tuple): Story force, peak positive and peak negative drift from the last
+                            converged step (DOF,) each; not modified.
+        tol_nr (float), max_iter_nr (int): Newton-Raphson tolerance and iteration limit.
+        stats (dict): Counters 'factorizations' and 'tangent_reuses', incremented in place.
+        lap (callable, optional): Phase timer from _phase_timer (profiling). Defaults to _no_lap.
+
+    Returns:
+        tuple: u, v, a, story forces at u, converged flag and the number of NR iterations.
+    """
+    a0, a1, a2, a7, a8, a9 = consts['newmark']
+    M, C = model['M'], model['C']
+    story_force, peak_pos, peak_neg = hysteresis
+    tangent = consts['tangent']
+    P_ext = -consts['M_iota'] * ag_next
+    delta_prev = _story_drifts(u_prev)
+
+    def state(u):
+        fs, kt = _bilinear_story_response(_story_drifts(u), delta_prev, story_force, peak_pos, peak_neg,
+                                          model['k_stories'], model['delta_y'], model['Fy'], model['alpha'])
+        return fs, kt, a7 * (u - u_prev) - a8 * v_prev - a9 * a_prev, a0 * (u - u_prev) - a1 * v_prev - a2 * a_prev
+
+    u_k = u_prev.copy()
+    for iter_nr in range(1, max_iter_nr + 1):
+        fs, kt, v_k, a_k = state(u_k)
+        lap('hysteresis')
+        Residual = P_ext - _story_to_global_force(fs) - C @ v_k - M @ a_k
+        lap('assembly')
+        if not np.all(np.isfinite(Residual)):
+            break
+        if np.linalg.norm(Residual) < tol_nr:
+            lap('checks')
+            return u_k, v_k, a_k, fs, True, iter_nr
+        lap('checks')
+
+        if 'kt' in tangent and np.array_equal(kt, tangent['kt']):
+            stats['tangent_reuses'] += 1
+        else:
+            K_eff_T = np.diag(kt + np.append(kt[1:], 0.0)) - np.diag(kt[1:], 1) - np.diag(kt[1:], -1) + consts['K_dyn']
+            lap('assembly')
+            try:
+                K_eff_T_inv = np.linalg.inv(K_eff_T)
+            except np.linalg.LinAlgError:
+                K_eff_T_inv = np.linalg.pinv(K_eff_T)
+            tangent.update(kt=kt, K_inv=K_eff_T_inv)
+            stats['factorizations'] += 1
+        delta_u = tangent['K_inv'] @ Residual
+        lap('solve')
+        if not np.all(np.isfinite(delta_u)):
+            break
+        u_k = u_k + delta_u
+        lap('checks')
+
+    lap('checks') # Aborted iteration
+    fs, _, v_k, a_k = state(u_k)
+    lap('state_update')
+    return u_k, v_k, a_k, fs, False, iter_nr
+
+def _adaptive_nonlinear_step(model: dict,
+                             dt: float,
+                             level_cache: dict,
+                             u_prev: np.ndarray,
+                             v_prev: np.ndarray,
+                             a_prev: np.ndarray,
+                             ag_prev: float,
+                             ag_next: float,
+                             hysteresis: tuple,
+                             level: int,
+                             max_level: int,
+                             tol_nr: float,
+                             max_iter_nr: int,
+                             stats: dict,
+                             lap=_no_lap
+                             ) -> tuple:
+    """
+    Advances the nonlinear model over one ground motion step split into 2**level equal sub-steps
+    (ground acceleration interpolated linearly). If Newton-Raphson fails in a sub-step, the step
+    is restarted from its initial state with twice as many sub-steps, up to 2**max_level; at the
+    finest level a non-converged sub-step is accepted, as in the default loop.
+
+    The hysteresis arrays (story force, peak positive/negative drift) are updated in place, and
+    every restart is counted in stats['step_rejections']. lap times the phases (profiling).
+
+    Returns:
+        tuple: u, v, a at the end of the step, the level used, the NR iterations spent (including
+               abandoned attempts) and whether every sub-step converged.
+    """
+    story_force, peak_pos, peak_neg = hysteresis
+    saved = [arr.copy() for arr in hysteresis]
+    n_iter = 0
+    while True:
+        n_sub = 2**level
+        consts = _substep_constants(model, dt, level, level_cache)
+        u, v, a = u_prev, v_prev, a_prev
+        all_converged = True
+        for k in range(1, n_sub + 1):
+            ag = ag_prev + (ag_next - ag_prev) * k / n_sub
+            u, v, a, fs, conv, it = _nonlinear_nr_step(model, consts, u, v, a, ag, hysteresis, tol_nr, max_iter_nr, stats, lap)
+            n_iter += it
+            if not conv and level < max_level:
+                all_converged = False
+                break
+            all_converged &= conv
+            delta = _story_drifts(u)
+            story_force[:] = fs
+            np.maximum(peak_pos, delta, out=peak_pos)
+            np.minimum(peak_neg, delta, out=peak_neg)
+            lap('state_update')
+        if all_converged or level >= max_level:
+            return u, v, a, level, n_iter, all_converged
+        for arr, old in zip(hysteresis, saved): # Restart the step with finer sub-steps
+            arr[:] = old
+        stats['step_rejections'] += 1
+        level += 1
+
+def _prepare_model(model_type: str,
+                   M: np.ndarray,
+                   K_or_Fy: np.ndarray,
+                   dt: float,
+                   alpha_M: float,
+                   beta_K: float,
+                   K_init: np.ndarray | None = None,
+                   alpha: float | None = None
+                   ) -> dict:
+    """
+    Validates the structural model and precomputes the matrices shared by every analysis of it.
+
+    Returns:
+        dict: 'model_type', 'M', 'C', Newmark constants 'newmark', and either 'K', 'K_eff_inv'
+              (linear) or 'k_stories', 'delta_y', 'Fy', 'alpha', 'K_dyn' (nonlinear; K_dyn = a0*M + a7*C).
+    """
+    num_dof = M.shape[0]
+    if M.shape != (num_dof, num_dof): raise ValueError("M matrix shape mismatch.")
+    a0, a1, a2, a7, a8, a9 = newmark = _newmark_constants(dt)
+    model = {'model_type': model_type, 'M': M, 'newmark': newmark}
+
+    if model_type == 'linear':
+        K = K_or_Fy
+        if K.shape != (num_dof, num_dof): raise ValueError("K matrix shape mismatch for linear model.")
+        if K_init is None:
+            K_init = K
+            if beta_K != 0:
+                warnings.warn("K_init not provided for linear analysis with non-zero beta_K. Using K for damping calculation.", RuntimeWarning)
+        elif K_init.shape != (num_dof, num_dof):
+            raise ValueError("Provided K_init matrix shape mismatch for linear model.")
+        C = alpha_M * M + beta_K * K_init
+        try:
+            K_eff_inv = np.linalg.inv(K + a0 * M + a7 * C)
+        except np.linalg.LinAlgError:
+            raise RuntimeError("Effective stiffness matrix K_eff is singular.")
+        model.update(K=K, C=C, K_eff_inv=K_eff_inv)
+
+    elif model_type == 'nonlinear':
+        Fy = np.asarray(K_or_Fy, dtype=float).flatten()
+        if K_init is None or alpha is None:
+            raise ValueError("K_init and alpha are required for nonlinear analysis.")
+        if K_init.shape != (num_dof, num_dof): raise ValueError("K_init matrix shape mismatch.")
+        if Fy.shape != (num_dof,): raise ValueError("Fy vector shape mismatch.")
+        k_stories = _shear_story_stiffness(K_init)
+        C = alpha_M * M + beta_K * K_init
+        model.update(C=C, Fy=Fy, alpha=alpha, k_stories=k_stories, delta_y=Fy / k_stories,
+                     K_dyn=a0 * M + a7 * C)
+
+    else:
+        raise ValueError("model_type must be 'linear' or 'nonlinear'.")
+
+    return model
+
+def _newmark_amplification(M: np.ndarray, C: np.ndarray, K: np.ndarray, newmark: tuple) -> tuple:
+    """
+    Linear Newmark step written as a fixed recurrence x[j+1] = A @ x[j] + B @ p[j+1], x = [u, v, a].
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Amplification matrix A (3n x 3n) and load operator B (3n x n).
+    """
+    a0, a1, a2, a7, a8, a9 = newmark
+    n = M.shape[0]
+    I, Z = np.eye(n), np.zeros((n, n))
+    K_eff_inv = np.linalg.inv(K + a0 * M + a7 * C)
+    U = K_eff_inv @ np.hstack([a0 * M + a7 * C, a1 * M + a8 * C, a2 * M + a9 * C]) # u[j+1] from x[j]
+    dU = U - np.hstack([I, Z, Z])
+    A = np.vstack([U,
+                   a7 * dU - np.hstack([Z, a8 * I, a9 * I]),
+                   a0 * dU - np.hstack([Z, a1 * I, a2 * I])])
+    B = np.vstack([K_eff_inv, a7 * K_eff_inv, a0 * K_eff_inv])
+    return A, B
+
+def _linear_recurrence_disp(model: dict, accel_gm: np.ndarray, with_accel: bool = False):
+    """
+    Displacement histories of the linear model for a (n_batch, n_steps) stack of ground
+    accelerations (m/s^2), identical to stepping the Newmark loop.
+
+    With classical (Rayleigh) damping the recurrence decouples in the mass-normalized modes
+    (K phi = w^2 M phi), and each modal coordinate is a third-order IIR filter of the ground
+    motion evaluated with scipy.signal.lfilter. Otherwise the full-state recurrence is
+    stepped with the precomputed amplification matrix.
+
+    With with_accel=True returns (disp, accel): the relative accelerations of the same steps are
+    filtered from the acceleration state of the recurrence.
+    """
+    M, C, K, newmark = model['M'], model['C'], model['K'], model['newmark']
+    n_batch, n_steps = accel_gm.shape
+    num_dof = M.shape[0]
+    M_iota = M @ np.ones(num_dof)
+
+    omega_sq, Phi = eigh(K, M) # Phi.T @ M @ Phi = I
+    C_modal = Phi.T @ C @ Phi
+    off_diag = C_modal - np.diag(np.diag(C_modal))
+    if np.all(np.isfinite(omega_sq)) and np.max(np.abs(off_diag), initial=0.0) <= 1e-10 * np.max(np.abs(C_modal), initial=1.0):
+        gamma_modal = Phi.T @ M_iota # Modal participation factors
+        impulse = np.zeros(n_steps)
+        impulse[0] = 1.0
+        c_out = np.array([[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])[:2 if with_accel else 1] # Displacement (acceleration) state
+        q = np.empty((len(c_out), n_batch, n_steps, num_dof))
+        for i in range(num_dof):
+            A, B = _newmark_amplification(np.eye(1), C_modal[i:i+1, i:i+1], omega_sq[i:i+1, np.newaxis], newmark)
+            # Zero-state response to p[0..], plus the correction for the start state x[0] = [0, 0, p[0]]
+            num_p, den = ss2tf(A, B, c_out @ A, c_out @ B)
+            d0 = np.array([[0.0], [0.0], [1.0]]) - B
+            num_0, _ = ss2tf(A, d0, c_out @ A, c_out @ d0)
+            for k in range(len(c_out)):
+                y = lfilter(num_p[k], den, accel_gm, axis=-1)
+                y += lfilter(num_0[k], den, impulse)[np.newaxis, :] * accel_gm[:, 0:1]
+                q[k, :, :, i] = -gamma_modal[i] * y
+        out = q @ Phi.T
+        return (out[0], out[1]) if with_accel else out[0]
+
+    # Non-classical damping: step the full-state recurrence for the whole batch
+    A, B = _newmark_amplification(M, C, K, newmark)
+    A_T, P_T = A.T, -(B @ M_iota)[np.newaxis, :]
+    x = np.zeros((n_batch, 3 * num_dof))
+    x[:, 2 * num_dof:] = -accel_gm[:, 0:1]
+    disp = np.zeros((n_batch, n_steps, num_dof))
+    accel = np.repeat(x[:, np.newaxis, 2 * num_dof:], n_steps, axis=1) if with_accel else None
+    for j in range(n_steps - 1):
+        x = x @ A_T + accel_gm[:, j+1, np.newaxis] * P_T
+        disp[:, j+1] = x[:, :num_dof]
+        if with_accel:
+            accel[:, j+1] = x[:, 2 * num_dof:]
+    return (disp, accel) if with_accel else disp
+
+def run_time_history(model_type: str,
+                       M: np.ndarray,
+                       K_or_Fy: np.ndarray, # K (linear) or Fy (nonlinear)
+                       dt: float,
+                       accel_gm_g: np.ndarray,
+                       H: np.ndarray,
+                       alpha_M: float, # Rayleigh damping coefficient for Mass
+                       beta_K: float,  # Rayleigh damping coefficient for Initial Stiffness
+                       K_init: np.ndarray | None = None, # Initial stiffness (required for nonlinear AND linear if passing beta_K)
+                       alpha: float | None = None,     # Post-yield stiffness ratio (required if nonlinear)
+                       linear_method: str = 'newmark', # 'newmark' (step loop) or 'modal' (precomputed recurrence)
+                       nonlinear_kernel: bool = False, # Use the compiled tridiagonal NR kernel (nonlinear)
+                       drift_thresholds: np.ndarray | None = None, # Damage-state PIDR thresholds (early termination)
+                       collapse_drift: float | None = None,        # PIDR treated as collapse (early termination)
+                       record: str = 'full',             # 'full' history or 'peaks' (rolling state + peak drifts)
+                       record_every: int | None = None,  # With record='peaks': also keep every n-th step of disp
+                       adaptive_substeps: int = 0,       # Max step halvings when NR fails (nonlinear, 0: off)
+                       profile: bool = False             # Per-phase timers and NR statistics in results['profile']
+                       ) -> dict:
+    """
+    Performs time history analysis using the Newmark-Beta method with provided Rayleigh damping coefficients.
+
+    Args:
+        model_type (str): 'linear' or 'nonlinear'.
+        M (np.ndarray): 3x3 Mass matrix (kg).
+        K_or_Fy (np.ndarray): If 'linear', 3x3 Stiffness matrix K (N/m).
+                              If 'nonlinear', 3x1 Yield force vector Fy (N).
+        dt (float): Time step of the ground motion (seconds).
+        accel_gm_g (np.ndarray): Ground acceleration column vector (units: g).
+        H (np.ndarray): 3x1 Story height vector (m).
+        alpha_M (float): Rayleigh damping coefficient proportional to mass (C = alpha_M*M + beta_K*K_initial).
+        beta_K (float): Rayleigh damping coefficient proportional to initial stiffness (C = alpha_M*M + beta_K*K_initial).
+        K_init (np.ndarray | None, optional): Initial stiffness matrix (N/m).
+                                             Required if model_type='nonlinear'.
+                                             Also needed for linear if beta_K != 0. Defaults to None.
+        alpha (float | None, optional): Post-yield stiffness ratio.
+                                        Required if model_type='nonlinear'. Defaults to None.
+        linear_method (str, optional): Linear model only. 'newmark' steps the Newmark loop;
+                                       'modal' evaluates the same Newmark recurrence as one
+                                       precomputed filter per mode (same results, C-level speed).
+                                       Defaults to 'newmark'.
+        nonlinear_kernel (bool, optional): Nonlinear model only. Run the Newton-Raphson loop in
+                                           Analysis.nonlinear_kernel (Numba-compiled when Numba is
+                                           installed, O(n) tridiagonal solve). Requires tridiagonal
+                                           M and C. Defaults to False.
+        drift_thresholds (np.ndarray | None, optional): Damage-state PIDR thresholds. If given, the
+                                                        analysis stops once every threshold has been
+                                                        exceeded. Defaults to None.
+        collapse_drift (float | None, optional): PIDR treated as collapse. If given, the analysis stops
+                                                 as soon as any story reaches it. With either option
+                                                 the analysis also stops on NaN/Inf displacements.
+                                                 Defaults to None.
+        record (str, optional): 'full' stores the displacement history. 'peaks' keeps only the
+                                state of the current step and tracks peak drifts on the fly
+                                (O(DOF) memory instead of O(n_steps x DOF)). Defaults to 'full'.
+        record_every (int | None, optional): With record='peaks', also store the displacement of
+                                             every record_every-th step (decimated history).
+                                             Defaults to None (no history).
+        adaptive_substeps (int, optional): Nonlinear model only. If > 0, a step whose Newton-Raphson
+                                           iteration fails is restarted with 2, 4, ... up to
+                                           2**adaptive_substeps sub-steps, and later steps relax back
+                                           to the full step one halving at a time. The effective
+                                           tangent is then inverted once and reused while no story
+                                           changes branch (modified Newton with the exact tangent).
+                                           Combine with collapse_drift so that runaway (collapsed)
+                                           responses stop instead of being subdivided. Defaults to 0 (off).
+        profile (bool, optional): Instrument the step loop (linear Newmark or nonlinear, not
+                                  linear_method='modal' or nonlinear_kernel) and return results['profile'].
+                                  When False the phase marks call a no-op. Defaults to False.
+
+    Returns:
+        dict: A dictionary containing results:
+            'time' (np.ndarray | None): Time of the recorded steps (seconds), truncated at 'stop_step'.
+            'disp' (np.ndarray | None): Recorded displacements (m) (n_recorded x DOF), truncated at
+                                        'stop_step'. None for record='peaks' without record_every.
+            'PIDR' (np.ndarray): Peak Interstory Drift Ratio per story (DOF x 1). After early
+                                 termination this is the peak up to the stop (a lower bound).
+            'maxPIDR' (float): Maximum PIDR across all stories.
+            'PFA' (np.ndarray): Peak absolute floor acceleration per floor (g) (DOF,), from the
+                                solver's own accelerations (relative plus ground), up to 'stop_step'.
+            'maxPFA' (float): Maximum PFA across all floors.
+            'stop_step' (int | None): Step at which the analysis stopped early, None if it ran to the end.
+            'stop_reason' (str | None): 'collapse', 'thresholds', 'diverged' or None.
+            'solver_stats' (dict): Nonlinear step loop only (not nonlinear_kernel):
+                'nr_iterations' (np.ndarray): NR iterations per step, summed over sub-steps and
+                                              abandoned attempts (n_steps,).
+                'substeps' (np.ndarray): Sub-steps the step was finally solved with (n_steps,).
+                'failed_steps' (int): Steps accepted without NR convergence.
+                'step_rejections' (int): Step attempts restarted with finer sub-steps.
+                'factorizations', 'tangent_reuses' (int): Tangent inversions and reuses
+                                                          (adaptive_substeps > 0 only).
+            'profile' (dict): With profile=True (several are aggregated by merge_profiles):
+                'phase_time' (dict): Wall time (s) per phase of PROFILE_PHASES: 'step_setup' (effective
+                                     load), 'hysteresis' (story forces and tangents), 'assembly' (global
+                                     tangent, restoring force, residual), 'solve', 'checks' (NaN and
+                                     convergence checks), 'state_update' and 'recording' (peak drifts,
+                                     history, early termination).
+                'total_time' (float): Wall time of the whole call (s), including setup.
+                'n_analyses' (int): 1.
+                'n_steps' (int): Steps computed (up to the early stop).
+                'nr_histogram' (np.ndarray): Number of steps per NR iteration count (index = iterations,
+                                             summed over sub-steps); empty for the linear model.
+                'failed_steps', 'step_rejections', 'factorizations', 'tangent_reuses' (int): As in
+                                                                                            'solver_stats' (0 if linear).
+    """
+    if profile: t_call = perf_counter()
+
+    # --- Input Validation & Setup ---
+    if accel_gm_g.ndim > 1 and accel_gm_g.shape[1] != 1:
+         if accel_gm_g.shape[0] == 1: accel_gm_g = accel_gm_g.T # Transpose row vector
+         else: raise ValueError("accel_gm_g must be a column vector.")
+    accel_gm_g = accel_gm_g.reshape(-1, 1)
+    accel_gm = accel_gm_g * G_ACCEL # Convert g to m/s^2
+
+    n_steps = len(accel_gm)
+    num_dof = M.shape[0]
+    if H.shape != (num_dof,): H = H.flatten() # Ensure H is 1D array
+
+    influence_vector = np.ones((num_dof, 1))
+
+    # Recorded history: steps 0, stride, 2*stride, ... (stride 1: every step, 0: peaks only)
+    stride = _record_stride(record, record_every)
+    n_rec = _n_recorded(n_steps, stride)
+    time = np.arange(n_rec) * (stride * dt)
+    disp = np.zeros((n_rec, num_dof))
+
+    # --- Initial Conditions ---
+    # Assume u(0)=0, v(0)=0
+    # M*a(0) + C*v(0) + Fs(u(0)) = -M*I*accel_gm(0)
+    # Since Fs(0)=0, v(0)=0 => M*a(0) = -M*I*accel_gm(0) => a(0) = -I*accel_gm(0)
+    # Only the converged state of the current step is kept (u_prev, v_prev, a_prev)
+    u_prev = np.zeros(num_dof)
+    v_prev = np.zeros(num_dof)
+    a_prev = -influence_vector.flatten() * accel_gm[0] # Relative acceleration
+    peak_abs_drift = np.zeros(num_dof) # Peak |interstory drift| per story so far
+    peak_abs_accel = np.zeros(num_dof) # Peak |absolute floor acceleration| so far (0 at step 0)
+
+    if linear_method not in ('newmark', 'modal'): raise ValueError("linear_method must be 'newmark' or 'modal'.")
+    if adaptive_substeps < 0: raise ValueError("adaptive_substeps must be non-negative.")
+    if adaptive_substeps and nonlinear_kernel: raise ValueError("adaptive_substeps is not available with nonlinear_kernel.")
+    if profile and ((model_type == 'linear' and linear_method == 'modal') or (model_type == 'nonlinear' and nonlinear_kernel)):
+        raise ValueError("profile requires the step loop (linear_method='newmark', nonlinear_kernel=False).")
+
+    # Early termination: stop once the outcome (collapse / all thresholds exceeded) is decided
+    stop_drift = _stop_limit(drift_thresholds, collapse_drift)
+    stop_step, stop_reason = None, None
+
+    # --- Model Specific Setup ---
+    # Validated model: damping C, Newmark constants (Average Acceleration) and the linear
+    # K_eff inverse or the nonlinear story stiffnesses and yield drifts
+    model = _prepare_model(model_type, M, K_or_Fy, dt, alpha_M, beta_K, K_init, alpha)
+    a0, a1, a2, a7, a8, a9 = model['newmark']
+    C = model['C']
+
+    if model_type == 'linear' and linear_method == 'modal':
+        # The filters produce the whole history at once
+        disp_full, accel_full = _linear_recurrence_disp(model, accel_gm.T, with_accel=True)
+        disp_full, accel_full = disp_full[0], accel_full[0] + accel_gm # Absolute floor accelerations
+        if stop_drift < np.inf:
+            first = int(_first_stop_step(disp_full, H, stop_drift))
+            stop_step = first if first >= 0 else None
+        if stop_step is not None:
+            stop_reason = _stop_reason(disp_full[stop_step], H, stop_drift, collapse_drift)
+            disp_full, accel_full = disp_full[:stop_step + 1], accel_full[:stop_step + 1]
+        PIDR_stories, maxPIDR = _peak_drift_ratios(disp_full, H)
+        PFA, maxPFA = _peak_floor_accels(np.max(np.abs(accel_full), axis=0))
+        if stride:
+            time, disp = time[:len(disp_full[::stride])], disp_full[::stride]
+        return {'time': time if stride else None, 'disp': disp if stride else None,
+                'PIDR': PIDR_stories, 'maxPIDR': maxPIDR, 'PFA': PFA, 'maxPFA': maxPFA,
+                'stop_step': stop_step, 'stop_reason': stop_reason}
+
+    if model_type == 'nonlinear' and nonlinear_kernel:
+        out = run_nonlinear_kernel(model, accel_gm, H, stop_drift=stop_drift, record_every=stride)
+        stop_step = out['stop_step']
+        if stop_step is not None:
+            stop_reason = _stop_reason(out['final_disp'], H, stop_drift, collapse_drift)
+        if out['n_failed']:
+            first = out['first_failed']
+            warnings.warn(f"Newton-Raphson failed to converge at {out['n_failed']} time step(s), first at step {first} (t={first * dt:.3f}s). Results may be inaccurate.", RuntimeWarning)
+        PIDR_stories, maxPIDR = _drift_ratios_from_peaks(out['peak_drift'], H)
+        PFA, maxPFA = _peak_floor_accels(out['peak_accel'])
+        disp = out['disp']
+        return {'time': time[:len(disp)] if stride else None, 'disp': disp if stride else None,
+                'PIDR': PIDR_stories, 'maxPIDR': maxPIDR, 'PFA': PFA, 'maxPFA': maxPFA,
+                'stop_step': stop_step, 'stop_reason': stop_reason}
+
+    if model_type == 'linear':
+        K_eff_inv = model['K_eff_inv'] # Effective stiffness inverse, factorized once
+
+    else:
+        Fy, k_init_stories, delta_y = model['Fy'], model['k_stories'], model['delta_y'] # Yield displacements per story
+
+        # Initialize nonlinear state variables per story
+        story_force = np.zeros(num_dof) # Force in each story from previous converged step
+        story_peak_pos_drift = np.zeros(num_dof) # Max positive drift reached
+        story_peak_neg_drift = np.zeros(num_dof) # Min negative drift reached
+        
+        # Tolerances for Newton-Raphson
+        tol_nr = 1e-5
+        max_iter_nr = 50
+
+        # Solver counters
+        solver_stats = {'nr_iterations': np.zeros(n_steps, dtype=np.int32),
+                        'substeps': np.ones(n_steps, dtype=np.int32),
+                        'failed_steps': 0, 'step_rejections': 0, 'factorizations': 0, 'tangent_reuses': 0}
+        if adaptive_substeps:
+            level_cache = {} # Newmark constants / cached tangent per sub-step level
+            level = 0        # Current number of halvings of dt
+
+    phase_time = dict.fromkeys(PROFILE_PHASES, 0.0)
+    lap = _phase_timer(phase_time) if profile else _no_lap # Marks the end of each phase
+
+    # --- Time Stepping Loop ---
+    for j in range(n_steps - 1):
+        # External force vector for step j+1
+        P_ext = -M @ influence_vector * accel_gm[j+1] # Shape (3, 1)
+
+        # Effective force P_hat from previous step properties (used in linear and NR initial guess)
+        term_M = M @ (a0 * u_prev + a1 * v_prev + a2 * a_prev) # Shape (3,)
+        term_C = C @ (a7 * u_prev + a8 * v_prev + a9 * a_prev) # Shape (3,)
+        P_hat = P_ext.flatten() + term_M + term_C # Flatten P_ext to (3,)
+        lap('step_setup')
+
+        if model_type == 'linear':
+            # --- Linear Step ---
+            # Solve for displacement at j+1
+            u_next = K_eff_inv @ P_hat
+            
+            # Update velocity and acceleration using Newmark equations
+            v_next = a7 * (u_next - u_prev) - a8 * v_prev - a9 * a_prev
+            a_next = a0 * (u_next - u_prev) - a1 * v_prev - a2 * a_prev
+            lap('solve')
+
+        elif model_type == 'nonlinear' and adaptive_substeps:
+            # --- Nonlinear Step (adaptive sub-stepping, cached tangent) ---
+            u_next, v_next, a_next, level, n_iter, ok = _adaptive_nonlinear_step(
+                model, dt, level_cache, u_prev, v_prev, a_prev, accel_gm[j, 0], accel_gm[j+1, 0],
+                (story_force, story_peak_pos_drift, story_peak_neg_drift), level, adaptive_substeps,
+                tol_nr, max_iter_nr, solver_stats, lap)
+            solver_stats['nr_iterations'][j+1] = n_iter
+            solver_stats['substeps'][j+1] = 2**level
+            if not ok:
+                solver_stats['failed_steps'] += 1
+                warnings.warn(f"Newton-Raphson failed to converge at time step {j+1} (t={(j+1) * dt:.3f}s) with {2**level} sub-steps. Results may be inaccurate.", RuntimeWarning)
+            level = max(level - 1, 0) # Relax back towards the full step
+
+        elif model_type == 'nonlinear':
+            # --- Nonlinear Step (Newton-Raphson) ---
+            # Initial guess for iteration (k=0)
+            u_k = u_prev # Guess for u[j+1]
+            
+            delta_prev = _story_drifts(u_prev) # Interstory drift from previous *converged* step j
+            iter_nr = 0
+            converged_nr = False
+            
+            while iter_nr < max_iter_nr and not converged_nr:
+                 iter_nr += 1
+                 
+                 # Story forces and tangent stiffnesses at the current guess u_k (bilinear hysteresis)
+                 fs_stories, kt_stories = _bilinear_story_response(_story_drifts(u_k), delta_prev, story_force,
+                                                                   story_peak_pos_drift, story_peak_neg_drift,
+                                                                   k_init_stories, delta_y, Fy, alpha)
+                 lap('hysteresis')
+
+                 # Assemble global tangent stiffness K_T
+                 K_T = np.zeros((num_dof, num_dof))
+                 K_T[num_dof-1, num_dof-1] = kt_stories[num_dof-1]
+                 for i in range(num_dof - 2, -1, -1):
+                     K_T[i, i] = kt_stories[i] + kt_stories[i+1]
+                     K_T[i, i+1] = -kt_stories[i+1]
+                     K_T[i+1, i] = -kt_stories[i+1]
+                     
+                 # Assemble global restoring force Fs
+                 Fs_k = _story_to_global_force(fs_stories) # Fs = T^T * fs_story
+                 
+                 # Calculate corresponding velocity and acceleration for u_k using Newmark
+                 # These are needed if residual is defined based on EoM at j+1
+                 v_k = a7 * (u_k - u_prev) - a8 * v_prev - a9 * a_prev
+                 a_k = a0 * (u_k - u_prev) - a1 * v_prev - a2 * a_prev
+                 
+                 # Calculate Residual Force Vector
+                 # R = P_ext - Fs_k - C @ v_k - M @ a_k
+                 Residual = P_ext.flatten() - Fs_k - C @ v_k - M @ a_k # Flatten P_ext
+                 lap('assembly')
+
+                 # Check for NaN/Inf in Residual before checking norm
+                 if np.isnan(Residual).any() or np.isinf(Residual).any():
+                     warnings.warn(f"NaN or Inf detected in Residual at step {j+1}, iter {iter_nr}. Aborting NR.", RuntimeWarning)
+                     converged_nr = False # Mark as not converged
+                     break # Exit NR loop immediately
+
+                 # Check convergence
+                 residual_norm = np.linalg.norm(Residual)
+                 lap('checks')
+                 if residual_norm < tol_nr:
+                     converged_nr = True
+                     u_next = u_k
+                     v_next = v_k
+                     a_next = a_k
+
+                     # --- Update State Variables upon Convergence ---
+                     final_delta = _story_drifts(u_next) # Final drifts for step j+1
+                     story_force = fs_stories # Store converged forces for next step
+                     np.maximum(story_peak_pos_drift, final_delta, out=story_peak_pos_drift)
+                     np.minimum(story_peak_neg_drift, final_delta, out=story_peak_neg_drift)
+                     # --- End State Update ---
+                     lap('state_update')
+                     break # Exit NR loop
+                     
+                 # Calculate Effective Tangent Stiffness
+                 K_eff_T = K_T + a0 * M + a7 * C
+                 lap('assembly')
+                 
+                 # Solve for correction
+                 try:
+                     # Check if K_eff_T contains NaN/Inf before solving
+                     if np.isnan(K_eff_T).any() or np.isinf(K_eff_T).any():
+                         warnings.warn(f"NaN or Inf detected in K_eff_T at step {j+1}, iter {iter_nr}. Aborting NR.", RuntimeWarning)
+                         converged_nr = False
+                         break # Exit NR loop
+                         
+                     lap('checks')
+                     delta_u = solve(K_eff_T, Residual, assume_a='sym') # Assume symmetric
+                     lap('solve')
+                     
+                     # Check for NaN/Inf in correction
+                     if np.isnan(delta_u).any() or np.isinf(delta_u).any():
+                         warnings.warn(f"NaN or Inf detected in delta_u at step {j+1}, iter {iter_nr}. Aborting NR.", RuntimeWarning)
+                         converged_nr = False
+                         break # Exit NR loop
+                         
+                 except np.linalg.LinAlgError:
+                     warnings.warn(f"K_eff_T singular at step {j+1}, iter {iter_nr}. Using pseudo-inverse.", RuntimeWarning)
+                     delta_u = np.linalg.pinv(K_eff_T) @ Residual # Never reuse the previous iteration's correction
+                     lap('solve')
+                     if not np.all(np.isfinite(delta_u)):
+                         converged_nr = False
+                         break # Exit NR loop
+
+                 # Update displacement guess
+                 u_k = u_k + delta_u
+                 
+            # End of Newton-Raphson loop
+            lap('checks') # Aborted iterations
+            solver_stats['nr_iterations'][j+1] = iter_nr
+            if not converged_nr:
+                 solver_stats['failed_steps'] += 1
+                 warnings.warn(f"Newton-Raphson failed to converge at time step {j+1} (t={(j+1) * dt:.3f}s). Results may be inaccurate.", RuntimeWarning)
+                 # Use the last iteration's results? Or stop? Let's use last results for now.
+                 # Using last calculated u_k, v_k, a_k from the final iteration attempt
+                 u_next = u_k
+                 v_next = a7 * (u_k - u_prev) - a8 * v_prev - a9 * a_prev
+                 a_next = a0 * (u_k - u_prev) - a1 * v_prev - a2 * a_prev
+
+                 # Story forces at the non-converged displacement u_k, with the same hysteresis rule
+                 final_delta_nonconv = _story_drifts(u_k)
+                 story_force, _ = _bilinear_story_response(final_delta_nonconv, delta_prev, story_force,
+                                                           story_peak_pos_drift, story_peak_neg_drift,
+                                                           k_init_stories, delta_y, Fy, alpha)
+                 # Update peak drifts based on this non-converged step's displacement
+                 np.maximum(story_peak_pos_drift, final_delta_nonconv, out=story_peak_pos_drift)
+                 np.minimum(story_peak_neg_drift, final_delta_nonconv, out=story_peak_neg_drift)
+            lap('state_update')
+
+        # --- Record State / Track Peak Drifts ---
+        with np.errstate(invalid='ignore'):
+            peak_abs_drift = np.fmax(peak_abs_drift, np.abs(_story_drifts(u_next))) # NaN drifts are skipped, as np.nanmax does
+            peak_abs_accel = np.fmax(peak_abs_accel, np.abs(a_next + accel_gm[j+1]))
+        if stride and (j + 1) % stride == 0:
+            disp[(j + 1) // stride] = u_next
+        u_prev, v_prev, a_prev = u_next, v_next, a_next
+
+        # --- Early Termination ---
+        if stop_drift < np.inf:
+            stop_reason = _stop_reason(u_next, H, stop_drift, collapse_drift)
+            if stop_reason is not None:
+                stop_step = j + 1
+                n_kept = stop_step // stride + 1 if stride else 0
+                time, disp = time[:n_kept], disp[:n_kept]
+                lap('recording')
+                break
+        lap('recording')
+
+    # --- Post-Processing: Calculate PIDR and PFA ---
+    PIDR_stories, maxPIDR = _drift_ratios_from_peaks(peak_abs_drift, H)
+    PFA, maxPFA = _peak_floor_accels(peak_abs_accel)
+
+    # --- Assemble Results ---
+    results = {
+        'time': time if stride else None,
+        'disp': disp if stride else None, # meters
+        'PIDR': PIDR_stories, # dimensionless
+        'maxPIDR': maxPIDR,   # dimensionless
+        'PFA': PFA,           # g
+        'maxPFA': maxPFA,     # g
+        'stop_step': stop_step,
+        'stop_reason': stop_reason,
+    }
+    if model_type == 'nonlinear':
+        results['solver_stats'] = solver_stats
+
+    if profile:
+        counters = ('failed_steps', 'step_rejections', 'factorizations', 'tangent_reuses')
+        n_run = n_steps - 1 if stop_step is None else stop_step
+        if model_type == 'nonlinear':
+            nr_histogram = np.bincount(solver_stats['nr_iterations'][1:n_run + 1], minlength=max_iter_nr + 1)
+            counts = {key: solver_stats[key] for key in counters}
+        else:
+            nr_histogram = np.zeros(0, dtype=np.int64)
+            counts = dict.fromkeys(counters, 0)
+        results['profile'] = {'phase_time': phase_time, 'total_time': perf_counter() - t_call, 'n_analyses': 1,
+                              'n_steps': n_run, 'nr_histogram': nr_histogram, **counts}
+
+    return results
+
+def _stack_records(accel_gm_g: np.ndarray, scale_factors) -> np.ndarray:
+    """Builds the (n_batch, n_steps) ground acceleration stack (g) from records and scale factors."""
+    records = np.asarray(accel_gm_g, dtype=float)
+    if records.ndim == 1:
+        records = records[np.newaxis, :]
+    elif records.ndim != 2:
+        raise ValueError("accel_gm_g must be a 1-D record or a 2-D (n_records, n_steps) array.")
+    if scale_factors is None:
+        return records
+    scale_factors = np.asarray(scale_factors, dtype=float)
+    if scale_factors.ndim == 0:
+        return records * scale_factors
+    if scale_factors.ndim != 1: raise ValueError("scale_factors must be a scalar or 1-D array.")
+    if records.shape[0] == 1:
+        return records * scale_factors[:, np.newaxis] # One record at several intensities
+    if records.shape[0] != scale_factors.shape[0]:
+        raise ValueError("scale_factors must have one entry per record.")
+    return records * scale_factors[:, np.newaxis]
+
+def _end_batch_step(j: int,
+                    u: np.ndarray,
+                    a: np.ndarray,
+                    ag: np.ndarray,
+                    disp: np.ndarray,
+                    stride: int,
+                    peak_abs_drift: np.ndarray,
+                    peak_abs_accel: np.ndarray,
+                    running: np.ndarray,
+                    H: np.ndarray,
+                    stop_drift: float,
+                    stop_step: np.ndarray):
+    """
+    Per-step bookkeeping of the batch solvers after computing u = u[j+1] and the relative
+    acceleration a = a[j+1] (n_batch x DOF) under the ground acceleration ag (n_batch,): stores the
+    recorded row, updates the running peak drifts and floor accelerations of records still running
+    and stops those whose outcome is decided (updates disp, the peaks, running and stop_step in place).
+    """
+    drift = np.abs(_story_drifts(u))
+    with np.errstate(invalid='ignore'): # NaN drifts are skipped, as np.nanmax does
+        np.fmax(peak_abs_drift, drift, out=peak_abs_drift, where=running[:, np.newaxis])
+        np.fmax(peak_abs_accel, np.abs(a + ag[:, np.newaxis]), out=peak_abs_accel, where=running[:, np.newaxis])
+    if stride and (j + 1) % stride == 0:
+        disp[:, (j + 1) // stride] = u
+    if stop_drift < np.inf:
+        with np.errstate(invalid='ignore'):
+            ratio = np.max(drift / H, axis=1)
+            decided = running & (~np.isfinite(ratio) | (ratio >= stop_drift))
+        stop_step[decided] = j + 1
+        running[decided] = False
+
+def run_time_history_batch(model_type: str,
+                           M: np.ndarray,
+                           K_or_Fy: np.ndarray,
+                           dt: float,
+                           accel_gm_g: np.ndarray,
+                           H: np.ndarray,
+                           alpha_M: float,
+                           beta_K: float,
+                           K_init: np.ndarray | None = None,
+                           alpha: float | None = None,
+                           scale_factors: np.ndarray | float | None = None,
+                           linear_method: str = 'newmark',
+                           banded: bool | None = None,
+                           drift_thresholds: np.ndarray | None = None,
+                           collapse_drift: float | None = None,
+                           record: str = 'full',
+                           record_every: int | None = None
+                           ) -> dict:
+    """
+    Batched version of run_time_history: advances a stack of ground motions together per time step.
+
+    Every record in the batch shares the model and dt. The linear model reuses a single inverted
+    K_eff for the whole batch; the nonlinear model runs Newton-Raphson on all records at once,
+    iterating only those that have not yet converged.
+
+    Args:
+        model_type, M, K_or_Fy, dt, H, alpha_M, beta_K, K_init, alpha, linear_method, record,
+        record_every: As for run_time_history. With record='peaks' the step loops keep only the
+                      current (n_batch x DOF) state; the linear modal path filters the records in
+                      chunks of 256 so its transient history stays bounded.
+        accel_gm_g (np.ndarray): Ground accelerations (g), shape (n_records, n_steps) or (n_steps,).
+        scale_factors (np.ndarray | float | None, optional): Scale factor per record, a single
+                                                             factor for all records, or, with a
+                                                             single 1-D record, the list of
+                                                             intensities to run it at. Defaults to None.
+        banded (bool | None, optional): Store M, C and the tangent stiffness as tridiagonal bands and
+                                        solve with an O(n) Thomas algorithm instead of dense O(n^3)
+                                        solves. None uses banded storage for the nonlinear model
+                                        whenever M and C are tridiagonal (shear building); the
+                                        linear model keeps the dense pre-inverted K_eff, which is
+                                        faster at practical batch sizes. Defaults to None.
+        drift_thresholds, collapse_drift: Early termination, as for run_time_history. Each record
+                                          stops on its own; the nonlinear model stops iterating it.
+
+    Returns:
+        dict: A dictionary containing results:
+            'time' (np.ndarray | None): Time of the recorded steps (seconds).
+            'disp' (np.ndarray | None): Recorded displacements (m) (n_batch x n_recorded x DOF);
+                                        None for record='peaks' without record_every.
+            'PIDR' (np.ndarray): Peak Interstory Drift Ratio per story (n_batch x DOF).
+            'maxPIDR' (np.ndarray): Maximum PIDR across all stories (n_batch,).
+            'PFA' (np.ndarray): Peak absolute floor acceleration per floor (g) (n_batch x DOF), as
+                                for run_time_history.
+            'maxPFA' (np.ndarray): Maximum PFA across all floors (n_batch,).
+            'converged' (np.ndarray): False for records with a non-converged NR step (n_batch,).
+            'failed_steps' (np.ndarray): Non-converged NR steps per record (n_batch,); 0 if linear.
+            'nr_iterations' (np.ndarray): Total NR iterations per record, counted as in
+                                          run_time_history's solver_stats (n_batch,); 0 if linear.
+            'stop_step' (np.ndarray): Step at which each record stopped early, -1 if it ran to the
+                                      end (n_batch,). 'disp' is NaN after the stop step.
+            'PIDR', 'maxPIDR', 'PFA' and 'maxPFA' are the peaks up to the stop step.
+    """
+    if linear_method not in ('newmark', 'modal'): raise ValueError("linear_method must be 'newmark' or 'modal'.")
+    model = _prepare_model(model_type, M, K_or_Fy, dt, alpha_M, beta_K, K_init, alpha)
+    accel_gm = _stack_records(accel_gm_g, scale_factors) * G_ACCEL # Convert g to m/s^2
+    if banded is None:
+        banded = model_type == 'nonlinear' and is_sym_tridiagonal(M) and is_sym_tridiagonal(model['C'])
+
+    n_batch, n_steps = accel_gm.shape
+    num_dof = M.shape[0]
+    H = np.asarray(H, dtype=float).flatten()
+    a0, a1, a2, a7, a8, a9 = model['newmark']
+    C = model['C']
+    M_iota = M @ np.ones(num_dof) # Effective earthquake force per unit ground acceleration
+
+    # Recorded history (every stride-th step; none for stride 0) and the current state only
+    stride = _record_stride(record, record_every)
+    disp = np.zeros((n_batch, _n_recorded(n_steps, stride), num_dof))
+    u_cur = np.zeros((n_batch, num_dof))
+    v_cur = np.zeros((n_batch, num_dof))
+    a_cur = np.repeat(-accel_gm[:, 0:1], num_dof, axis=1) # a(0) = -I*accel_gm(0)
+    peak_abs_drift = np.zeros((n_batch, num_dof))
+    peak_abs_accel = np.zeros((n_batch, num_dof)) # Absolute floor acceleration is 0 at step 0
+    converged = np.ones(n_batch, dtype=bool)
+    failed_steps = np.zeros(n_batch, dtype=np.int64)
+    nr_iterations = np.zeros(n_batch, dtype=np.int64)
+    stop_drift = _stop_limit(drift_thresholds, collapse_drift)
+    stop_step = np.full(n_batch, -1)
+    running = np.ones(n_batch, dtype=bool) # Records not yet stopped early
+
+    if model_type == 'linear' and linear_method == 'modal':
+        chunk = n_batch if stride == 1 else 256 # Bound the transient full histories when they are not kept
+        for start in range(0, n_batch, chunk):
+            sl = slice(start, start + chunk)
+            d, acc = _linear_recurrence_disp(model, accel_gm[sl], with_accel=True)
+            acc += accel_gm[sl, :, np.newaxis] # Absolute floor accelerations
+            if stop_drift < np.inf:
+                stop_step[sl] = _first_stop_step(d, H, stop_drift)
+                for b, step in enumerate(stop_step[sl]):
+                    if step >= 0:
+                        d[b, step + 1:] = acc[b, step + 1:] = np.nan
+            peak_abs_drift[sl] = _peak_abs_over_steps(_story_drifts(d))
+            peak_abs_accel[sl] = _peak_abs_over_steps(acc)
+            if stride == 1 and chunk == n_batch:
+                disp = d
+            elif stride:
+                disp[sl] = d[:, ::stride]
+
+    elif model_type == 'linear' and banded:
+        # Banded P_hat and a single LDL^T factorization of K_eff: O(n) per record per step
+        m_d, m_o = tridiagonal_bands(M, "M")
+        c_d, c_o = tridiagonal_bands(C, "C")
+        k_d, k_o = tridiagonal_bands(model['K'], "K")
+        pivots, mult = factor_sym_tridiagonal(k_d + a0 * m_d + a7 * c_d, k_o + a0 * m_o + a7 * c_o)
+        for j in range(n_steps - 1):
+            if not running.any():
+                break
+            u, v, a = u_cur, v_cur, a_cur
+            P_hat = (-accel_gm[:, j+1, np.newaxis] * M_iota
+                     + sym_tridiagonal_matvec(m_d, m_o, a0 * u + a1 * v + a2 * a)
+                     + sym_tridiagonal_matvec(c_d, c_o, a7 * u + a8 * v + a9 * a))
+            u_cur = solve_factored_sym_tridiagonal(pivots, mult, P_hat)
+            v_cur = a7 * (u_cur - u) - a8 * v - a9 * a
+            a_cur = a0 * (u_cur - u) - a1 * v - a2 * a
+            _end_batch_step(j, u_cur, a_cur, accel_gm[:, j+1], disp, stride, peak_abs_drift, peak_abs_accel,
+                            running, H, stop_drift, stop_step)
+
+    elif model_type == 'linear':
+        K_eff_inv_T = model['K_eff_inv'].T
+        # P_hat = P_ext + M@(a0 u + a1 v + a2 a) + C@(a7 u + a8 v + a9 a), grouped by state vector
+        Mu_T = (a0 * M + a7 * C).T
+        Mv_T = (a1 * M + a8 * C).T
+        Ma_T = (a2 * M + a9 * C).T
+        for j in range(n_steps - 1):
+            if not running.any():
+                break
+            u, v, a = u_cur, v_cur, a_cur
+            P_hat = -accel_gm[:, j+1, np.newaxis] * M_iota + u @ Mu_T + v @ Mv_T + a @ Ma_T
+            u_cur = P_hat @ K_eff_inv_T
+            v_cur = a7 * (u_cur - u) - a8 * v - a9 * a
+            a_cur = a0 * (u_cur - u) - a1 * v - a2 * a
+            _end_batch_step(j, u_cur, a_cur, accel_gm[:, j+1], disp, stride, peak_abs_drift, peak_abs_accel,
+                            running, H, stop_drift, stop_step)
+
+    else:
+        k_stories, delta_y, Fy, alpha = model['k_stories'], model['delta_y'], model['Fy'], model['alpha']
+        K_dyn = model['K_dyn']
+        M_T, C_T = M.T, C.T
+        diag_idx = np.arange(num_dof)
+        if banded:
+            m_d, m_o = tridiagonal_bands(M, "M")
+            c_d, c_o = tridiagonal_bands(C, "C")
+            kdyn_d, kdyn_o = a0 * m_d + a7 * c_d, a0 * m_o + a7 * c_o
+        tol_nr = 1e-5
+        max_iter_nr = 50
+
+        story_force = np.zeros((n_batch, num_dof))
+        story_peak_pos_drift = np.zeros((n_batch, num_dof))
+        story_peak_neg_drift = np.zeros((n_batch, num_dof))
+        n_failed_steps = 0
+
+        for j in range(n_steps - 1):
+            if not running.any():
+                break
+            u_prev, v_prev, a_prev = u_cur, v_cur, a_cur
+            u_cur, v_cur, a_cur = u_prev.copy(), v_prev.copy(), a_prev.copy() # Stopped records keep their state
+            P_ext = -accel_gm[:, j+1, np.newaxis] * M_iota
+            delta_prev = _story_drifts(u_prev)
+            u_k = u_prev.copy()
+            active = running.copy() # Still iterating
+            step_ok = np.zeros(n_batch, dtype=bool)
+
+            for iter_nr in range(max_iter_nr):
+                idx = np.flatnonzero(active)
+                if idx.size == 0:
+                    break
+                nr_iterations[idx] += 1
+                uk = u_k[idx]
+                fs, kt = _bilinear_story_response(_story_drifts(uk), delta_prev[idx], story_force[idx],
+                                                  story_peak_pos_drift[idx], story_peak_neg_drift[idx],
+                                                  k_stories, delta_y, Fy, alpha)
+                v_k = a7 * (uk - u_prev[idx]) - a8 * v_prev[idx] - a9 * a_prev[idx]
+                a_k = a0 * (uk - u_prev[idx]) - a1 * v_prev[idx] - a2 * a_prev[idx]
+                if banded:
+                    Residual = (P_ext[idx] - _story_to_global_force(fs)
+                                - sym_tridiagonal_matvec(c_d, c_o, v_k) - sym_tridiagonal_matvec(m_d, m_o, a_k))
+                else:
+                    Residual = P_ext[idx] - _story_to_global_force(fs) - v_k @ C_T - a_k @ M_T
+
+                finite = np.isfinite(Residual).all(axis=1)
+                done = finite & (np.linalg.norm(Residual, axis=1) < tol_nr)
+                if done.any():
+                    ci = idx[done]
+                    u_cur[ci], v_cur[ci], a_cur[ci] = uk[done], v_k[done], a_k[done]
+                    story_force[ci] = fs[done]
+                    final_delta = _story_drifts(uk[done])
+                    story_peak_pos_drift[ci] = np.maximum(story_peak_pos_drift[ci], final_delta)
+                    story_peak_neg_drift[ci] = np.minimum(story_peak_neg_drift[ci], final_delta)
+                    step_ok[ci] = True
+                active[idx[~finite | done]] = False # NaN/Inf residual: abort NR for that record
+
+                keep = finite & ~done
+                if not keep.any():
+                    break
+                # Assemble tridiagonal tangent stiffness for the records still iterating
+                kt = kt[keep]
+                if banded:
+                    kt_d = kt + kdyn_d
+                    kt_d[:, :-1] += kt[:, 1:]
+                    with np.errstate(divide='ignore', invalid='ignore'): # Non-finite corrections are rejected below
+                        delta_u = solve_sym_tridiagonal(kt_d, kdyn_o - kt[:, 1:], Residual[keep])
+                else:
+                    K_eff_T = np.zeros((kt.shape[0], num_dof, num_dof))
+                    K_eff_T[:, diag_idx, diag_idx] = kt
+                    K_eff_T[:, diag_idx[:-1], diag_idx[:-1]] += kt[:, 1:]
+                    K_eff_T[:, diag_idx[:-1], diag_idx[1:]] = -kt[:, 1:]
+                    K_eff_T[:, diag_idx[1:], diag_idx[:-1]] = -kt[:, 1:]
+                    K_eff_T += K_dyn
+                    try:
+                        delta_u = np.linalg.solve(K_eff_T, Residual[keep][..., np.newaxis])[..., 0]
+                    except np.linalg.LinAlgError:
+                        delta_u = (np.linalg.pinv(K_eff_T) @ Residual[keep][..., np.newaxis])[..., 0]
+                ok_du = np.isfinite(delta_u).all(axis=1)
+                upd = idx[keep]
+                active[upd[~ok_du]] = False
+                u_k[upd[ok_du]] = uk[keep][ok_du] + delta_u[ok_du]
+
+            # Non-converged records: accept the last iterate, as run_time_history does
+            failed = np.flatnonzero(running & ~step_ok)
+            if failed.size:
+                n_failed_steps += 1
+                failed_steps[failed] += 1
+                converged[failed] = False
+                uk = u_k[failed]
+                u_cur[failed] = uk
+                v_cur[failed] = a7 * (uk - u_prev[failed]) - a8 * v_prev[failed] - a9 * a_prev[failed]
+                a_cur[failed] = a0 * (uk - u_prev[failed]) - a1 * v_prev[failed] - a2 * a_prev[failed]
+                final_delta = _story_drifts(uk)
+                story_force[failed], _ = _bilinear_story_response(final_delta, delta_prev[failed], story_force[failed],
+                                                                  story_peak_pos_drift[failed], story_peak_neg_drift[failed],
+                                                                  k_stories, delta_y, Fy, alpha)
+                story_peak_pos_drift[failed] = np.maximum(story_peak_pos_drift[failed], final_delta)
+                story_peak_neg_drift[failed] = np.minimum(story_peak_neg_drift[failed], final_delta)
+
+            _end_batch_step(j, u_cur, a_cur, accel_gm[:, j+1], disp, stride, peak_abs_drift, peak_abs_accel,
+                            running, H, stop_drift, stop_step)
+
+        if n_failed_steps:
+            warnings.warn(f"Newton-Raphson failed to converge at {n_failed_steps} time step(s) for "
+                          f"{np.count_nonzero(~converged)} of {n_batch} record(s). Results may be inaccurate.", RuntimeWarning)
+
+    if stride:
+        for b in np.flatnonzero(stop_step >= 0):
+            disp[b, stop_step[b] // stride + 1:] = np.nan
+    PIDR, maxPIDR = _drift_ratios_from_peaks(peak_abs_drift, H)
+    PFA, maxPFA = _peak_floor_accels(peak_abs_accel)
+
+    return {
+        'time': np.arange(disp.shape[1]) * (stride * dt) if stride else None,
+        'disp': disp if stride else None,
+        'PIDR': PIDR,
+        'maxPIDR': maxPIDR,
+        'PFA': PFA,
+        'maxPFA': maxPFA,
+        'converged': converged,
+        'failed_steps': failed_steps,
+        'nr_iterations': nr_iterations,
+        'stop_step': stop_step,
+    }
+
+# Example Usage (Optional)
+# if __name__ == '__main__':
+#     from ..02_StructuralModels.define_linear_3dof import define_linear_3dof
+#     from ..02_StructuralModels.define_nonlinear_3dof import define_nonlinear_3dof
+#
+#     # 1. Define Models
+#     try:
+#         M_l, K_l, T1_l, H_l = define_linear_3dof(target_T1=0.6)
+#         M_nl, K_init_nl, Fy_nl, alpha_nl, H_nl = define_nonlinear_3dof(M_l, K_l, H_l, yield_drift_ratio=0.005, alpha_post_yield=0.05)
+#     except Exception as e:
+#         print(f"Error defining models: {e}")
+#         exit()
+#
+#     # 2. Create Sample Ground Motion (e.g., sine wave in g)
+#     dt_gm = 0.01
+#     sim_time = 10.0
+#     time_gm = np.arange(0, sim_time, dt_gm)
+#     freq_gm = 1.0 / T1_l # Excite near resonance
+#     accel_input_g = 0.5 * np.sin(2 * np.pi * freq_gm * time_gm)
+#     accel_input_g = accel_input_g.reshape(-1, 1)
+#
+#     print(f"\n--- Running Linear Analysis ---")
+#     try:
+#         results_lin = run_time_history(
+#             model_type='linear',
+#             M=M_l,
+#             K_or_Fy=K_l,
+#             dt=dt_gm,
+#             accel_gm_g=accel_input_g,
+#             H=H_l,
+#             alpha_M=0.05, # Pass coeffs
+#             beta_K=0.05,  # Pass coeffs
+#             K_init=K_l # Pass K_l as K_init for damping calc
+#         )
+#         print(f"Linear Analysis Max PIDR: {results_lin['maxPIDR']:.6f}")
+#         print(f"Linear Story PIDRs: {results_lin['PIDR']}")
+#     except Exception as e:
+#         print(f"Linear analysis failed: {e}")
+#
+#
+#     print(f"\n--- Running Nonlinear Analysis ---")
+#     try:
+#         results_nl = run_time_history(
+#             model_type='nonlinear',
+#             M=M_nl,
+#             K_or_Fy=Fy_nl, # Pass Fy vector
+#             dt=dt_gm,
+#             accel_gm_g=accel_input_g,
+#             H=H_nl,
+#             alpha_M=0.05, # Pass coeffs
+#             beta_K=0.05,  # Pass coeffs
+#             K_init=K_init_nl, # Pass K_init
+#             alpha=alpha_nl      # Pass alpha
+#         )
+#         print(f"Nonlinear Analysis Max PIDR: {results_nl['maxPIDR']:.6f}")
+#         print(f"Nonlinear Story PIDRs: {results_nl['PIDR']}")
+#     except Exception as e:
+#         print(f"Nonlinear analysis failed: {e}")
+#
+#     # Plotting (optional)
+#     import matplotlib.pyplot as plt
+#     plt.figure(figsize=(10, 6))
+#
+#     plt.subplot(2, 1, 1)
+#     plt.plot(results_lin['time'], results_lin['disp'][:, -1], label=f'Linear Top Floor Disp (Max PIDR={results_lin["maxPIDR"]:.4f})')
+#     if 'results_nl' in locals():
+#          plt.plot(results_nl['time'], results_nl['disp'][:, -1], '--', label=f'Nonlinear Top Floor Disp (Max PIDR={results_nl["maxPIDR"]:.4f})')
+#     plt.ylabel('Displacement (m)')
+#     plt.title('Top Floor Displacement Comparison')
+#     plt.legend()
+#     plt.grid(True)
+#
+#     plt.subplot(2, 1, 2)
+#     plt.plot(results_lin['time'], accel_input_g, label='Ground Motion (g)', color='gray')
+#     plt.ylabel('Accel (g)')
+#     plt.xlabel('Time (s)')
+#     plt.legend()
+#     plt.grid(True)
+#
+#     plt.tight_layout()
+#     plt.show()
+#
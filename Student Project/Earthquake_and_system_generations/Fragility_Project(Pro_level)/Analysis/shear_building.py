@@ -0,0 +1,62 @@
+import numpy as np
+from scipy.linalg import eigh
+
+def define_shear_building(n_stories: int = 3,
+                          m: float = 1000.0,
+                          k: float = 50000.0,
+                          h_story: float = 3.0,
+                          k_factors: np.ndarray | None = None,
+                          damping_ratio: float = 0.05,
+                          yield_drift_ratio: float = 0.005,
+                          alpha_post_yield: float = 0.02
+                          ) -> dict:
+    """
+    Defines an N-story shear building (Python port of Define_3DOF_System.m).
+
+    Args:
+        n_stories (int, optional): Number of stories. Defaults to 3.
+        m (float, optional): Mass per floor (kg). Defaults to 1000.
+        k (float, optional): Base story stiffness (N/m). Defaults to 50000.
+        h_story (float, optional): Story height (m). Defaults to 3.0.
+        k_factors (np.ndarray | None, optional): Story stiffness relative to the base story.
+                                                 Defaults to [1.0, 0.9, 0.8] for 3 stories,
+                                                 otherwise linearly from 1.0 down to 0.5.
+        damping_ratio (float, optional): Rayleigh damping ratio in modes 1 and 2. Defaults to 0.05.
+        yield_drift_ratio (float, optional): Yield drift / story height. Defaults to 0.005.
+        alpha_post_yield (float, optional): Post-yield stiffness ratio. Defaults to 0.02.
+
+    Returns:
+        dict: 'M', 'K_initial', 'C', 'H', 'T' (periods), 'alpha_M', 'beta_K', 'k_story', 'Fy', 'alpha'.
+    """
+    if k_factors is None:
+        k_factors = np.array([1.0, 0.9, 0.8]) if n_stories == 3 else np.linspace(1.0, 0.5, n_stories)
+    k_story = k * np.asarray(k_factors, dtype=float)
+    if k_story.shape != (n_stories,): raise ValueError("k_factors must have one entry per story.")
+
+    H = np.full(n_stories, h_story)
+    M = np.diag(np.full(n_stories, m))
+
+    # Shear building stiffness: K[i,i] = k_i + k_{i+1}, K[i,i+1] = -k_{i+1}
+    K = np.diag(k_story + np.append(k_story[1:], 0.0))
+    K -= np.diag(k_story[1:], 1) + np.diag(k_story[1:], -1)
+
+    # Rayleigh damping from the first two modes
+    omega = np.sqrt(eigh(K, M, eigvals_only=True))
+    if n_stories > 1:
+        A = 0.5 * np.array([[1 / omega[0], omega[0]], [1 / omega[1], omega[1]]])
+        alpha_M, beta_K = np.linalg.solve(A, [damping_ratio, damping_ratio])
+    else:
+        alpha_M, beta_K = 0.0, 2 * damping_ratio / omega[0]
+
+    return {
+        'M': M,
+        'K_initial': K,
+        'C': alpha_M * M + beta_K * K,
+        'H': H,
+        'T': 2 * np.pi / omega,
+        'alpha_M': alpha_M,
+        'beta_K': beta_K,
+        'k_story': k_story,
+        'Fy': k_story * yield_drift_ratio * H,
+        'alpha': alpha_post_yield,
+    }
@@ -0,0 +1,108 @@
+import numpy as np
+from scipy.stats import norm
+import warnings
+
+from Fragility.fit_fragility_batch import fit_fragility_curves_batch
+
+def bootstrap_fragility(EDP: np.ndarray,
+                        im_levels: np.ndarray,
+                        limits,
+                        n_boot: int = 1000,
+                        confidence: float = 0.90,
+                        im_grid: np.ndarray | None = None,
+                        seed: int | None = None,
+                        chunk_size: int = 1000
+                        ) -> dict:
+    """
+    Bootstrap confidence bands of lognormal fragility parameters by resampling ground motions.
+
+    Each replicate draws the records (rows of EDP) with replacement, so a record's response at
+    every IM level stays together. A replicate's exceedance counts are its record multiplicities
+    times the per-record exceedance indicators (one matrix product for a chunk of replicates), and
+    all replicates and damage states of a chunk are fitted in one fit_fragility_curves_batch call.
+
+    Args:
+        EDP (np.ndarray): Demand per record and IM level, e.g. MIDR from run_ida (n_records x n_levels);
+                          NaN points are not counted as trials.
+        im_levels (np.ndarray): Intensity measure levels (n_levels,).
+        limits (float | list): Damage-state limit(s) on EDP; exceedance is EDP > limit.
+        n_boot (int, optional): Number of bootstrap replicates. Defaults to 1000.
+        confidence (float, optional): Two-sided confidence level of the bands. Defaults to 0.90.
+        im_grid (np.ndarray | None, optional): IM values at which the curve band is evaluated.
+                                               Defaults to 200 points from 0 to 1.1 x max(im_levels).
+        seed (int | None, optional): Seed of the resampling. Defaults to None.
+        chunk_size (int, optional): Replicates resampled and fitted per batch. Defaults to 1000.
+
+    Returns:
+        dict: A dictionary containing results (n_DS = number of limits):
+            'theta', 'beta' (np.ndarray): Point estimates from all records (n_DS,).
+            'theta_samples', 'beta_samples' (np.ndarray): Replicate estimates, NaN where a replicate
+                                                          has no finite MLE (n_boot x n_DS).
+            'theta_band', 'beta_band' (np.ndarray): Lower and upper percentile (2 x n_DS).
+            'im_grid' (np.ndarray): IM values of the curve band (n_grid,).
+            'curve' (np.ndarray): Fragility curve of the point estimates (n_DS x n_grid).
+            'curve_band' (np.ndarray): Lower and upper percentile of the replicate curves (2 x n_DS x n_grid).
+            'n_valid' (np.ndarray): Replicates with a finite estimate (n_DS,).
+    """
+    EDP = np.asarray(EDP, dtype=float)
+    im_levels = np.asarray(im_levels, dtype=float).flatten()
+    limits = np.atleast_1d(np.asarray(limits, dtype=float))
+    if EDP.ndim != 2 or EDP.shape[1] != im_levels.shape[0]: raise ValueError("EDP must have shape (n_records, n_levels).")
+    if not 0 < confidence < 1: raise ValueError("confidence must be between 0 and 1.")
+    if n_boot < 1 or chunk_size < 1: raise ValueError("n_boot and chunk_size must be >= 1.")
+    n_records, n_levels = EDP.shape
+    n_ds = limits.shape[0]
+    if im_grid is None:
+        im_grid = np.linspace(0, np.max(im_levels) * 1.1, 200)
+    im_grid = np.asarray(im_grid, dtype=float).flatten()
+
+    # --- Per-record indicators (n_records x n_DS*n_levels) ---
+    valid = ~np.isnan(EDP)
+    exceed = valid[:, np.newaxis, :] & (EDP[:, np.newaxis, :] > limits[:, np.newaxis])
+    exceed = exceed.reshape(n_records, n_ds * n_levels).astype(float)
+    trials = np.tile(valid, (1, n_ds)).astype(float)
+
+    point = fit_fragility_curves_batch(im_levels, exceed.sum(axis=0).reshape(n_ds, n_levels),
+                                       trials.sum(axis=0).reshape(n_ds, n_levels))
+
+    # --- Replicates ---
+    rng = np.random.default_rng(seed)
+    theta_samples = np.empty((n_boot, n_ds))
+    beta_samples = np.empty((n_boot, n_ds))
+    for start in range(0, n_boot, chunk_size):
+        n_chunk = min(chunk_size, n_boot - start)
+        counts = rng.multinomial(n_records, np.full(n_records, 1.0 / n_records), size=n_chunk).astype(float)
+        with warnings.catch_warnings(): # Replicates without a finite MLE are expected and reported in n_valid
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            fit = fit_fragility_curves_batch(im_levels, (counts @ exceed).reshape(n_chunk, n_ds, n_levels),
+                                             (counts @ trials).reshape(n_chunk, n_ds, n_levels))
+        theta_samples[start:start + n_chunk] = fit['theta']
+        beta_samples[start:start + n_chunk] = fit['beta']
+
+    # --- Percentile bands ---
+    q = 100 * np.array([(1 - confidence) / 2, (1 + confidence) / 2])
+    n_valid = np.sum(np.isfinite(theta_samples), axis=0)
+    if np.any(n_valid < n_boot):
+        warnings.warn(f"Replicates without a finite MLE per damage state: {(n_boot - n_valid).tolist()} "
+                      f"of {n_boot}; bands use the others.", RuntimeWarning)
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'): # All-NaN damage states give NaN bands
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        theta_band = np.nanpercentile(theta_samples, q, axis=0)
+        beta_band = np.nanpercentile(beta_samples, q, axis=0)
+        log_grid = np.log(im_grid)
+        curves = norm.cdf((log_grid - np.log(theta_samples)[..., np.newaxis]) / beta_samples[..., np.newaxis])
+        curve_band = np.nanpercentile(curves, q, axis=0)
+        curve = norm.cdf((log_grid - np.log(point['theta'])[:, np.newaxis]) / point['beta'][:, np.newaxis])
+
+    return {
+        'theta': point['theta'],
+        'beta': point['beta'],
+        'theta_samples': theta_samples,
+        'beta_samples': beta_samples,
+        'theta_band': theta_band,
+        'beta_band': beta_band,
+        'im_grid': im_grid,
+        'curve': curve,
+        'curve_band': curve_band,
+        'n_valid': n_valid,
+    }
@@ -0,0 +1,167 @@
+import numpy as np
+from scipy.special import log_ndtr, ndtri
+import warnings
+
+# The lognormal fragility P(exceed | x) = Phi(ln(x/theta)/beta) is a probit model in ln(x):
+#   P = Phi(a + b*ln(x)),  a = -ln(theta)/beta,  b = 1/beta.
+# Its binomial negative log-likelihood is convex in (a, b), so Newton's method with a
+# backtracking line search converges from any start; theta = exp(-a/b) and beta = 1/b.
+
+_LOG_SQRT_2PI = 0.5 * np.log(2 * np.pi)
+
+def _nll_grad_hess(a, b, log_x, k, n):
+    """
+    Negative log-likelihood, gradient and Hessian in (a, b) of a batch of probit curves.
+
+    Args:
+        a, b (np.ndarray): Curve parameters (batch,).
+        log_x (np.ndarray): ln(IM levels) (batch x n_levels).
+        k, n (np.ndarray): Exceedances and trials (batch x n_levels); n = 0 levels contribute nothing.
+
+    Returns:
+        tuple: nll (batch,), gradient (batch x 2), Hessian (batch x 2 x 2).
+    """
+    z = a[:, np.newaxis] + b[:, np.newaxis] * log_x
+    log_p, log_q = log_ndtr(z), log_ndtr(-z) # ln(P), ln(1 - P), accurate in both tails
+    log_pdf = -0.5 * z**2 - _LOG_SQRT_2PI
+    lam_p = np.exp(log_pdf - log_p) # phi/Phi
+    lam_q = np.exp(log_pdf - log_q) # phi/(1 - Phi)
+    m = n - k
+
+    nll = -np.sum(k * log_p + m * log_q, axis=-1)
+    g_z = m * lam_q - k * lam_p                              # d nll / dz
+    h_z = k * lam_p * (z + lam_p) + m * lam_q * (lam_q - z)  # d2 nll / dz2 (>= 0)
+    grad = np.stack((np.sum(g_z, axis=-1), np.sum(g_z * log_x, axis=-1)), axis=-1)
+    h_ab = np.sum(h_z * log_x, axis=-1)
+    hess = np.stack((np.stack((np.sum(h_z, axis=-1), h_ab), axis=-1),
+                     np.stack((h_ab, np.sum(h_z * log_x**2, axis=-1)), axis=-1)), axis=-2)
+    return nll, grad, hess
+
+def _nll(a, b, log_x, k, n):
+    z = a[:, np.newaxis] + b[:, np.newaxis] * log_x
+    return -np.sum(k * log_ndtr(z) + (n - k) * log_ndtr(-z), axis=-1)
+
+def _initial_guess(log_x, k, n):
+    """Weighted least-squares line through the probits of the empirical rates (falls back to beta=0.5)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.clip((k + 0.5) / (n + 1.0), 1e-3, 1 - 1e-3)
+        z = ndtri(rate)
+        w = n.astype(float)
+        sw = np.sum(w, axis=-1)
+        mean_x = np.sum(w * log_x, axis=-1) / sw
+        mean_z = np.sum(w * z, axis=-1) / sw
+        dx = log_x - mean_x[:, np.newaxis]
+        b = np.sum(w * dx * (z - mean_z[:, np.newaxis]), axis=-1) / np.sum(w * dx**2, axis=-1)
+    bad = ~np.isfinite(b) | (b <= 0)
+    b = np.where(bad, 2.0, b)
+    mean_x = np.where(np.isfinite(mean_x), mean_x, 0.0)
+    a = np.where(bad, -b * mean_x, mean_z - b * mean_x)
+    return np.where(np.isfinite(a), a, 0.0), b
+
+def fit_fragility_curves_batch(im_levels: np.ndarray,
+                               num_exceed: np.ndarray,
+                               num_trials: np.ndarray,
+                               max_iter: int = 100,
+                               tol: float = 1e-10
+                               ) -> dict:
+    """
+    Fits many lognormal fragility curves by Maximum Likelihood Estimation at once.
+
+    All curves (e.g. damage states x linear/nonlinear model x building variants) are advanced
+    together by a vectorized Newton iteration on the analytic gradient and Hessian of the binomial
+    likelihood, with a per-curve backtracking line search; only unconverged curves are iterated.
+    Levels with zero trials are ignored, so curves may have different sets of levels.
+
+    Args:
+        im_levels (np.ndarray): Intensity measure levels (> 0), (n_levels,) or broadcastable to num_exceed.
+        num_exceed (np.ndarray): Number of exceedances, shape (..., n_levels).
+        num_trials (np.ndarray): Number of trials, shape (..., n_levels).
+        max_iter (int, optional): Maximum Newton iterations. Defaults to 100.
+        tol (float, optional): Convergence tolerance on the Newton step in (a, b). Defaults to 1e-10.
+
+    Returns:
+        dict: A dictionary containing results (batch shape = num_exceed.shape[:-1]):
+            'theta' (np.ndarray): Median capacity (NaN where the fit failed).
+            'beta' (np.ndarray): Logarithmic standard deviation (NaN where the fit failed).
+            'success' (np.ndarray): True where the estimate exists and the iteration converged.
+            'n_iter' (np.ndarray): Newton iterations per curve.
+            'neg_log_likelihood' (np.ndarray): Negative log-likelihood at the estimate.
+    """
+    num_exceed = np.asarray(num_exceed, dtype=float)
+    num_trials = np.asarray(num_trials, dtype=float)
+    if num_exceed.shape != num_trials.shape: raise ValueError("num_exceed and num_trials must have the same shape.")
+    im_levels = np.broadcast_to(np.asarray(im_levels, dtype=float), num_exceed.shape)
+    if np.any(num_exceed > num_trials): raise ValueError("num_exceed cannot be greater than num_trials.")
+    if np.any(num_exceed < 0) or np.any(num_trials < 0): raise ValueError("num_exceed and num_trials must be >= 0.")
+    if np.any((im_levels <= 0) & (num_trials > 0)): raise ValueError("im_levels must be > 0.")
+
+    batch_shape = num_exceed.shape[:-1]
+    n_levels = num_exceed.shape[-1]
+    k = num_exceed.reshape(-1, n_levels)
+    n = num_trials.reshape(-1, n_levels)
+    log_x = np.log(np.where(n > 0, im_levels.reshape(-1, n_levels), 1.0))
+    n_curves = k.shape[0]
+
+    # --- Curves without a finite estimate (no exceedance, or exceedance everywhere) ---
+    n_exceed, n_total = np.sum(k, axis=-1), np.sum(n, axis=-1)
+    degenerate = (n_exceed == 0) | (n_exceed == n_total)
+
+    a, b = _initial_guess(log_x, k, n)
+    nll = _nll(a, b, log_x, k, n)
+    converged = np.zeros(n_curves, dtype=bool)
+    n_iter = np.zeros(n_curves, dtype=np.int64)
+    active = np.flatnonzero(~degenerate)
+
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        lx, kk, nn = log_x[active], k[active], n[active]
+        f, g, H = _nll_grad_hess(a[active], b[active], lx, kk, nn)
+
+        # Newton step from the closed-form 2x2 inverse (gradient step if the Hessian is singular)
+        det = H[:, 0, 0] * H[:, 1, 1] - H[:, 0, 1]**2
+        ok = det > 1e-12 * (H[:, 0, 0] * H[:, 1, 1] + 1e-300)
+        safe_det = np.where(ok, det, 1.0)
+        step_a = np.where(ok, (H[:, 1, 1] * g[:, 0] - H[:, 0, 1] * g[:, 1]) / safe_det, g[:, 0])
+        step_b = np.where(ok, (H[:, 0, 0] * g[:, 1] - H[:, 0, 1] * g[:, 0]) / safe_det, g[:, 1])
+
+        # Backtracking line search (halving) per curve, keeping b > 0
+        t = np.ones(active.size)
+        for _ in range(40):
+            a_new, b_new = a[active] - t * step_a, b[active] - t * step_b
+            with np.errstate(over='ignore', invalid='ignore'):
+                f_new = _nll(a_new, b_new, lx, kk, nn)
+            bad = (b_new <= 0) | ~(f_new <= f + 1e-12 * np.abs(f))
+            if not np.any(bad):
+                break
+            t = np.where(bad, 0.5 * t, t)
+        accept = ~bad
+        a[active] = np.where(accept, a_new, a[active])
+        b[active] = np.where(accept, b_new, b[active])
+        nll[active] = np.where(accept, f_new, f)
+        n_iter[active] += 1
+
+        step = t * np.hypot(step_a, step_b)
+        done = accept & (step <= tol * (1.0 + np.hypot(a[active], b[active])))
+        converged[active[done]] = True
+        # A curve that cannot decrease any further, or whose slope diverges (separated data), stops here
+        active = active[~done & accept & (b[active] < 1e6)]
+
+    # --- Estimates ---
+    # A curve whose rates jump from 0 to 1 between two levels has no finite estimate (b -> inf)
+    success = converged & ~degenerate & (b > 0) & (b < 1e6) & np.isfinite(a)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        theta = np.where(success, np.exp(-a / b), np.nan)
+        beta = np.where(success, 1.0 / b, np.nan)
+    n_failed = int(np.sum(~success))
+    if n_failed:
+        warnings.warn(f"{n_failed} of {n_curves} fragility fits have no finite MLE or did not converge "
+                      "(no exceedance, exceedance everywhere or perfectly separated data). Returning NaNs.",
+                      RuntimeWarning)
+    return {
+        'theta': theta.reshape(batch_shape),
+        'beta': beta.reshape(batch_shape),
+        'success': success.reshape(batch_shape),
+        'n_iter': n_iter.reshape(batch_shape),
+        'neg_log_likelihood': np.where(success, nll, np.nan).reshape(batch_shape),
+    }
@@ -0,0 +1,209 @@
+import numpy as np
+from scipy.special import log_ndtr
+import warnings
+
+# With per-record capacities (the IM at which each record first reaches the damage state), the
+# lognormal fragility is the CDF of the capacities: y = ln(IM_capacity) ~ N(mu, beta^2), theta = exp(mu).
+# A record that never reached the damage state up to the highest IM analysed, c, contributes
+# P(y > ln c) (right censoring); one that had already reached it at the lowest IM analysed, c,
+# contributes P(y <= ln c) (left censoring). In (g, d) = (mu/beta, 1/beta) the negative log-likelihood
+#   sum_observed [-ln d + (d*y - g)^2 / 2] - sum_censored ln Phi(s*(g - d*ln c))
+# with s = +1 (right) or -1 (left) is convex, so the batched Newton iteration below converges from any start.
+
+_LOG_SQRT_2PI = 0.5 * np.log(2 * np.pi)
+
+def _nll(g, d, y, obs, cen, sign):
+    """Negative log-likelihood (up to a constant) of a batch of censored curves; g, d (batch,)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = d[:, np.newaxis] * y - g[:, np.newaxis]
+        w = sign * (g[:, np.newaxis] - d[:, np.newaxis] * y)
+        f = np.sum(np.where(obs, 0.5 * r**2, 0.0), axis=-1) - np.sum(obs, axis=-1) * np.log(d)
+        return f - np.sum(np.where(cen, log_ndtr(w), 0.0), axis=-1)
+
+def _nll_grad_hess(g, d, y, obs, cen, sign):
+    """
+    Negative log-likelihood, gradient (batch x 2) and Hessian (batch x 2 x 2) in (g, d); sign is
+    +1 for right- and -1 for left-censored records.
+    """
+    r = d[:, np.newaxis] * y - g[:, np.newaxis]
+    w = sign * (g[:, np.newaxis] - d[:, np.newaxis] * y)
+    log_cdf = log_ndtr(w)
+    lam = np.where(cen, np.exp(-0.5 * w**2 - _LOG_SQRT_2PI - log_cdf), 0.0) # phi/Phi (censored only)
+    h = lam * (w + lam)
+    lam = sign * lam # The Hessian terms carry sign**2 = 1
+    n_obs = np.sum(obs, axis=-1)
+    r, y_obs = np.where(obs, r, 0.0), np.where(obs, y, 0.0)
+    y_cen = np.where(cen, y, 0.0)
+
+    nll = np.sum(0.5 * r**2, axis=-1) - n_obs * np.log(d) - np.sum(np.where(cen, log_cdf, 0.0), axis=-1)
+    grad = np.stack((-np.sum(r, axis=-1) - np.sum(lam, axis=-1),
+                     -n_obs / d + np.sum(r * y_obs, axis=-1) + np.sum(lam * y_cen, axis=-1)), axis=-1)
+    h_gg = n_obs + np.sum(h, axis=-1)
+    h_gd = -np.sum(y_obs, axis=-1) - np.sum(h * y_cen, axis=-1)
+    h_dd = n_obs / d**2 + np.sum(y_obs**2, axis=-1) + np.sum(h * y_cen**2, axis=-1)
+    hess = np.stack((np.stack((h_gg, h_gd), axis=-1), np.stack((h_gd, h_dd), axis=-1)), axis=-2)
+    return nll, grad, hess
+
+def fit_fragility_censored(im_capacity: np.ndarray,
+                           censor_im: np.ndarray | float | None = None,
+                           left_censor_im: np.ndarray | float | None = None,
+                           max_iter: int = 100,
+                           tol: float = 1e-10
+                           ) -> dict:
+    """
+    Fits lognormal fragility curves to per-record capacities by censored Maximum Likelihood.
+
+    Each record's capacity is the IM at which it first reaches the damage state (e.g. the
+    'threshold_pga' of run_adaptive_ida, or record_capacities of a fixed-grid IDA). Records that
+    never reached it (capacity inf) are right-censored at the highest IM they were analysed at;
+    records that had already reached it at the lowest IM analysed (capacity -inf) are
+    left-censored there; records with NaN capacity are left out. Without censoring the estimate
+    is the mean and the (biased, MLE) standard deviation of ln(capacity). Curves are fitted
+    together by a vectorized Newton iteration, as in fit_fragility_curves_batch.
+
+    Args:
+        im_capacity (np.ndarray): Capacity IM per record, shape (..., n_records); inf if right-,
+                                  -inf if left-censored.
+        censor_im (np.ndarray | float | None, optional): Highest IM analysed for each record,
+                                                         broadcastable to im_capacity. Required
+                                                         if any capacity is inf. Defaults to None.
+        left_censor_im (np.ndarray | float | None, optional): Lowest IM analysed for each record,
+                                                              broadcastable to im_capacity. Required
+                                                              if any capacity is -inf. Defaults to None.
+        max_iter (int, optional): Maximum Newton iterations. Defaults to 100.
+        tol (float, optional): Convergence tolerance on the Newton step. Defaults to 1e-10.
+
+    Returns:
+        dict: A dictionary containing results (batch shape = im_capacity.shape[:-1]):
+            'theta' (np.ndarray): Median capacity (NaN where the fit failed).
+            'beta' (np.ndarray): Logarithmic standard deviation (NaN where the fit failed).
+            'success' (np.ndarray): True where the estimate exists and the iteration converged.
+            'n_observed' (np.ndarray): Records that reached the damage state.
+            'n_censored' (np.ndarray): Records right-censored at censor_im.
+            'n_left_censored' (np.ndarray): Records left-censored at left_censor_im.
+    """
+    im_capacity = np.asarray(im_capacity, dtype=float)
+    censored, left = np.isposinf(im_capacity), np.isneginf(im_capacity)
+    values = im_capacity
+    if np.any(censored):
+        if censor_im is None: raise ValueError("censor_im is required when some capacities are inf (censored).")
+        values = np.where(censored, np.broadcast_to(np.asarray(censor_im, dtype=float), im_capacity.shape), values)
+    if np.any(left):
+        if left_censor_im is None: raise ValueError("left_censor_im is required when some capacities are -inf (left-censored).")
+        values = np.where(left, np.broadcast_to(np.asarray(left_censor_im, dtype=float), im_capacity.shape), values)
+    if np.any(values[~np.isnan(values)] <= 0) or np.any(np.isneginf(values)):
+        raise ValueError("Capacities, censor_im and left_censor_im must be > 0.")
+
+    batch_shape = im_capacity.shape[:-1]
+    n_records = im_capacity.shape[-1]
+    values = values.reshape(-1, n_records)
+    left = left.reshape(-1, n_records) & np.isfinite(values)
+    cen = (censored.reshape(-1, n_records) & np.isfinite(values)) | left
+    sign = np.where(left, -1.0, 1.0)
+    obs = np.isfinite(values) & ~cen
+    y = np.log(np.where(obs | cen, values, 1.0))
+    n_curves = values.shape[0]
+    n_obs, n_cen, n_left = np.sum(obs, axis=-1), np.sum(cen & ~left, axis=-1), np.sum(left, axis=-1)
+
+    # --- Start: moments of the observed log capacities ---
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mu0 = np.sum(np.where(obs, y, 0.0), axis=-1) / n_obs
+        sd0 = np.sqrt(np.sum(np.where(obs, (y - mu0[:, np.newaxis])**2, 0.0), axis=-1) / n_obs)
+    # No finite estimate without two distinct observed capacities (all censored: mu -> inf; equal: beta -> 0)
+    solvable = (n_obs >= 2) & (sd0 > 0)
+    sd0 = np.where(solvable, sd0, 1.0)
+    d = 1.0 / sd0
+    g = np.where(solvable, mu0, 0.0) * d
+    converged = np.zeros(n_curves, dtype=bool)
+    active = np.flatnonzero(solvable & (n_cen + n_left > 0))
+    converged[solvable & (n_cen + n_left == 0)] = True # Closed form
+
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        yy, oo, cc, ss = y[active], obs[active], cen[active], sign[active]
+        f, grad, H = _nll_grad_hess(g[active], d[active], yy, oo, cc, ss)
+        det = H[:, 0, 0] * H[:, 1, 1] - H[:, 0, 1]**2 # > 0: n_obs/d^2 makes H positive definite
+        step_g = (H[:, 1, 1] * grad[:, 0] - H[:, 0, 1] * grad[:, 1]) / det
+        step_d = (H[:, 0, 0] * grad[:, 1] - H[:, 0, 1] * grad[:, 0]) / det
+
+        # Backtracking line search (halving) per curve, keeping d > 0
+        t = np.ones(active.size)
+        for _ in range(40):
+            g_new, d_new = g[active] - t * step_g, d[active] - t * step_d
+            f_new = _nll(g_new, d_new, yy, oo, cc, ss)
+            bad = (d_new <= 0) | ~(f_new <= f + 1e-12 * np.abs(f))
+            if not np.any(bad):
+                break
+            t = np.where(bad, 0.5 * t, t)
+        accept = ~bad
+        g[active] = np.where(accept, g_new, g[active])
+        d[active] = np.where(accept, d_new, d[active])
+
+        step = t * np.hypot(step_g, step_d)
+        done = accept & (step <= tol * (1.0 + np.hypot(g[active], d[active])))
+        converged[active[done]] = True
+        active = active[~done & accept]
+
+    success = converged & solvable
+    theta = np.where(success, np.exp(g / d), np.nan)
+    beta = np.where(success, 1.0 / d, np.nan)
+    n_failed = int(np.sum(~success))
+    if n_failed:
+        warnings.warn(f"{n_failed} of {n_curves} censored fragility fits have no finite MLE or did not converge "
+                      "(fewer than two distinct observed capacities). Returning NaNs.", RuntimeWarning)
+    return {
+        'theta': theta.reshape(batch_shape),
+        'beta': beta.reshape(batch_shape),
+        'success': success.reshape(batch_shape),
+        'n_observed': n_obs.reshape(batch_shape),
+        'n_censored': n_cen.reshape(batch_shape),
+        'n_left_censored': n_left.reshape(batch_shape),
+    }
+
+def record_capacities(EDP: np.ndarray, im_levels: np.ndarray, limits) -> tuple:
+    """
+    Per-record capacities of a fixed-grid IDA for fit_fragility_censored.
+
+    The capacity is the IM of the first level at which EDP > limit, linearly interpolated from the
+    level below (as hunt_and_fill_ida does); a record that never exceeds is censored (inf) at its
+    highest level with a finite EDP, and one that already exceeds at its first analysed level is
+    left-censored (-inf) there: its capacity is only known to be at most that IM. Pass the
+    results on as fit_fragility_censored(*record_capacities(...)).
+
+    Args:
+        EDP (np.ndarray): Demand per record and IM level (n_records x n_levels); NaN where not analysed.
+        im_levels (np.ndarray): Increasing IM levels (n_levels,).
+        limits (float | list): Damage-state limit(s).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Capacities (n_DS x n_records; inf if right-, -inf if
+                                                   left-censored, NaN if the record has no analysed
+                                                   level), censor IM and left censor IM (n_records,).
+    """
+    EDP = np.asarray(EDP, dtype=float)
+    im_levels = np.asarray(im_levels, dtype=float).flatten()
+    limits = np.atleast_1d(np.asarray(limits, dtype=float))
+    if EDP.ndim != 2 or EDP.shape[1] != im_levels.shape[0]: raise ValueError("EDP must have shape (n_records, n_levels).")
+    if np.any(np.diff(im_levels) <= 0): raise ValueError("im_levels must be increasing.")
+
+    analysed = ~np.isnan(EDP)
+    any_analysed = np.any(analysed, axis=1)
+    last = EDP.shape[1] - 1 - np.argmax(analysed[:, ::-1], axis=1)
+    first_analysed = np.argmax(analysed, axis=1)
+    censor_im = np.where(any_analysed, im_levels[last], np.nan)
+    left_censor_im = np.where(any_analysed, im_levels[first_analysed], np.nan)
+
+    exceed = analysed[np.newaxis] & (EDP[np.newaxis] > limits[:, np.newaxis, np.newaxis]) # (n_DS x n_rec x n_lev)
+    reached = np.any(exceed, axis=-1)
+    first = np.argmax(exceed, axis=-1)
+    prev = np.maximum(first - 1, 0)
+    rows = np.arange(EDP.shape[0])
+    im_hi, im_lo = im_levels[first], im_levels[prev]
+    edp_hi, edp_lo = EDP[rows, first], EDP[rows, prev]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = (limits[:, np.newaxis] - edp_lo) / (edp_hi - edp_lo)
+    interp = (first > 0) & np.isfinite(edp_hi) & np.isfinite(edp_lo) & (edp_hi > edp_lo) & (frac >= 0)
+    capacity = np.where(interp, im_lo + np.clip(frac, 0.0, 1.0) * (im_hi - im_lo), im_hi)
+    capacity = np.where(reached, np.where(first == first_analysed, -np.inf, capacity), np.inf)
+    return np.where(any_analysed, capacity, np.nan), censor_im, left_censor_im
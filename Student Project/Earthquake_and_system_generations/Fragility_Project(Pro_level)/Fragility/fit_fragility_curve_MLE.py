@@ -1,8 +1,11 @@
 import numpy as np
 from scipy.stats import norm
-from scipy.optimize import minimize
+from scipy.optimize import OptimizeResult, minimize
+from scipy.special import log_ndtr
 import warnings
 
+from Fragility.fit_fragility_batch import _initial_guess, _nll
+
 def _lognormal_cdf(x, theta, beta):
     """Calculates the lognormal CDF value(s). P[X <= x] = Phi(ln(x/theta)/beta)"""
     # Ensure input is numpy array for vectorized operations
@@ -60,25 +63,90 @@ def _negative_log_likelihood(params, x, k, n):
     # Return negative log-likelihood
     return -log_likelihood
 
+def _fit_probit_irls(im_levels: np.ndarray,
+                     num_exceed: np.ndarray,
+                     num_trials: np.ndarray,
+                     max_iter: int = 50,
+                     tol: float = 1e-10
+                     ) -> tuple[float, float, bool, int]:
+    """
+    MLE of the lognormal fragility as a binomial GLM with probit link on ln(IM), solved by IRLS.
+
+    P(exceed | x) = Phi(a + b*ln(x)) with theta = exp(-a/b) and beta = 1/b. Each iteration solves the
+    2x2 weighted least-squares system X'WX delta = X'u (Fisher scoring), halving the step if the
+    likelihood does not improve. The start and the likelihood are those of fit_fragility_curves_batch.
+
+    Returns:
+        tuple[float, float, bool, int]: theta, beta, converged flag and number of iterations.
+    """
+    x = np.log(im_levels)
+    k = num_exceed.astype(float)
+    n = num_trials.astype(float)
+    curve = (x[np.newaxis], k[np.newaxis], n[np.newaxis]) # A batch of one for the shared helpers
+
+    def nll(a, b):
+        return _nll(np.array([a]), np.array([b]), *curve)[0]
+
+    # --- Start ---
+    a, b = (float(v[0]) for v in _initial_guess(*curve))
+    f = nll(a, b)
+
+    # --- IRLS ---
+    for it in range(1, max_iter + 1):
+        eta = a + b * x
+        log_pdf = -0.5 * eta**2 - 0.5 * np.log(2 * np.pi)
+        log_mu, log_1mu = log_ndtr(eta), log_ndtr(-eta)
+        w = n * np.exp(2 * log_pdf - log_mu - log_1mu)    # n phi^2 / (mu (1 - mu))
+        u = (k - n * np.exp(log_mu)) * np.exp(log_pdf - log_mu - log_1mu) # Score per level
+        s0, s1, s2 = np.sum(w), np.sum(w * x), np.sum(w * x**2)
+        det = s0 * s2 - s1**2
+        if not det > 0:
+            return np.nan, np.nan, False, it
+        g0, g1 = np.sum(u), np.sum(u * x)
+        da, db = (s2 * g0 - s1 * g1) / det, (s0 * g1 - s1 * g0) / det
+
+        t = 1.0
+        for _ in range(30): # Step halving
+            f_new = nll(a + t * da, b + t * db)
+            if b + t * db > 0 and f_new <= f + 1e-12 * abs(f):
+                break
+            t *= 0.5
+        else:
+            return np.nan, np.nan, False, it
+        a, b, f = a + t * da, b + t * db, f_new
+        if b > 1e6: # Perfectly separated data: beta -> 0, no finite MLE
+            return np.nan, np.nan, False, it
+        if t * np.hypot(da, db) <= tol * (1.0 + np.hypot(a, b)):
+            return np.exp(-a / b), 1.0 / b, True, it
+    return np.nan, np.nan, False, max_iter
+
 def fit_fragility_curve_MLE(im_levels: np.ndarray,
                              num_exceed: np.ndarray,
-                             num_trials: np.ndarray
+                             num_trials: np.ndarray,
+                             method: str = 'irls'
                              ) -> tuple[float, float, bool, object]:
     """
     Fits a lognormal CDF fragility curve using Maximum Likelihood Estimation (MLE).
 
+    The default 'irls' method solves the equivalent probit GLM on ln(IM) by iteratively
+    reweighted least squares (the exact MLE in a handful of iterations). If it does not converge,
+    e.g. for perfectly separated data, the Nelder-Mead optimizer is used instead.
+
     Args:
         im_levels (np.ndarray): Vector of intensity measure levels.
         num_exceed (np.ndarray): Vector of the number of exceedances at each IM level.
         num_trials (np.ndarray): Vector of the total trials (GMs) at each IM level.
+        method (str, optional): 'irls' (with Nelder-Mead fallback) or 'nelder-mead'. Defaults to 'irls'.
 
     Returns:
         tuple[float, float, bool, object]: A tuple containing:
             - theta (float): Estimated median capacity (θ). NaN if fitting fails.
             - beta (float): Estimated log-standard deviation (β). NaN if fitting fails.
             - success (bool): Flag indicating if optimization was successful.
-            - opt_result (object): The full optimization result object from scipy.optimize.minimize.
+            - opt_result (object): The full optimization result object from scipy.optimize.minimize
+                                   (an OptimizeResult with x = [ln theta, ln beta] and nit for IRLS).
     """
+    if method not in ('irls', 'nelder-mead'): raise ValueError("method must be 'irls' or 'nelder-mead'.")
     im_levels = np.asarray(im_levels)
     num_exceed = np.asarray(num_exceed)
     num_trials = np.asarray(num_trials)
@@ -98,7 +166,16 @@ def fit_fragility_curve_MLE(im_levels: np.ndarray,
     if np.all(num_exceed == num_trials):
         warnings.warn("All trials resulted in exceedance. Fragility curve is likely one everywhere. Returning NaNs.", RuntimeWarning)
         return np.nan, np.nan, False, None
-        
+
+    # --- Probit GLM by IRLS ---
+    if method == 'irls' and np.all(im_levels > 0):
+        theta_irls, beta_irls, converged, n_iter = _fit_probit_irls(im_levels, num_exceed, num_trials)
+        if converged:
+            x_opt = np.log([theta_irls, beta_irls])
+            result = OptimizeResult(x=x_opt, fun=_negative_log_likelihood(x_opt, im_levels, num_exceed, num_trials),
+                                    success=True, nit=n_iter, message="IRLS converged.")
+            return theta_irls, beta_irls, True, result
+
     # Calculate empirical exceedance rates
     empirical_rates = num_exceed / num_trials
     
@@ -151,7 +228,6 @@ def fit_fragility_curve_MLE(im_levels: np.ndarray,
         theta_opt = np.exp(ln_theta_opt)
         beta_opt = np.exp(ln_beta_opt)
         success = True
-        print(f"MLE Optimization Successful: theta={theta_opt:.4f}, beta={beta_opt:.4f} (Method: {opt_method})")
     else:
         warnings.warn(f"MLE optimization failed: {result.message}", RuntimeWarning)
         theta_opt = np.nan
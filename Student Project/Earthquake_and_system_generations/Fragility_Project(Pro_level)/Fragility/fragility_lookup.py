@@ -0,0 +1,119 @@
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+from numba_compat import NUMBA_AVAILABLE, njit
+
+# Every lognormal fragility curve is the standard normal CDF of z = a + b*ln(IM), a = -ln(theta)/beta,
+# b = 1/beta, so one table of Phi on a uniform z grid serves any number of curves. Linear
+# interpolation of Phi with spacing h errs by at most h^2/8 * max|Phi''| = h^2/8 * phi(1), and
+# beyond +-z_max the table ends are within Phi(-z_max) of the exact value; each gets half of tol.
+_MAX_ABS_PHI_SECOND_DERIVATIVE = np.exp(-0.5) / np.sqrt(2 * np.pi) # phi(1)
+
+def fragility_table(theta: np.ndarray, beta: np.ndarray, tol: float = 1e-6) -> dict:
+    """
+    Precomputes the lookup table for evaluating lognormal fragility curves within tol of the exact CDF.
+
+    Args:
+        theta (np.ndarray): Median capacity of each curve (n_curves,).
+        beta (np.ndarray): Logarithmic standard deviation of each curve (n_curves,).
+        tol (float, optional): Maximum absolute error of the evaluated probabilities. Defaults to 1e-6.
+
+    Returns:
+        dict: Lookup table: 'theta', 'beta', 'offset', 'slope' (n_curves; grid index of ln(IM)),
+              'values' (Phi on the z grid) and 'tol'.
+    """
+    theta = np.atleast_1d(np.asarray(theta, dtype=float))
+    beta = np.atleast_1d(np.asarray(beta, dtype=float))
+    if theta.shape != beta.shape or theta.ndim != 1: raise ValueError("theta and beta must be 1-D arrays of the same length.")
+    if np.any(~(theta > 0)) or np.any(~(beta > 0)): raise ValueError("theta and beta must be > 0.")
+    if not 1e-12 <= tol < 0.5: raise ValueError("tol must be between 1e-12 and 0.5.")
+
+    z_max = -ndtri(tol / 2)
+    h = np.sqrt(8 * (tol / 2) / _MAX_ABS_PHI_SECOND_DERIVATIVE)
+    n_points = int(np.ceil(2 * z_max / h)) + 1
+    z = np.linspace(-z_max, z_max, n_points)
+    inv_h = (n_points - 1) / (2 * z_max)
+    a, b = -np.log(theta) / beta, 1.0 / beta
+    return {
+        'theta': theta,
+        'beta': beta,
+        'offset': (a + z_max) * inv_h, # Grid index u = offset + slope * ln(IM)
+        'slope': b * inv_h,
+        'values': ndtr(z),
+        'tol': tol,
+    }
+
+@njit(cache=True)
+def _interp_table(u, values):
+    """Linear interpolation of values at fractional grid index u (scalar), clamped to the table ends."""
+    last = values.size - 1
+    if u != u: # NaN IM
+        return np.nan
+    if u <= 0.0:
+        return values[0]
+    if u >= last:
+        return values[last]
+    i = int(u)
+    return values[i] + (u - i) * (values[i + 1] - values[i])
+
+@njit(cache=True)
+def _lookup_outer(log_im, offset, slope, values, out):
+    """out[c, j] = P(exceed | IM_j) of curve c."""
+    for c in range(offset.size):
+        u0, u1 = offset[c], slope[c]
+        for j in range(log_im.size):
+            out[c, j] = _interp_table(u0 + u1 * log_im[j], values)
+
+@njit(cache=True)
+def _lookup_paired(log_im, curves, offset, slope, values, out):
+    """out[j] = P(exceed | IM_j) of curve curves[j]."""
+    for j in range(log_im.size):
+        c = curves[j]
+        out[j] = _interp_table(offset[c] + slope[c] * log_im[j], values)
+
+def _interp_table_numpy(u: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Vectorized _interp_table (used without Numba)."""
+    u_clip = np.clip(np.nan_to_num(u, nan=0.0), 0.0, values.size - 1)
+    i = np.minimum(u_clip.astype(np.intp), values.size - 2)
+    out = values[i] + (u_clip - i) * (values[i + 1] - values[i])
+    return np.where(np.isnan(u), np.nan, out)
+
+def evaluate_fragility(table: dict, im: np.ndarray, curves: np.ndarray | None = None) -> np.ndarray:
+    """
+    Probabilities of exceedance from a fragility_table, within table['tol'] of the exact lognormal CDF.
+
+    Without curves every curve is evaluated at every IM (e.g. damage states x scenario IMs); with
+    curves each IM is evaluated on its own curve (e.g. one facility type per site). ln(IM) is taken
+    once per IM. IM <= 0 gives the table's lower end (<= tol/2) rather than exactly 0.
+
+    Args:
+        table (dict): Lookup table from fragility_table.
+        im (np.ndarray): Intensity measures, any shape.
+        curves (np.ndarray | None, optional): Curve index per IM, same shape as im. Defaults to None.
+
+    Returns:
+        np.ndarray: (n_curves,) + im.shape without curves, im.shape with curves.
+    """
+    im = np.asarray(im, dtype=float)
+    with np.errstate(divide='ignore'):
+        log_im = np.log(np.maximum(im, 0.0)).ravel() # -inf for IM <= 0, NaN stays NaN
+    offset, slope, values = table['offset'], table['slope'], table['values']
+
+    if curves is None:
+        if NUMBA_AVAILABLE:
+            out = np.empty((offset.size, log_im.size))
+            _lookup_outer(log_im, offset, slope, values, out)
+        else:
+            out = _interp_table_numpy(offset[:, np.newaxis] + slope[:, np.newaxis] * log_im, values)
+        return out.reshape((offset.size,) + im.shape)
+
+    curves = np.asarray(curves)
+    if curves.shape != im.shape: raise ValueError("curves must have the same shape as im.")
+    curves = curves.ravel().astype(np.intp)
+    if curves.size and (curves.min() < 0 or curves.max() >= offset.size): raise ValueError("curve index out of range.")
+    if NUMBA_AVAILABLE:
+        out = np.empty(log_im.size)
+        _lookup_paired(log_im, curves, offset, slope, values, out)
+    else:
+        out = _interp_table_numpy(offset[curves] + slope[curves] * log_im, values)
+    return out.reshape(im.shape)
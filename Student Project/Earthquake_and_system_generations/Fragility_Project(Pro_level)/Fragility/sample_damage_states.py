@@ -0,0 +1,97 @@
+import numpy as np
+
+DEFAULT_CHUNK_BYTES = 64 << 20 # 64 MiB of float64 per chunk work array
+
+def sample_damage_states(theta: np.ndarray,
+                         beta: np.ndarray,
+                         im,
+                         n_scenarios: int | None = None,
+                         seed: int | None = None,
+                         chunk_size: int | None = None,
+                         out: np.ndarray | None = None,
+                         return_states: bool = True
+                         ) -> dict:
+    """
+    Monte Carlo damage states of many facilities over many scenarios from fitted fragility curves.
+
+    Each facility/scenario gets one draw, compared with the facility's exceedance probabilities
+    P_1 >= P_2 >= ... of its damage states (curves that cross are made non-increasing, so the states
+    are nested); the damage state is the number of probabilities above the draw (0 = none). The draw
+    is taken as a standard normal e = ndtri(u) of the uniform u and compared with the curves' z =
+    ln(IM/theta)/beta (u < Phi(z) <=> e < z), which needs no CDF evaluation. Scenarios are processed
+    in chunks, so only one chunk of floats is held at a time; the draws do not depend on chunk_size.
+
+    Args:
+        theta (np.ndarray): Median capacity per facility and damage state, in increasing severity
+                            (n_facilities x n_damage_states).
+        beta (np.ndarray): Logarithmic standard deviation, same shape.
+        im (np.ndarray | callable): IM per scenario and facility (n_scenarios x n_facilities; may be a
+                                    np.memmap), or a function (start, stop) -> IM of scenarios start..stop-1.
+        n_scenarios (int | None, optional): Number of scenarios (required when im is a function).
+                                            Defaults to im.shape[0].
+        seed (int | None, optional): Seed of the draws. Defaults to None.
+        chunk_size (int | None, optional): Scenarios per chunk. Defaults to 64 MiB per float work array.
+        out (np.ndarray | None, optional): Array (e.g. np.memmap) to write the damage states into
+                                           (n_scenarios x n_facilities, integer). Defaults to None.
+        return_states (bool, optional): Keep the damage states (in out or a new int8 array); with
+                                        False only the counts are accumulated. Defaults to True.
+
+    Returns:
+        dict: A dictionary containing results:
+            'damage_states' (np.ndarray | None): Damage state per scenario and facility (0..n_damage_states).
+            'counts' (np.ndarray): Scenarios per facility and damage state (n_facilities x n_damage_states+1).
+    """
+    theta = np.atleast_2d(np.asarray(theta, dtype=float))
+    beta = np.atleast_2d(np.asarray(beta, dtype=float))
+    if theta.shape != beta.shape: raise ValueError("theta and beta must have the same shape.")
+    if np.any(~(theta > 0)) or np.any(~(beta > 0)): raise ValueError("theta and beta must be > 0.")
+    n_facilities, n_ds = theta.shape
+    if n_ds > 126: raise ValueError("At most 126 damage states are supported.")
+
+    if callable(im):
+        if n_scenarios is None: raise ValueError("n_scenarios is required when im is a function.")
+        read_chunk = im
+    else:
+        if im.ndim != 2 or im.shape[1] != n_facilities: raise ValueError("im must have shape (n_scenarios, n_facilities).")
+        n_scenarios = im.shape[0] if n_scenarios is None else n_scenarios
+        read_chunk = lambda start, stop: im[start:stop]
+    if chunk_size is None:
+        chunk_size = max(1, DEFAULT_CHUNK_BYTES // (8 * n_facilities))
+
+    states = None
+    if return_states:
+        if out is None:
+            out = np.empty((n_scenarios, n_facilities), dtype=np.int8)
+        elif out.shape != (n_scenarios, n_facilities): raise ValueError("out must have shape (n_scenarios, n_facilities).")
+        states = out
+
+    log_theta, inv_beta = np.log(theta).T, 1.0 / beta.T # (n_ds x n_facilities)
+    rng = np.random.default_rng(seed)
+    counts = np.zeros((n_facilities, n_ds + 1), dtype=np.int64)
+    n_rows = min(chunk_size, n_scenarios)
+    ds = np.empty((n_rows, n_facilities), dtype=np.int8) # Work arrays, reused by every chunk
+    e = np.empty((n_rows, n_facilities))
+    z = np.empty((n_rows, n_facilities))
+    z_min = np.empty((n_rows, n_facilities))
+    for start in range(0, n_scenarios, chunk_size):
+        stop = min(start + chunk_size, n_scenarios)
+        rows = stop - start
+        with np.errstate(divide='ignore'): # IM <= 0: no damage
+            log_im = np.log(np.maximum(np.asarray(read_chunk(start, stop), dtype=float), 0.0))
+        if log_im.shape != (rows, n_facilities): raise ValueError("im chunk has the wrong shape.")
+        rng.standard_normal(out=e[:rows])
+
+        chunk_ds, chunk_z, chunk_z_min = ds[:rows], z[:rows], z_min[:rows]
+        chunk_ds[:] = 0
+        chunk_z_min[:] = np.inf
+        for d in range(n_ds): # Few damage states: loop, vectorized over scenarios and facilities
+            np.subtract(log_im, log_theta[d], out=chunk_z)
+            chunk_z *= inv_beta[d]
+            np.minimum(chunk_z_min, chunk_z, out=chunk_z_min) # Nested (non-increasing) P
+            chunk_ds += e[:rows] < chunk_z_min
+
+        for d in range(n_ds + 1):
+            counts[:, d] += np.count_nonzero(chunk_ds == d, axis=0)
+        if states is not None:
+            states[start:stop] = chunk_ds
+    return {'damage_states': states, 'counts': counts}
@@ -0,0 +1,341 @@
+import numpy as np
+from scipy.fft import irfft, rfft
+from scipy.integrate import cumulative_trapezoid
+
+CM_S2_PER_G = 981.0 # cm/s^2 per g, as used by Run_IDA_Analysis.m
+
+# --- SAC scenario statistics (response spectrum compatible fits of SAC_stats2d.m) ---
+# Ground motion parameters X (13):
+#   VpNS VpEW Tp Nc Tpk phi VrNS VrEW tau1 tau2 tau3 fg zg
+# Ex: means, Sx: standard deviations (Vx = Sx**2), Cz5: correlation of (VpNS, VpEW, Tp, VrNS, VrEW),
+# f_lo/f_hi: spectral band quake_SAC2d.m uses for the scenario (Hz)
+QUAKE_SETS = {
+    'nrfault': {
+        'Ex': [100, 100, 1.1, 0.9, 5.0, 6.28, 70, 70, 4.0, 0.5, 4.1, 0.5, 1.0],
+        'Sx': [40, 40, 1.2, 0, 0, 0, 35, 35, 0, 0, 0, 0.2, 0],
+        'Cz5': [[1.00, 0.35, -0.51, 0.20, 0.10],
+                [0.35, 1.00, -0.08, -0.03, -0.04],
+                [-0.51, -0.08, 1.00, -0.11, -0.09],
+                [0.20, -0.03, -0.11, 1.00, 0.68],
+                [0.10, -0.04, -0.09, 0.68, 1.00]],
+        'f_lo': 0.10, 'f_hi': 8.0,
+    },
+    'la10in50': {
+        'Ex': [15, 15, 5.0, 0.8, 5.0, 6.28, 60, 60, 3.7, 0.2, 4.5, 1.0, 1.8],
+        'Sx': [50, 50, 0.5, 0, 0, 0, 30, 30, 0, 0, 0, 0.1, 0],
+        'Cz5': [[1.00, 0.52, -0.26, -0.17, 0.03],
+                [0.52, 1.00, -0.51, 0.01, 0.33],
+                [-0.26, -0.51, 1.00, -0.05, -0.39],
+                [-0.17, 0.01, -0.05, 1.00, 0.70],
+                [0.03, 0.33, -0.39, 0.70, 1.00]],
+        'f_lo': 0.07, 'f_hi': 9.0,
+    },
+    'la2in50': {
+        'Ex': [50, 50, 1.7, 0.7, 4.8, 6.28, 120, 120, 4.5, 0.5, 3.8, 0.7, 1.2],
+        'Sx': [60, 60, 0.7, 0, 0, 0, 40, 40, 0, 0, 0, 0.1, 0],
+        'Cz5': [[1.00, 0.75, -0.58, -0.08, -0.25],
+                [0.75, 1.00, -0.62, -0.65, -0.68],
+                [-0.58, -0.62, 1.00, 0.32, 0.43],
+                [-0.08, -0.65, 0.32, 1.00, 0.84],
+                [-0.25, -0.68, 0.43, 0.84, 1.00]],
+        'f_lo': 0.07, 'f_hi': 9.0,
+    },
+    'se10in50': {
+        'Ex': [10, 10, 2.1, 0.8, 6.1, 6.28, 25, 25, 12.2, 0.2, 10.4, 1.8, 1.7],
+        'Sx': [20, 20, 0.8, 0, 0, 0, 30, 30, 0, 0, 0, 0.2, 0],
+        'Cz5': [[1.00, 0.82, 0.08, -0.46, -0.61],
+                [0.82, 1.00, -0.05, -0.56, -0.38],
+                [0.08, -0.05, 1.00, 0.01, -0.27],
+                [-0.46, -0.56, 0.01, 1.00, 0.44],
+                [-0.61, -0.38, -0.27, 0.44, 1.00]],
+        'f_lo': 0.10, 'f_hi': 20.0,
+    },
+    'se2in50': {
+        'Ex': [40, 40, 1.0, 1.2, 6.6, 6.28, 60, 60, 15.7, 0.20, 10.6, 1.7, 1.7],
+        'Sx': [12, 12, 1.0, 0, 0, 0, 50, 50, 0, 0, 0, 0.2, 0],
+        'Cz5': [[1.00, 0.94, -0.60, -0.43, -0.23],
+                [0.94, 1.00, -0.62, -0.48, -0.16],
+                [-0.60, -0.62, 1.00, -0.18, -0.18],
+                [-0.43, -0.48, -0.18, 1.00, 0.55],
+                [-0.23, -0.16, -0.18, 0.55, 1.00]],
+        'f_lo': 0.10, 'f_hi': 20.0,
+    },
+}
+
+def _record_rngs(seed, first_record: int, n_records: int) -> list:
+    """One independent generator per record; record i depends only on (seed, i)."""
+    root = np.random.SeedSequence(seed)
+    return [np.random.default_rng(np.random.SeedSequence(root.entropy, spawn_key=(i,)))
+            for i in range(first_record, first_record + n_records)]
+
+def sac_stats2d(quake_set: str, N: float = 3, n_records: int = 1, rng=None) -> np.ndarray:
+    """
+    Samples SAC ground motion parameters (Python port of SAC_stats2d.m).
+
+    Correlated lognormal variables are drawn for every record and redrawn until the record passes
+    the same acceptance checks as the MATLAB code; Tpk and tau3 are then adjusted so the pulse
+    arrives at an appropriate time.
+
+    Args:
+        quake_set (str): 'nrfault', 'la10in50', 'la2in50', 'se10in50' or 'se2in50'.
+        N (float, optional): Maximum allowable variability (X < Ex + N*sqrt(Vx)). Defaults to 3.
+        n_records (int, optional): Number of parameter sets. Defaults to 1.
+        rng (np.random.Generator | list | None, optional): Generator, or one generator per record.
+                                                           Defaults to a fresh default_rng().
+
+    Returns:
+        np.ndarray: Ground motion parameters (n_records x 13):
+                    [VpNS VpEW Tp Nc Tpk phi VrNS VrEW tau1 tau2 tau3 fg zg].
+    """
+    if quake_set not in QUAKE_SETS:
+        raise ValueError(f"Unknown quake_set '{quake_set}'. Choose from {sorted(QUAKE_SETS)}.")
+    stats = QUAKE_SETS[quake_set]
+    Ex = np.asarray(stats['Ex'], dtype=float)
+    Vx = np.asarray(stats['Sx'], dtype=float)**2
+    v = [0, 1, 2, 6, 7] # Correlated random variables
+    Cz = np.eye(13)
+    Cz[np.ix_(v, v)] = stats['Cz5']
+    R = np.linalg.cholesky(Cz).T # Upper triangular, R.T @ R = Cz (MATLAB chol)
+
+    COV = np.sqrt(Vx) / Ex # Coefficient of variation of X
+    Vlnx = np.log(COV**2 + 1) # Variance of log(X)
+    offset = np.zeros(13)
+    offset[[2, 3, 5, 6, 7, 8, 10]] = [0.8, 0.5, -2 * np.pi, 10.0, 10.0, 1.0, 1.0]
+    limit = Ex + N * np.sqrt(Vx)
+
+    rngs = rng if isinstance(rng, list) else [rng if rng is not None else np.random.default_rng()] * n_records
+    if len(rngs) != n_records: raise ValueError("rng must hold one generator per record.")
+    X = np.empty((n_records, 13))
+    pending = np.arange(n_records)
+    while pending.size: # Redraw the records whose parameters are too large
+        Zc = np.array([rngs[i].standard_normal(13) for i in pending]) @ R # Correlated standard normals
+        Xp = Ex * np.exp(-0.5 * Vlnx + Zc * np.sqrt(Vlnx)) + offset # Correlated lognormal
+        ok = ((Xp[:, 0] < limit[0]) & (Xp[:, 1] < limit[1])
+              & (Xp[:, 2] < Ex[2] + N * np.sqrt(Vx[1]) + 0.8) # Vx(2) as in SAC_stats2d.m
+              & (Xp[:, 5] < limit[5]) & (Xp[:, 6] < limit[6]))
+        X[pending[ok]] = Xp[ok]
+        pending = pending[~ok]
+
+    # Adjust Tpk and tau3 for the pulse to arrive at an appropriate time
+    X[:, 4] = np.minimum(X[:, 4], (X[:, 8] + X[:, 9] + X[:, 10]) / 4) # Pulse does not arrive too late
+    X[:, 4] = np.maximum(X[:, 4], X[:, 8] + X[:, 2] * X[:, 3] / 2)   # Pulse does not arrive too early
+    X[:, 10] = np.maximum(X[:, 10], X[:, 2] * X[:, 3] - X[:, 8])     # Duration must include the pulse
+    return X
+
+def ftdsp(u: np.ndarray, ni: int, flo: float, fhi: float, sr: float) -> np.ndarray:
+    """
+    Band-pass filters and integrates (ni > 0) or differentiates (ni < 0) discrete-time signals
+    (Python port of ftdsp.m, vectorized over leading axes).
+
+    The signals are detrended and cosine-windowed, transformed with a 2^n point real FFT,
+    multiplied by a tapered band-pass filter and (i*2*pi*f)^(-ni), and transformed back.
+
+    Args:
+        u (np.ndarray): Signals along the last axis (..., P).
+        ni (int): Number of integrations (negative for differentiation).
+        flo, fhi (float): Band-pass limits (Hz), 0 <= flo, fhi <= sr/2.
+        sr (float): Sample rate (Hz).
+
+    Returns:
+        np.ndarray: Filtered/integrated signals (..., P).
+    """
+    P = u.shape[-1]
+    tc = np.arange(P) - 0.5 * (P - 1) # Centred sample index
+    slope = (u @ tc) / (tc @ tc)
+    u = u - np.mean(u, axis=-1, keepdims=True) - slope[..., np.newaxis] * tc # Base-line correction (linear detrend)
+    Pw = P // 20 # Number of window points
+    ramp = 0.5 * (1 - np.cos(np.pi * np.arange(Pw + 1) / Pw)) if Pw > 0 else np.ones(1)
+    w = np.concatenate([ramp, np.ones(P - 2 * Pw - 2), ramp[::-1]])
+    u = u * w
+
+    NF = 2**int(np.ceil(np.log2(P))) # 2^n points for the FFT
+    delta_f = sr / NF # Frequency resolution
+    f = np.arange(NF // 2 + 1) * delta_f # Non-negative frequencies (real FFT)
+
+    # MATLAB (1-based) bin indices of the pass band and its cosine tapers
+    kloP = max(int(np.floor(flo / delta_f)) + 1, 1)
+    khiP = min(int(np.floor(fhi / delta_f)) + 1, NF // 2 + 1)
+    Nband_lo = Nband_hi = int(np.round(abs(khiP - kloP) / 10)) # Transition bandwidths
+    if Nband_lo > kloP: Nband_lo = kloP + 1
+    if Nband_hi > khiP: Nband_hi = khiP + 1
+
+    H = np.zeros(NF // 2 + 1) # Filter transfer function
+    H[kloP - 1:khiP] = 1.0
+    if flo > delta_f and Nband_lo > 0:
+        k = np.arange(Nband_lo + 1)
+        H[kloP - 1 + k] = 0.5 * (1 - np.cos(k * np.pi / Nband_lo))
+    if fhi < sr / 2 - delta_f and Nband_hi > 0:
+        k = np.arange(Nband_hi + 1)
+        H[khiP - 1 - k] = 0.5 * (1 - np.cos(k * np.pi / Nband_hi))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ID = (2j * np.pi * f)**(-float(ni)) # Integration/differentiation filter
+    ID[0] = 1.0
+
+    return irfft(rfft(u, NF, axis=-1) * (H * ID), NF, axis=-1)[..., :P]
+
+def pulse_v(Vp, Tp, Nc, Tpk, phi, P: int, delta_t: float) -> np.ndarray:
+    """
+    Velocity of the coherent pulse (velocity column of pulseV.m), vectorized over records.
+
+    The Gaussian envelope exp(-ts^2/16) is below 1e-17 for |ts| > 8*pi, so the pulse is only
+    evaluated on the time window where some record has |ts| <= 8*pi and is zero elsewhere.
+
+    Args:
+        Vp, Tp, Nc, Tpk, phi (float | np.ndarray): Peak velocity, period, cycles, time of the
+                                                    peak and phase of each pulse (n_records,).
+        P (int): Number of points.
+        delta_t (float): Time step (s).
+
+    Returns:
+        np.ndarray: Pulse velocity (n_records x P).
+    """
+    Vp, Tp, Nc, Tpk, phi = (np.atleast_1d(np.asarray(x, dtype=float))[:, np.newaxis] for x in (Vp, Tp, Nc, Tpk, phi))
+    half_width = 4 * Tp * Nc # |ts| = 8*pi
+    lo = int(np.clip(np.floor(np.min(Tpk - half_width) / delta_t) - 1, 0, P))
+    hi = int(np.clip(np.ceil(np.max(Tpk + half_width) / delta_t) + 1, lo, P))
+    time = np.arange(lo + 1, hi + 1) * delta_t
+
+    veloc = np.zeros((Vp.shape[0], P))
+    ts = (time - Tpk) * 2 * np.pi / Tp / Nc # Scaled time
+    veloc[:, lo:hi] = Vp * np.exp(-ts**2 / 16) * np.cos(Nc * ts - phi) # Even pulse if phi = 0
+    return veloc
+
+def _synthesize_records(X: np.ndarray, rngs: list, P: int, P0: int, T0: float, delta_t: float,
+                        f_lo: float, f_hi: float) -> np.ndarray:
+    """
+    Two-component motions of records of one length P (the body of quake_sac2d).
+
+    Every record's FFT grid, filters and window follow from P alone, so a record is the same
+    whichever other records share the call.
+
+    Returns:
+        np.ndarray: (n_records x P x 6) [accelNS velocNS displNS accelEW velocEW displEW].
+    """
+    m = X.shape[0]
+    n = np.arange(1, P + 1)
+
+    # --- FFT grid for the spectral synthesis ---
+    NS = 2**int(np.ceil(np.log2(P + 1)))
+    df = 1.0 / (NS * delta_t)
+    k = np.arange(int(np.ceil(f_lo / df)), min(int(np.floor(f_hi / df)), NS // 2 - 1) + 1)
+    freq = k * df
+
+    # Envelope: zeros, quadratic rise, plateau, exponential decay (as in quake_SAC2d.m)
+    P1 = np.floor(X[:, 8:9] / delta_t).astype(int)  # Envelope rise
+    P2 = np.floor(X[:, 9:10] / delta_t).astype(int) # Envelope plateau
+    P3 = np.floor(X[:, 10:11] / delta_t).astype(int) # Envelope decay
+    decay_start = P0 + P1 + np.maximum(P2 - 1, 0)
+    envl = np.where(n <= P0, 0.0,
+           np.where(n <= P0 + P1, ((n - P0) / np.maximum(P1, 1))**2,
+           np.where(n <= decay_start, 1.0, np.exp(-(n - decay_start - 1) / P3))))
+
+    # Spectral power of the random motion
+    fg, zg = X[:, 11:12], X[:, 12:13]
+    r = 2 * zg * freq / fg
+    ampl = r**2 / ((1 - (freq / fg)**2)**2 + r**2)
+    coef = np.sqrt(4 * ampl * df) * (NS / 2) # irfft scaling: X_k = (NS/2) c_k e^{i phase_k}
+
+    out = np.empty((m, P, 6))
+    draws = np.array([rng.random((2, len(k) + 1)) for rng in rngs]) # Phases + pulse phase per direction
+    for direction in range(2): # 0: NS, 1: EW
+        Vp, Vr = X[:, direction], X[:, 6 + direction]
+        phase = 2 * np.pi * draws[:, direction, :-1]
+        spectrum = np.zeros((m, NS // 2 + 1), dtype=complex)
+        spectrum.real[:, k] = coef * np.cos(phase)
+        spectrum.imag[:, k] = coef * np.sin(phase)
+        accel = envl * irfft(spectrum, NS, axis=-1)[:, 1:P + 1] # Unscaled accel without pulse, t = n*delta_t
+
+        veloc = ftdsp(accel, 1, f_lo, f_hi, 1 / delta_t) # Unscaled veloc without pulse
+        peak = np.argmax(np.abs(veloc), axis=1)
+        Vm = veloc[np.arange(m), peak]
+        veloc *= (Vr / np.abs(Vm) * np.sign(Vm))[:, np.newaxis] # Scaled veloc without pulse
+
+        phi = 2 * np.pi * draws[:, direction, -1] # Random phase of the pulse
+        veloc += pulse_v(Vp, X[:, 2], X[:, 3], T0 + X[:, 4], phi, P, delta_t)
+
+        col = 3 * direction
+        out[:, :, col] = ftdsp(veloc, -1, 0.0, f_hi, 1 / delta_t) # Accel
+        out[:, :, col + 1] = veloc
+        out[:, :, col + 2] = cumulative_trapezoid(veloc, dx=delta_t, axis=-1, initial=0) # Displ
+    return out
+
+def quake_sac2d(quake_set: str = 'la10in50',
+                n_records: int = 1,
+                delta_t: float = 0.01,
+                seed=None,
+                f_lo: float | None = None,
+                f_hi: float | None = None,
+                first_record: int = 0,
+                chunk_size: int = 256
+                ) -> dict:
+    """
+    Synthetic two-component SAC-scenario ground motions (Python port of quake_SAC2d.m).
+
+    Each record is an enveloped random motion with the Kanai-Tajimi-like spectrum of the sampled
+    parameters, scaled to the sampled peak velocity, plus a coherent velocity pulse. The random
+    motion uses FFT spectral synthesis: the cosines of quake_SAC2d.m are placed on the FFT
+    frequency grid inside [f_lo, f_hi] with uniform random phases, so the records of a chunk
+    that have the same length are synthesized with one inverse real FFT instead of an NF x P
+    sum of cosines. Records are generated in chunks of chunk_size and written into one output array.
+
+    Every record is synthesized over its own MATLAB length max(P0+P1+P2+4*P3, 60/delta_t), on the
+    FFT grid of that length, and then padded to the longest record of the batch: the acceleration
+    and velocity, which the filter windows have brought to rest, with zeros and the displacement
+    with its final value.
+
+    Args:
+        quake_set (str, optional): 'nrfault', 'la10in50', 'la2in50', 'se10in50' or 'se2in50'.
+                                   Defaults to 'la10in50'.
+        n_records (int, optional): Number of records. Defaults to 1.
+        delta_t (float, optional): Time step (s). Defaults to 0.01.
+        seed (int | None, optional): Seed; record i depends only on (seed, first_record + i),
+                                     so records are reproducible whatever n_records or chunk_size
+                                     (up to the padding). Defaults to None (fresh entropy).
+        f_lo, f_hi (float | None, optional): Spectral band (Hz). Defaults to the scenario band
+                                             that quake_SAC2d.m imposes.
+        first_record (int, optional): Index of the first record (to extend a suite). Defaults to 0.
+        chunk_size (int, optional): Records synthesized per FFT batch. Defaults to 256.
+
+    Returns:
+        dict: A dictionary containing results:
+            'time' (np.ndarray): Time vector (s), (1..n_steps) * delta_t.
+            'quake_data' (np.ndarray): (n_records x n_steps x 6) array with columns
+                                       [accelNS velocNS displNS accelEW velocEW displEW]
+                                       in cm/s^2, cm/s and cm.
+            'X' (np.ndarray): Ground motion parameters of each record (n_records x 13).
+            'n_steps' (np.ndarray): Length of each record before padding (n_records,).
+    """
+    if quake_set not in QUAKE_SETS:
+        raise ValueError(f"Unknown quake_set '{quake_set}'. Choose from {sorted(QUAKE_SETS)}.")
+    f_lo = QUAKE_SETS[quake_set]['f_lo'] if f_lo is None else f_lo
+    f_hi = QUAKE_SETS[quake_set]['f_hi'] if f_hi is None else f_hi
+    if not 0 < f_lo < f_hi <= 0.5 / delta_t: raise ValueError("Require 0 < f_lo < f_hi <= Nyquist frequency.")
+
+    rngs = _record_rngs(seed, first_record, n_records)
+    X = sac_stats2d(quake_set, 3, n_records, rngs)
+
+    # --- Record lengths (points) ---
+    T0 = 5.0 # Initial time of no motion
+    P0 = int(np.floor(T0 / delta_t))
+    P1 = np.floor(X[:, 8] / delta_t).astype(int)  # Envelope rise
+    P2 = np.floor(X[:, 9] / delta_t).astype(int)  # Envelope plateau
+    P3 = np.floor(X[:, 10] / delta_t).astype(int) # Envelope decay
+    n_steps = np.maximum(P0 + P1 + P2 + 4 * P3, int(np.floor(60 / delta_t + 1e-9)))
+    P = int(np.max(n_steps))
+    time = np.arange(1, P + 1) * delta_t
+
+    quake_data = np.zeros((n_records, P, 6))
+    for start in range(0, n_records, chunk_size):
+        chunk = np.arange(start, min(start + chunk_size, n_records))
+        for Pr in np.unique(n_steps[chunk]): # Records of one length share the FFT grid
+            idx = chunk[n_steps[chunk] == Pr]
+            quake_data[idx, :Pr] = _synthesize_records(X[idx], [rngs[i] for i in idx], Pr, P0, T0, delta_t, f_lo, f_hi)
+            quake_data[idx, Pr:, 2::3] = quake_data[idx, Pr - 1:Pr, 2::3] # Displacement stays where it ended
+
+    return {'time': time, 'quake_data': quake_data, 'X': X, 'n_steps': n_steps}
+
+def to_records_g(quake_data: np.ndarray, direction: str = 'NS') -> np.ndarray:
+    """Ground accelerations in g (n_records x n_steps) of one direction of quake_sac2d output."""
+    if direction not in ('NS', 'EW'): raise ValueError("direction must be 'NS' or 'EW'.")
+    return quake_data[..., 0 if direction == 'NS' else 3] / CM_S2_PER_G
@@ -0,0 +1,193 @@
+import os
+
+import numpy as np
+
+from GroundMotions.quake_sac2d import CM_S2_PER_G
+
+# A record store is a folder with two files:
+#   records.f8  - all ground accelerations (g), float64, concatenated record after record
+#   index.npz   - one entry per record: record_id, offset and n_steps into records.f8, dt, pga_orig_g, seed, quake_set
+DATA_FILE = "records.f8"
+INDEX_FILE = "index.npz"
+_INDEX_FIELDS = ('record_id', 'offset', 'n_steps', 'dt', 'pga_orig_g', 'seed', 'quake_set')
+
+def _empty_index() -> dict:
+    return {'record_id': np.array([], dtype=str), 'offset': np.array([], dtype=np.int64),
+            'n_steps': np.array([], dtype=np.int64), 'dt': np.array([], dtype=float),
+            'pga_orig_g': np.array([], dtype=float), 'seed': np.array([], dtype=np.int64),
+            'quake_set': np.array([], dtype=str)}
+
+def _read_index(path: str) -> dict:
+    index_path = os.path.join(path, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return _empty_index()
+    with np.load(index_path) as saved:
+        return {field: saved[field] for field in _INDEX_FIELDS}
+
+def append_records(path: str,
+                   records_g,
+                   dt: float,
+                   pga_orig_g: np.ndarray | None = None,
+                   seeds: np.ndarray | None = None,
+                   quake_set: str = '',
+                   record_ids: list | None = None
+                   ) -> list:
+    """
+    Appends ground motion records to a record store, creating it if needed.
+
+    The samples are appended to records.f8 before the index is rewritten (atomically, via a
+    temporary file), so an interrupted append leaves the store readable with its previous records.
+
+    Args:
+        path (str): Record store folder.
+        records_g (np.ndarray | list): Ground accelerations (g), shape (n_records, n_steps) or a
+                                       list of 1-D records of any length.
+        dt (float): Time step (s).
+        pga_orig_g (np.ndarray | None, optional): Unscaled PGA of each record (g). Defaults to max(|record|).
+        seeds (np.ndarray | None, optional): Generator seed of each record. Defaults to -1 (unknown).
+        quake_set (str, optional): Scenario name. Defaults to ''.
+        record_ids (list | None, optional): Record identifiers (unique within the store).
+                                            Defaults to the running record number.
+
+    Returns:
+        list: Identifiers of the appended records.
+    """
+    if isinstance(records_g, np.ndarray) and records_g.ndim <= 2:
+        records = list(np.atleast_2d(records_g))
+    else:
+        records = list(records_g)
+    records = [np.ascontiguousarray(r, dtype=np.float64).ravel() for r in records]
+    n_new = len(records)
+
+    os.makedirs(path, exist_ok=True)
+    index = _read_index(path)
+    n_old = len(index['record_id'])
+
+    if record_ids is None:
+        record_ids = [str(i) for i in range(n_old, n_old + n_new)]
+    record_ids = [str(rid) for rid in record_ids]
+    if len(record_ids) != n_new: raise ValueError("record_ids must have one entry per record.")
+    if len(set(record_ids)) != n_new or set(record_ids) & set(index['record_id'].tolist()):
+        raise ValueError("record_ids must be unique within the record store.")
+    if pga_orig_g is None:
+        pga_orig_g = [np.max(np.abs(r)) if r.size else 0.0 for r in records]
+    pga_orig_g = np.asarray(pga_orig_g, dtype=float).flatten()
+    if pga_orig_g.shape != (n_new,): raise ValueError("pga_orig_g must have one entry per record.")
+    seeds = np.full(n_new, -1, dtype=np.int64) if seeds is None else np.asarray(seeds, dtype=np.int64).flatten()
+    if seeds.shape != (n_new,): raise ValueError("seeds must have one entry per record.")
+
+    # --- Samples (appended after the last indexed record, discarding any partial write) ---
+    data_path = os.path.join(path, DATA_FILE)
+    end = int(index['offset'][-1] + index['n_steps'][-1]) if n_old else 0
+    with open(data_path, 'r+b' if os.path.exists(data_path) else 'wb') as f:
+        f.truncate(end * 8)
+        f.seek(end * 8)
+        for r in records:
+            f.write(r.tobytes())
+    lengths = np.array([r.size for r in records], dtype=np.int64)
+    offsets = end + np.concatenate(([0], np.cumsum(lengths)[:-1])) if n_new else lengths
+
+    # --- Index ---
+    new = {'record_id': np.array(record_ids, dtype=str), 'offset': offsets, 'n_steps': lengths,
+           'dt': np.full(n_new, float(dt)), 'pga_orig_g': pga_orig_g, 'seed': seeds,
+           'quake_set': np.array([quake_set] * n_new, dtype=str)}
+    index = {field: np.concatenate((index[field], new[field])) for field in _INDEX_FIELDS}
+    tmp_path = os.path.join(path, INDEX_FILE + ".tmp.npz")
+    np.savez(tmp_path, **index)
+    os.replace(tmp_path, os.path.join(path, INDEX_FILE))
+    return record_ids
+
+def append_quake_sac2d(path: str, generated: dict, quake_set: str, delta_t: float,
+                       seed: int | None = None, first_record: int = 0, direction: str = 'NS') -> list:
+    """
+    Appends quake_sac2d output (one direction) to a record store.
+
+    Each record is stored over its own length (generated['n_steps']), without the padding to the
+    longest record of the batch. PGA_orig is the maximum over both directions, as in
+    Run_Generate_GMs.m. Record ids are '<quake_set>_<seed>_<record number>'.
+
+    Args:
+        path (str): Record store folder.
+        generated (dict): quake_sac2d result.
+        quake_set (str): Scenario the records were generated for.
+        delta_t (float): Time step (s).
+        seed (int | None, optional): Seed passed to quake_sac2d. Defaults to None (stored as -1).
+        first_record (int, optional): first_record passed to quake_sac2d. Defaults to 0.
+        direction (str, optional): 'NS' or 'EW'. Defaults to 'NS'.
+
+    Returns:
+        list: Identifiers of the appended records.
+    """
+    if direction not in ('NS', 'EW'): raise ValueError("direction must be 'NS' or 'EW'.")
+    quake_data = generated['quake_data']
+    n_records = quake_data.shape[0]
+    pga_orig_g = np.max(np.abs(quake_data[..., [0, 3]]), axis=(1, 2)) / CM_S2_PER_G
+    numbers = range(first_record, first_record + n_records)
+    column = 0 if direction == 'NS' else 3
+    records_g = [quake_data[i, :n, column] / CM_S2_PER_G for i, n in enumerate(generated['n_steps'])]
+    return append_records(path, records_g, delta_t,
+                          pga_orig_g=pga_orig_g, seeds=np.full(n_records, -1 if seed is None else seed),
+                          quake_set=quake_set, record_ids=[f"{quake_set}_{seed}_{i}" for i in numbers])
+
+def open_record_store(path: str) -> dict:
+    """
+    Opens a record store read-only; the samples are memory-mapped, not loaded.
+
+    Args:
+        path (str): Record store folder.
+
+    Returns:
+        dict: A dictionary containing:
+            'path' (str): Record store folder.
+            'data' (np.memmap): All samples (g) (total_steps,).
+            'index' (dict): Index arrays 'record_id', 'offset', 'n_steps', 'dt', 'pga_orig_g',
+                            'seed' and 'quake_set' (n_records,).
+            'position' (dict): record_id -> position in the index.
+    """
+    index = _read_index(path)
+    if not len(index['record_id']):
+        raise ValueError(f"No records in record store '{path}'.")
+    total = int(index['offset'][-1] + index['n_steps'][-1])
+    data = np.memmap(os.path.join(path, DATA_FILE), dtype=np.float64, mode='r', shape=(total,))
+    return {
+        'path': path,
+        'data': data,
+        'index': index,
+        'position': {rid: i for i, rid in enumerate(index['record_id'].tolist())},
+    }
+
+def get_record(store: dict, record_id) -> np.ndarray:
+    """Ground acceleration (g) of one record as a zero-copy view of the memory map."""
+    i = store['position'][str(record_id)]
+    offset = int(store['index']['offset'][i])
+    return store['data'][offset:offset + int(store['index']['n_steps'][i])]
+
+def get_records(store: dict, record_ids: list | None = None) -> np.ndarray:
+    """
+    Ground accelerations (g) of several records as one (n_records, n_steps) array.
+
+    Consecutive records of equal length are returned as a zero-copy view of the memory map;
+    otherwise the records are gathered into a new array, shorter ones padded with zeros
+    (the ground at rest) to the longest length.
+
+    Args:
+        store (dict): Record store from open_record_store.
+        record_ids (list | None, optional): Records to read. Defaults to all, in store order.
+
+    Returns:
+        np.ndarray: Ground accelerations (g) (n_records x n_steps).
+    """
+    index = store['index']
+    pos = (np.arange(len(index['record_id'])) if record_ids is None
+           else np.array([store['position'][str(rid)] for rid in record_ids], dtype=np.int64))
+    offsets, lengths = index['offset'][pos], index['n_steps'][pos]
+    n_steps = int(np.max(lengths)) if pos.size else 0
+
+    if pos.size and np.all(lengths == n_steps) and np.all(np.diff(offsets) == n_steps):
+        start = int(offsets[0])
+        return store['data'][start:start + pos.size * n_steps].reshape(pos.size, n_steps)
+
+    records = np.zeros((pos.size, n_steps))
+    for row, (offset, n) in enumerate(zip(offsets, lengths)):
+        records[row, :n] = store['data'][offset:offset + n]
+    return records
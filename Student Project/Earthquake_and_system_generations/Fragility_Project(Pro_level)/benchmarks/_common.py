@@ -0,0 +1,37 @@
+import time
+
+import numpy as np
+from scipy.stats import norm
+
+# Inputs and timing shared by the benchmark scripts (and the test fixtures)
+
+# --- Inputs ---
+def synthetic_records(n_records: int, n_steps: int, dt: float = 0.01, pga_g: float = 0.4, seed: int = 0) -> np.ndarray:
+    """Enveloped white-noise accelerations (g), scaled to pga_g."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_steps) * dt
+    envelope = np.exp(-((t - 0.3 * t[-1]) / (0.2 * t[-1]))**2)
+    records = rng.standard_normal((n_records, n_steps)) * envelope
+    return records * (pga_g / np.max(np.abs(records), axis=1, keepdims=True))
+
+def synthetic_counts(n_levels: int, n_curves: int = 1, n_trials: int = 30, seed: int = 0) -> tuple:
+    """Binomial exceedance counts of random lognormal curves on a common PGA grid (n_curves x n_levels)."""
+    rng = np.random.default_rng(seed)
+    im_levels = np.linspace(0.05, 1.5, n_levels)
+    theta = rng.uniform(0.4, 0.9, (n_curves, 1))
+    beta = rng.uniform(0.3, 0.6, (n_curves, 1))
+    num_exceed = rng.binomial(n_trials, norm.cdf(np.log(im_levels / theta) / beta))
+    return im_levels, num_exceed, np.full(num_exceed.shape, n_trials)
+
+# --- Timing ---
+def time_case(func, repeat: int = 5, budget_s: float = np.inf, warmup: bool = True) -> dict:
+    """Best-of-repeat timing, after one untimed call if warmup; stops early once budget_s is spent."""
+    if warmup:
+        func()
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat and (not times or time.perf_counter() - start < budget_s):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return {'min_s': min(times), 'median_s': float(np.median(times)), 'repeat': len(times)}
@@ -0,0 +1,53 @@
+"""
+Fragility fitting calls per second: probit GLM by IRLS (fit_fragility_curve_MLE default) vs. the
+previous Nelder-Mead optimizer, and the batched Newton fit of all curves at once.
+
+Run from the project folder:
+    python benchmarks/bench_fragility_fit.py
+"""
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Fragility.fit_fragility_batch import fit_fragility_curves_batch
+from Fragility.fit_fragility_curve_MLE import _negative_log_likelihood, fit_fragility_curve_MLE
+from benchmarks._common import synthetic_counts as _synthetic_counts
+
+def _fit_all(im_levels, num_exceed, num_trials, method: str) -> tuple:
+    """Fits every curve one call at a time; returns (seconds, parameters [theta, beta] per curve)."""
+    params = np.full((num_exceed.shape[0], 2), np.nan)
+    start = time.perf_counter()
+    for i in range(num_exceed.shape[0]):
+        theta, beta, success, _ = fit_fragility_curve_MLE(im_levels, num_exceed[i], num_trials[i], method=method)
+        if success:
+            params[i] = theta, beta
+    return time.perf_counter() - start, params
+
+def main(n_curves: int = 200, n_levels: int = 30, n_trials: int = 30):
+    im_levels, num_exceed, num_trials = _synthetic_counts(n_levels, n_curves, n_trials)
+    with warnings.catch_warnings(): # Curves without any exceedance are skipped with a warning
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        t_nm, p_nm = _fit_all(im_levels, num_exceed, num_trials, 'nelder-mead')
+        t_irls, p_irls = _fit_all(im_levels, num_exceed, num_trials, 'irls')
+        start = time.perf_counter()
+        batch = fit_fragility_curves_batch(im_levels, num_exceed, num_trials)
+        t_batch = time.perf_counter() - start
+
+    ok = np.all(np.isfinite(p_nm) & np.isfinite(p_irls), axis=1)
+    nll = lambda p, i: _negative_log_likelihood(np.log(p), im_levels, num_exceed[i], num_trials[i])
+    gain = np.array([nll(p_nm[i], i) - nll(p_irls[i], i) for i in np.flatnonzero(ok)])
+    print(f"{n_curves} curves x {n_levels} PGA levels, {n_trials} records")
+    print(f"  Nelder-Mead:      {n_curves / t_nm:10.0f} fits/s")
+    print(f"  IRLS:             {n_curves / t_irls:10.0f} fits/s  ({t_nm / t_irls:6.1f}x)")
+    print(f"  batched Newton:   {n_curves / t_batch:10.0f} fits/s  ({t_nm / t_batch:6.1f}x)")
+    print(f"  max |theta_IRLS - theta_NM| / theta_NM: {np.max(np.abs(p_irls[ok, 0] / p_nm[ok, 0] - 1)):.1e}, "
+          f"IRLS likelihood >= Nelder-Mead on {np.mean(gain >= -1e-9):.0%} of curves")
+    print(f"  max |theta_batch - theta_IRLS| / theta_IRLS: {np.nanmax(np.abs(batch['theta'][ok] / p_irls[ok, 0] - 1)):.1e}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Evaluating fragility curves: scipy.stats.norm.cdf vs. the precomputed lookup table (fragility_lookup).
+
+Run from the project folder:
+    python benchmarks/bench_fragility_lookup.py
+"""
+import os
+import sys
+
+import numpy as np
+from scipy.stats import norm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Fragility.fragility_lookup as fragility_lookup
+from Fragility.fragility_lookup import evaluate_fragility, fragility_table
+from benchmarks._common import time_case as _time_case
+
+def _best_time(func, repeat: int = 5) -> float:
+    """Best-of-repeat wall time (seconds)."""
+    return _time_case(func, repeat, warmup=False)['min_s']
+
+def main(n_curves: int = 20, n_sites: int = 50000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    theta = rng.uniform(0.2, 1.5, n_curves)
+    beta = rng.uniform(0.2, 0.8, n_curves)
+    im = rng.lognormal(np.log(0.3), 0.8, n_sites) # Scenario IM at every site
+    site_curve = rng.integers(0, n_curves, n_sites)
+
+    table = fragility_table(theta, beta)
+    evaluate_fragility(table, im[:10]) # Compile (Numba)
+    evaluate_fragility(table, im[:10], site_curve[:10])
+
+    exact = norm.cdf(np.log(im / theta[:, np.newaxis]) / beta[:, np.newaxis])
+    t_norm = _best_time(lambda: norm.cdf(np.log(im / theta[:, np.newaxis]) / beta[:, np.newaxis]))
+    t_table = _best_time(lambda: evaluate_fragility(table, im))
+    err = np.max(np.abs(evaluate_fragility(table, im) - exact))
+
+    exact_paired = norm.cdf(np.log(im / theta[site_curve]) / beta[site_curve])
+    t_norm_paired = _best_time(lambda: norm.cdf(np.log(im / theta[site_curve]) / beta[site_curve]))
+    t_table_paired = _best_time(lambda: evaluate_fragility(table, im, site_curve))
+    err_paired = np.max(np.abs(evaluate_fragility(table, im, site_curve) - exact_paired))
+
+    print(f"{n_curves} curves x {n_sites} sites, table of {table['values'].size} points "
+          f"(tol {table['tol']:.0e}, Numba: {fragility_lookup.NUMBA_AVAILABLE})")
+    print(f"  all curves, norm.cdf:  {t_norm * 1e3:8.2f} ms")
+    print(f"  all curves, table:     {t_table * 1e3:8.2f} ms  ({t_norm / t_table:5.1f}x, max error {err:.1e})")
+    print(f"  curve per site, norm.cdf: {t_norm_paired * 1e3:8.2f} ms")
+    print(f"  curve per site, table:    {t_table_paired * 1e3:8.2f} ms  ({t_norm_paired / t_table_paired:5.1f}x, "
+          f"max error {err_paired:.1e})")
+
+if __name__ == '__main__':
+    main()
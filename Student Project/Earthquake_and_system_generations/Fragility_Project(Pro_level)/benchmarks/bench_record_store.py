@@ -0,0 +1,56 @@
+"""
+Loading a record suite: one .mat file per record (as Run_IDA_Analysis.m) vs. the memory-mapped record store.
+
+Run from the project folder:
+    python benchmarks/bench_record_store.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from scipy.io import loadmat, savemat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from GroundMotions.record_store import append_records, get_record, get_records, open_record_store
+
+def main(n_records: int = 2000, n_steps: int = 6000, dt: float = 0.01):
+    rng = np.random.default_rng(0)
+    records = 0.1 * rng.standard_normal((n_records, n_steps))
+    with tempfile.TemporaryDirectory() as folder:
+        mat_dir = os.path.join(folder, "Ground_Motions")
+        os.makedirs(mat_dir)
+        for i, rec in enumerate(records): # Same content as a GM_*.mat file (6 columns, cm/s^2)
+            quake_data = np.zeros((n_steps, 6))
+            quake_data[:, 0] = rec * 981
+            savemat(os.path.join(mat_dir, f"GM_{i:04d}.mat"),
+                    {'quake_data': quake_data, 'PGA_orig': np.max(np.abs(rec)) * 981, 'dt': dt})
+        store_dir = os.path.join(folder, "records")
+        append_records(store_dir, records, dt, seeds=np.arange(n_records), quake_set='synthetic')
+
+        start = time.perf_counter()
+        for i in range(n_records):
+            gm = loadmat(os.path.join(mat_dir, f"GM_{i:04d}.mat"))
+            rec_mat = gm['quake_data'][:, 0] / 981
+        t_mat = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = open_record_store(store_dir)
+        for i in range(n_records):
+            rec_store = np.array(get_record(store, i)) # Force the read
+        t_store = time.perf_counter() - start
+
+        start = time.perf_counter()
+        suite = np.array(get_records(open_record_store(store_dir)))
+        t_suite = time.perf_counter() - start
+
+    assert np.allclose(rec_mat, rec_store) and suite.shape == records.shape
+    print(f"{n_records} records x {n_steps} steps (page cache warm)")
+    print(f"  per-file .mat loadmat:      {t_mat:8.3f} s")
+    print(f"  record store, by id:        {t_store:8.3f} s  ({t_mat / t_store:6.1f}x)")
+    print(f"  record store, whole suite:  {t_suite:8.3f} s  ({t_mat / t_suite:6.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Per-step cost of the time history solvers vs. number of stories (dense vs. banded storage).
+
+Run from the project folder:
+    python benchmarks/bench_story_scaling.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Analysis.run_time_history import run_time_history, run_time_history_batch
+from Analysis.shear_building import define_shear_building
+from benchmarks._common import synthetic_records as _synthetic_records, time_case as _time_case
+
+def _time_per_step(func, n_steps: int, repeat: int = 3) -> float:
+    """Best-of-repeat wall time per time step (seconds)."""
+    return _time_case(func, repeat, warmup=False)['min_s'] / (n_steps - 1)
+
+def main(story_counts=(3, 10, 20, 40, 60), n_records: int = 64, n_steps: int = 500, dt: float = 0.01):
+    records = _synthetic_records(n_records, n_steps, dt)
+    print(f"Per-step cost (microseconds), batch of {n_records} records, {n_steps} steps")
+    print(f"{'stories':>8} {'lin dense':>10} {'lin band':>10} {'nl dense':>10} {'nl band':>10} {'nl kernel':>10}")
+    for n_stories in story_counts:
+        s = define_shear_building(n_stories)
+        lin = dict(model_type='linear', M=s['M'], K_or_Fy=s['K_initial'], dt=dt, H=s['H'],
+                   alpha_M=s['alpha_M'], beta_K=s['beta_K'], K_init=s['K_initial'])
+        nl = dict(model_type='nonlinear', M=s['M'], K_or_Fy=s['Fy'], dt=dt, H=s['H'],
+                  alpha_M=s['alpha_M'], beta_K=s['beta_K'], K_init=s['K_initial'], alpha=s['alpha'])
+        run_time_history(accel_gm_g=records[0], nonlinear_kernel=True, **nl) # Compile outside the timing
+
+        timings = [
+            _time_per_step(lambda: run_time_history_batch(accel_gm_g=records, banded=False, **lin), n_steps),
+            _time_per_step(lambda: run_time_history_batch(accel_gm_g=records, banded=True, **lin), n_steps),
+            _time_per_step(lambda: run_time_history_batch(accel_gm_g=records, banded=False, **nl), n_steps, repeat=1),
+            _time_per_step(lambda: run_time_history_batch(accel_gm_g=records, banded=True, **nl), n_steps, repeat=1),
+            _time_per_step(lambda: [run_time_history(accel_gm_g=r, nonlinear_kernel=True, **nl) for r in records], n_steps),
+        ]
+        print(f"{n_stories:>8d} " + " ".join(f"{1e6 * t:>10.1f}" for t in timings))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Benchmark suite of the fragility pipeline with JSON results for regression tracking.
+
+Cases: run_time_history (linear and nonlinear, several record lengths and story counts), the
+fragility fitters at several numbers of IM levels, and an end-to-end mini IDA. Every case is run
+once untimed (imports, Numba compilation), then timed best-of-repeat.
+
+Run from the project folder:
+    python benchmarks/run_benchmarks.py                        # writes benchmarks/results/<time>.json
+    python benchmarks/run_benchmarks.py --filter fit           # only cases whose name contains 'fit'
+    python benchmarks/run_benchmarks.py --compare OLD.json     # exit code 1 if a case is slower by > --threshold
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import warnings
+
+import numpy as np
+import scipy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Analysis.run_ida import run_ida
+from Analysis.run_time_history import run_time_history
+from Analysis.shear_building import define_shear_building
+from Fragility.fit_fragility_batch import fit_fragility_curves_batch
+from Fragility.fit_fragility_curve_MLE import fit_fragility_curve_MLE
+from Fragility import fit_fragility_curves
+from benchmarks._common import synthetic_counts as _synthetic_counts, synthetic_records as _synthetic_records, time_case as _time_case
+from numba_compat import NUMBA_AVAILABLE
+
+RESULTS_VERSION = 1
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DT = 0.01
+
+# --- Cases: name -> (parameters, setup returning the function to time) ---
+def _time_history_case(model_type: str, n_stories: int, n_steps: int, **options):
+    def setup():
+        s = define_shear_building(n_stories)
+        record = _synthetic_records(1, n_steps, DT)[0]
+        args = dict(model_type=model_type, M=s['M'], K_or_Fy=s['K_initial'] if model_type == 'linear' else s['Fy'],
+                    dt=DT, accel_gm_g=record, H=s['H'], alpha_M=s['alpha_M'], beta_K=s['beta_K'],
+                    K_init=s['K_initial'], alpha=s['alpha'] if model_type == 'nonlinear' else None, **options)
+        return lambda: run_time_history(**args)
+    return setup
+
+def _fit_case(fitter: str, n_levels: int, n_curves: int = 1):
+    def setup():
+        im_levels, num_exceed, num_trials = _synthetic_counts(n_levels, n_curves)
+        if fitter == 'batch':
+            return lambda: fit_fragility_curves_batch(im_levels, num_exceed, num_trials)
+        if fitter == 'lbfgsb':
+            return lambda: fit_fragility_curves.fit_fragility_curve_MLE(im_levels, num_exceed[0], num_trials[0])
+        return lambda: fit_fragility_curve_MLE(im_levels, num_exceed[0], num_trials[0], method=fitter)
+    return setup
+
+def _mini_ida_case(n_records: int, n_levels: int, n_steps: int):
+    def setup():
+        model = define_shear_building(3)
+        records = _synthetic_records(n_records, n_steps, DT)
+        pga_levels = np.linspace(0.1, 1.0, n_levels)
+        def run():
+            results = run_ida(records, pga_levels, model, DT, n_workers=1)
+            fit_fragility_curve_MLE(pga_levels, np.sum(results['MIDR_Nonlinear'] > 0.01, axis=0),
+                                    np.full(n_levels, n_records))
+        return run
+    return setup
+
+def _cases() -> dict:
+    cases = {}
+    for n_stories in (3, 10):
+        for n_steps in (2000, 8000):
+            size = dict(stories=n_stories, steps=n_steps)
+            cases[f"time_history.linear_newmark[stories={n_stories},steps={n_steps}]"] = (
+                size, _time_history_case('linear', n_stories, n_steps, linear_method='newmark'))
+            cases[f"time_history.linear_modal[stories={n_stories},steps={n_steps}]"] = (
+                size, _time_history_case('linear', n_stories, n_steps, linear_method='modal'))
+            cases[f"time_history.nonlinear[stories={n_stories},steps={n_steps}]"] = (
+                size, _time_history_case('nonlinear', n_stories, n_steps))
+            if NUMBA_AVAILABLE:
+                cases[f"time_history.nonlinear_kernel[stories={n_stories},steps={n_steps}]"] = (
+                    size, _time_history_case('nonlinear', n_stories, n_steps, nonlinear_kernel=True))
+    for n_levels in (10, 30, 100):
+        for fitter in ('irls', 'nelder-mead', 'lbfgsb'):
+            cases[f"fit.{fitter}[levels={n_levels}]"] = (dict(levels=n_levels), _fit_case(fitter, n_levels))
+        cases[f"fit.batch[levels={n_levels},curves=100]"] = (dict(levels=n_levels, curves=100),
+                                                             _fit_case('batch', n_levels, 100))
+    cases["ida.mini[records=4,levels=5,steps=2000]"] = (dict(records=4, levels=5, steps=2000), _mini_ida_case(4, 5, 2000))
+    return cases
+
+# --- Running and comparing ---
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmarks(name_filter: str | None = None, repeat: int = 5, budget_s: float = 2.0) -> dict:
+    """
+    Runs the benchmark cases.
+
+    Args:
+        name_filter (str | None, optional): Only cases whose name contains this text. Defaults to None.
+        repeat (int, optional): Maximum timed runs per case. Defaults to 5.
+        budget_s (float, optional): Time after which no further run of a case is started. Defaults to 2.0.
+
+    Returns:
+        dict: JSON-serializable results: 'version', 'created', 'git_commit', 'environment' and
+              'results' (case name -> 'params', 'min_s', 'median_s', 'repeat').
+    """
+    results = {}
+    with warnings.catch_warnings(): # Fitters warn on degenerate data; timings only
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        for name, (params, setup) in _cases().items():
+            if name_filter is not None and name_filter not in name:
+                continue
+            results[name] = {'params': params, **_time_case(setup(), repeat, budget_s)}
+            print(f"  {name:<58} {1e3 * results[name]['min_s']:10.3f} ms", flush=True)
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+                        'numba': NUMBA_AVAILABLE, 'machine': platform.machine(), 'processor': platform.processor(),
+                        'cpu_count': os.cpu_count()},
+        'results': results,
+    }
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.25) -> list:
+    """
+    Cases whose best time grew by more than threshold (relative) from baseline to current.
+
+    Returns:
+        list: (name, baseline min_s, current min_s, ratio) of every regression, worst first.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            continue
+        ratio = result['min_s'] / old['min_s']
+        if ratio > 1 + threshold:
+            regressions.append((name, old['min_s'], result['min_s'], ratio))
+    return sorted(regressions, key=lambda r: -r[3])
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Fragility pipeline benchmarks.")
+    parser.add_argument("--filter", default=None, help="Only cases whose name contains this text.")
+    parser.add_argument("--repeat", type=int, default=5, help="Maximum timed runs per case.")
+    parser.add_argument("--output", default=None, help="Results JSON file. Defaults to benchmarks/results/<time>.json.")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative slowdown reported as a regression.")
+    args = parser.parse_args(argv)
+
+    print(f"Benchmarks (best of up to {args.repeat} runs)")
+    current = run_benchmarks(args.filter, args.repeat)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold)
+        if regressions:
+            print(f"Regressions (> {args.threshold:.0%} slower than {args.compare}):")
+            for name, old, new, ratio in regressions:
+                print(f"  {name:<58} {1e3 * old:10.3f} -> {1e3 * new:10.3f} ms  ({ratio:4.2f}x)")
+            return 1
+        print(f"No regressions against {args.compare}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
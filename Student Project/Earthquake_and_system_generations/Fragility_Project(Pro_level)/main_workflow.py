@@ -0,0 +1,250 @@
+"""
+End-to-end fragility workflow (Python counterpart of Run_Generate_GMs.m, Run_IDA_Analysis.m and
+Run_Fit_Fragility.m): ground motions -> IDA -> drift extraction -> MLE fit -> plots.
+
+Every stage writes its artifacts to Results/stages/<stage>-<fingerprint>/. The fingerprint hashes
+the stage's own settings and the fingerprints of the stages it reads from, so a stage is skipped
+when its folder is complete, and a settings change only re-runs the stages downstream of it
+(e.g. a damage-state threshold tweak re-runs the fit and the plot only). Stages whose inputs are
+ready run concurrently (the linear and nonlinear IDA). The final parameters and plot are copied to
+Results/fragility_params.npy and Results/FragilityCurves.png.
+
+Run from the project folder:
+    python main_workflow.py
+"""
+import copy
+import hashlib
+import json
+import os
+import shutil
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from Analysis.linear_ida import run_linear_ida
+from Analysis.run_ida import run_ida
+from Analysis.shear_building import define_shear_building
+from Fragility.fit_fragility_batch import fit_fragility_curves_batch
+from GroundMotions.quake_sac2d import quake_sac2d
+from GroundMotions.record_store import append_quake_sac2d, get_record, open_record_store
+
+WORKFLOW_VERSION = 1 # Bump when a stage's code changes its artifacts
+
+# Settings of Run_Generate_GMs.m, Run_IDA_Analysis.m and Run_Fit_Fragility.m. Damage states are
+# limits on the max PIDR, compared with the drift ratio exactly as Run_Fit_Fragility.m does.
+# ida.collapse_drift (optional) stops nonlinear analyses early and must exceed every limit.
+DEFAULT_CONFIG = {
+    'ground_motions': {'quake_set': 'nrfault', 'n_records': 30, 'dt': 0.01, 'f_lo': 0.10, 'f_hi': 10.0, 'seed': 1},
+    'building': {'n_stories': 3},
+    'ida': {'pga_levels': np.round(np.arange(0.05, 1.5001, 0.05), 2).tolist(), 'collapse_drift': None},
+    'damage_states': {'Slight': 0.2, 'Moderate': 0.5, 'Severe': 1.0, 'Collapse': 4.0},
+}
+
+STAGE_FILE = "stage.json" # Written last; marks a complete stage folder
+# Stages that resume from the partial artifacts of an interrupted run; any other incomplete
+# stage folder is cleared before the stage runs again
+RESUMABLE_STAGES = {'ida_nonlinear'} # IDA results store
+
+# --- Stages: fn(out_dir, config, inputs) with inputs = {upstream stage: its folder}; False = nothing produced ---
+
+def _stage_ground_motions(out_dir: str, config: dict, inputs: dict):
+    gm = config['ground_motions']
+    generated = quake_sac2d(gm['quake_set'], gm['n_records'], gm['dt'], seed=gm['seed'], f_lo=gm['f_lo'], f_hi=gm['f_hi'])
+    append_quake_sac2d(os.path.join(out_dir, "records"), generated, gm['quake_set'], gm['dt'], seed=gm['seed'])
+
+def _stage_ida_nonlinear(out_dir: str, config: dict, inputs: dict, n_workers: int | None = None, cache_dir: str | None = None):
+    model = define_shear_building(**config['building'])
+    results = run_ida(os.path.join(inputs['ground_motions'], "records"), config['ida']['pga_levels'], model,
+                      config['ground_motions']['dt'], n_workers=n_workers, run_linear=False,
+                      collapse_drift=config['ida']['collapse_drift'], cache_dir=cache_dir,
+                      results_store=os.path.join(out_dir, "ida_store")) # Resumes an interrupted run
+    np.savez(os.path.join(out_dir, "ida.npz"), PGA_levels=results['PGA_levels'], record_ids=np.array(results['record_ids'], dtype=str),
+             PIDR=results['PIDR_Nonlinear'], converged=results['converged'])
+
+def _stage_ida_linear(out_dir: str, config: dict, inputs: dict):
+    model = define_shear_building(**config['building'])
+    store = open_record_store(os.path.join(inputs['ground_motions'], "records"))
+    records = [get_record(store, rid) for rid in store['index']['record_id']] # Each at its own length
+    results = run_linear_ida(records, config['ida']['pga_levels'], model['M'], model['K_initial'],
+                             config['ground_motions']['dt'], model['H'], model['alpha_M'], model['beta_K'],
+                             K_init=model['K_initial'], pga_orig_g=store['index']['pga_orig_g'])
+    np.savez(os.path.join(out_dir, "ida.npz"), PGA_levels=results['PGA_levels'],
+             record_ids=store['index']['record_id'], PIDR=results['PIDR'])
+
+def _stage_edp(out_dir: str, config: dict, inputs: dict):
+    with np.load(os.path.join(inputs['ida_nonlinear'], "ida.npz")) as nl, \
+         np.load(os.path.join(inputs['ida_linear'], "ida.npz")) as lin:
+        if not np.array_equal(nl['record_ids'], lin['record_ids']): raise ValueError("IDA stages analysed different records.")
+        np.savez(os.path.join(out_dir, "edp.npz"), PGA_levels=nl['PGA_levels'], record_ids=nl['record_ids'],
+                 MIDR_Nonlinear=np.max(nl['PIDR'], axis=-1), MIDR_Linear=np.max(lin['PIDR'], axis=-1),
+                 converged=nl['converged'])
+
+def _exceedance_counts(MIDR: np.ndarray, limits: np.ndarray) -> tuple:
+    """Exceedances and trials (non-NaN drifts) per limit and PGA level (n_limits x n_levels)."""
+    valid = ~np.isnan(MIDR)
+    exceed = valid & (MIDR > np.asarray(limits, dtype=float)[:, np.newaxis, np.newaxis])
+    return np.sum(exceed, axis=1), np.broadcast_to(np.sum(valid, axis=0), (len(limits), MIDR.shape[1]))
+
+def _stage_fit(out_dir: str, config: dict, inputs: dict):
+    with np.load(os.path.join(inputs['edp'], "edp.npz")) as edp:
+        pga_levels, MIDR = edp['PGA_levels'], {'Nonlinear': edp['MIDR_Nonlinear'], 'Linear': edp['MIDR_Linear']}
+    names = list(config['damage_states'])
+    limits = list(config['damage_states'].values())
+    # All damage states of both models in one batched fit: (n_DS x 2 x n_levels)
+    counts = [_exceedance_counts(MIDR[model_type], limits) for model_type in ('Nonlinear', 'Linear')]
+    fit = fit_fragility_curves_batch(pga_levels, np.stack([c[0] for c in counts], axis=1),
+                                     np.stack([c[1] for c in counts], axis=1))
+    params = np.stack((fit['theta'], fit['beta']), axis=-1).reshape(len(names), 4) # [theta_nl, beta_nl, theta_lin, beta_lin]
+    np.save(os.path.join(out_dir, "fragility_params.npy"), params)
+    with open(os.path.join(out_dir, "fragility_params.json"), "w") as f:
+        json.dump({'columns': ['theta_nonlinear', 'beta_nonlinear', 'theta_linear', 'beta_linear'],
+                   'damage_states': names, 'params': params.tolist()}, f, indent=2)
+
+def _stage_plot(out_dir: str, config: dict, inputs: dict):
+    try:
+        import matplotlib
+    except ImportError:
+        warnings.warn("matplotlib is not installed; FragilityCurves.png is not produced.", RuntimeWarning)
+        return False
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from scipy.stats import norm
+
+    params = np.load(os.path.join(inputs['fit'], "fragility_params.npy"))
+    pga_levels = np.asarray(config['ida']['pga_levels'])
+    pga_fine = np.linspace(np.min(pga_levels) * 0.5, np.max(pga_levels) * 1.1, 200)
+    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+
+    fig, ax = plt.subplots(figsize=(9, 5))
+    for i, name in enumerate(config['damage_states']):
+        for j, (model_type, style) in enumerate((('Nonlinear', '-'), ('Linear', '--'))):
+            theta, beta = params[i, 2 * j:2 * j + 2]
+            if np.isfinite(theta) and np.isfinite(beta) and beta > 0:
+                ax.plot(pga_fine, norm.cdf(np.log(pga_fine / theta) / beta), style, color=colors[i % len(colors)],
+                        linewidth=1.5, label=f"{name} ({model_type})")
+    ax.set_xlabel("Peak Ground Acceleration (PGA) (g)")
+    ax.set_ylabel("Probability of Exceedance")
+    ax.set_title("Fragility Curves (Linear vs. Nonlinear)")
+    ax.set_xlim(0, np.max(pga_levels))
+    ax.set_ylim(0, 1)
+    ax.grid(True)
+    ax.legend(loc='center left', bbox_to_anchor=(1.02, 0.5))
+    fig.tight_layout()
+    fig.savefig(os.path.join(out_dir, "FragilityCurves.png"), dpi=150)
+    plt.close(fig)
+
+# name: (upstream stages, settings the stage depends on, function)
+STAGES = {
+    'ground_motions': ((), lambda c: c['ground_motions'], _stage_ground_motions),
+    'ida_nonlinear': (('ground_motions',), lambda c: [c['building'], c['ida']], _stage_ida_nonlinear),
+    'ida_linear': (('ground_motions',), lambda c: [c['building'], c['ida']['pga_levels']], _stage_ida_linear),
+    'edp': (('ida_nonlinear', 'ida_linear'), lambda c: None, _stage_edp),
+    'fit': (('edp',), lambda c: c['damage_states'], _stage_fit),
+    'plot': (('fit',), lambda c: [c['damage_states'], c['ida']['pga_levels']], _stage_plot),
+}
+
+def stage_fingerprints(config: dict) -> dict:
+    """Fingerprint of every stage: hash of its settings, WORKFLOW_VERSION and its upstream fingerprints."""
+    fingerprints = {}
+    for name, (deps, settings, _) in STAGES.items(): # Upstream stages come first
+        payload = {'stage': name, 'version': WORKFLOW_VERSION, 'settings': settings(config),
+                   'inputs': [fingerprints[d] for d in deps]}
+        fingerprints[name] = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+    return fingerprints
+
+def _merge_config(config: dict | None) -> dict:
+    merged = copy.deepcopy(DEFAULT_CONFIG)
+    for section, values in (config or {}).items():
+        if section not in merged: raise ValueError(f"Unknown config section '{section}'.")
+        if section == 'damage_states':
+            merged[section] = dict(values) # Replaces the whole set of damage states
+        else:
+            merged[section].update(values)
+    limits = np.array(list(merged['damage_states'].values()), dtype=float)
+    collapse_drift = merged['ida']['collapse_drift']
+    if collapse_drift is not None and np.any(limits >= collapse_drift):
+        raise ValueError("Damage-state limits must be below ida.collapse_drift (analyses stop there).")
+    return merged
+
+def main(config: dict | None = None,
+         results_dir: str = 'Results',
+         force: bool = False,
+         n_workers: int | None = None,
+         max_parallel_stages: int = 2
+         ) -> dict:
+    """
+    Runs the fragility workflow, skipping stages whose artifacts are up to date.
+
+    Args:
+        config (dict | None, optional): Overrides of DEFAULT_CONFIG by section, e.g.
+                                        {'ground_motions': {'n_records': 100}}. Defaults to None.
+        results_dir (str, optional): Output folder. Defaults to 'Results'.
+        force (bool, optional): Re-run every stage. Defaults to False.
+        n_workers (int | None, optional): Worker processes of the nonlinear IDA. Defaults to os.cpu_count().
+        max_parallel_stages (int, optional): Stages run concurrently. Defaults to 2.
+
+    Returns:
+        dict: A dictionary containing results:
+            'fragility_params' (np.ndarray): [theta_nl, beta_nl, theta_lin, beta_lin] per damage state.
+            'damage_states' (list): Damage state names.
+            'stage_dirs' (dict): Artifact folder of every stage.
+            'ran' (list): Stages that were (re-)run.
+    """
+    config = _merge_config(config)
+    fingerprints = stage_fingerprints(config)
+    stage_dirs = {name: os.path.join(results_dir, "stages", f"{name}-{fp}") for name, fp in fingerprints.items()}
+    cache_dir = os.path.join(results_dir, "cache")
+
+    def run_stage(name):
+        deps, _, func = STAGES[name]
+        out_dir = stage_dirs[name]
+        if os.path.exists(os.path.join(out_dir, STAGE_FILE)) and not force:
+            print(f"Stage {name}: up to date ({os.path.basename(out_dir)})")
+            return False
+        if os.path.exists(out_dir) and (force or name not in RESUMABLE_STAGES):
+            shutil.rmtree(out_dir) # Partial artifacts, e.g. a half-written record store
+        os.makedirs(out_dir, exist_ok=True)
+        print(f"Stage {name}: running...")
+        start = time.perf_counter()
+        kwargs = {'n_workers': n_workers, 'cache_dir': cache_dir} if name == 'ida_nonlinear' else {}
+        if func(out_dir, config, {d: stage_dirs[d] for d in deps}, **kwargs) is False:
+            return False
+        elapsed = time.perf_counter() - start
+        with open(os.path.join(out_dir, STAGE_FILE), "w") as f:
+            json.dump({'stage': name, 'fingerprint': fingerprints[name], 'elapsed_s': elapsed,
+                       'inputs': {d: fingerprints[d] for d in deps}, 'config': config}, f, indent=2)
+        print(f"Stage {name}: done in {elapsed:.1f} s")
+        return True
+
+    # --- Run the stage graph, starting every stage whose inputs are complete ---
+    ran, done, running = [], set(), {}
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel_stages)) as pool:
+        while len(done) < len(STAGES):
+            for name, (deps, _, _) in STAGES.items():
+                if name not in done and name not in running.values() and all(d in done for d in deps):
+                    running[pool.submit(run_stage, name)] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.result():
+                    ran.append(name)
+                done.add(name)
+
+    # --- Final artifacts where the notebook expects them ---
+    params = np.load(os.path.join(stage_dirs['fit'], "fragility_params.npy"))
+    np.save(os.path.join(results_dir, "fragility_params.npy"), params)
+    plot_path = os.path.join(stage_dirs['plot'], "FragilityCurves.png")
+    if os.path.exists(plot_path):
+        shutil.copyfile(plot_path, os.path.join(results_dir, "FragilityCurves.png"))
+
+    names = list(config['damage_states'])
+    print("\nFragility parameters (theta in g):")
+    for name, (theta_nl, beta_nl, theta_lin, beta_lin) in zip(names, params):
+        print(f"  {name:<10} Nonlinear: theta = {theta_nl:.4f}, beta = {beta_nl:.4f} | "
+              f"Linear: theta = {theta_lin:.4f}, beta = {beta_lin:.4f}")
+    return {'fragility_params': params, 'damage_states': names, 'stage_dirs': stage_dirs, 'ran': ran}
+
+if __name__ == '__main__':
+    main()
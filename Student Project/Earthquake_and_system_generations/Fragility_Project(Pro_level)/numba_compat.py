@@ -0,0 +1,16 @@
+"""
+Optional Numba: njit and NUMBA_AVAILABLE for the compiled kernels of Analysis and Fragility.
+
+Without Numba, njit is a no-op decorator and the kernels run as plain Python.
+"""
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
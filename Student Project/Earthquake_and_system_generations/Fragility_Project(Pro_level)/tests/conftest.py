@@ -0,0 +1,34 @@
+"""
+Shared fixtures of the test suite.
+
+Run from the project folder:
+    python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Analysis.shear_building import define_shear_building
+from benchmarks._common import synthetic_records as _synthetic_records
+
+DT = 0.01
+
+def synthetic_records(n_records: int, n_steps: int, pga_g: float = 0.8, seed: int = 0) -> np.ndarray:
+    """Enveloped white-noise accelerations (g) at DT, scaled to pga_g (strong enough to yield the default building)."""
+    return _synthetic_records(n_records, n_steps, DT, pga_g, seed)
+
+@pytest.fixture
+def building():
+    return define_shear_building(3)
+
+@pytest.fixture
+def record():
+    return synthetic_records(1, 1000)[0]
+
+@pytest.fixture
+def records():
+    return synthetic_records(3, 1000, seed=1)
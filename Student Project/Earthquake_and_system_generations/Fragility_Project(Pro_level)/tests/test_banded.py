@@ -0,0 +1,21 @@
+import numpy as np
+
+from Analysis.banded import sym_tridiagonal_matvec, solve_sym_tridiagonal, tridiagonal_bands
+from Analysis.shear_building import define_shear_building
+
+def test_bands_matvec_and_solve_match_dense():
+    K = define_shear_building(40)['K_initial']
+    diag, off = tridiagonal_bands(K, "K")
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((5, 40))
+    np.testing.assert_allclose(sym_tridiagonal_matvec(diag, off, x), x @ K.T, rtol=1e-12, atol=1e-9)
+    np.testing.assert_allclose(solve_sym_tridiagonal(diag, off, x), np.linalg.solve(K, x.T).T, rtol=1e-9)
+
+def test_batched_solve_with_per_row_matrices():
+    rng = np.random.default_rng(1)
+    diag = rng.uniform(4.0, 5.0, (6, 20)) # Diagonally dominant
+    off = rng.uniform(-1.0, 1.0, (6, 19))
+    rhs = rng.standard_normal((6, 20))
+    x = solve_sym_tridiagonal(diag, off, rhs)
+    dense = [np.diag(d) + np.diag(o, 1) + np.diag(o, -1) for d, o in zip(diag, off)]
+    np.testing.assert_allclose(np.stack([A @ xi for A, xi in zip(dense, x)]), rhs, atol=1e-12)
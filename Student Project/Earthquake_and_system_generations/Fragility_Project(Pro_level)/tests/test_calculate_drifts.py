@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from Analysis.calculate_drifts import calculate_drifts, cumulative_plastic_drift
+from Analysis.hysteresis import G_ACCEL
+from Analysis.run_time_history import run_time_history
+from conftest import DT
+
+# One story with k = 1000 N/m, Fy = 10 N (delta_y = 0.01 m) and alpha = 0.05: on the backbone at
+# 0.03 m the force is 10 + 50 * 0.02 = 11 N, so a 0.03 m increment ending there is 0.03 - 11/1000
+# = 0.019 m plastic.
+ONE_STORY = {'k_story': np.array([1000.0]), 'Fy': np.array([10.0]), 'alpha': 0.05}
+
+def _inline_drift_ratios(disp, H):
+    """PIDR and RIDR as computed inline before calculate_drifts (disp @ T_mat.T / H)."""
+    num_dof = disp.shape[-1]
+    T_mat = np.eye(num_dof) - np.eye(num_dof, k=-1)
+    ratios = disp @ T_mat.T / H
+    return np.max(np.abs(ratios), axis=-2), np.abs(ratios[..., -1, :])
+
+def _newmark_accel(disp, accel_gm, dt):
+    """Relative accelerations of the average acceleration Newmark solver, recovered from its displacements."""
+    a0, a1, a2, a7 = 4 / dt**2, 4 / dt, 1.0, 2 / dt
+    v = np.zeros(disp.shape[-1])
+    a = np.empty_like(disp)
+    a[0] = -accel_gm[0]
+    for j in range(len(disp) - 1):
+        du = disp[j + 1] - disp[j]
+        a[j + 1] = a0 * du - a1 * v - a2 * a[j]
+        v = a7 * du - v # a8 = 1, a9 = 0
+    return a
+
+def test_drift_ratios_match_inline(building, records):
+    disp = np.stack([run_time_history('linear', building['M'], building['K_initial'], DT, rec, building['H'],
+                                      building['alpha_M'], building['beta_K'], K_init=building['K_initial'])['disp']
+                     for rec in records])
+    edp = calculate_drifts(disp, building['H'])
+    PIDR, RIDR = _inline_drift_ratios(disp, building['H'])
+    np.testing.assert_allclose(edp['PIDR'], PIDR, rtol=1e-12)
+    np.testing.assert_allclose(edp['RIDR'], RIDR, rtol=1e-12)
+    np.testing.assert_allclose(edp['maxPIDR'], PIDR.max(axis=-1), rtol=1e-12)
+
+def test_drift_ratios_stop_at_nan_tail(building, records):
+    disp = np.cumsum(np.random.default_rng(0).standard_normal((2, 50, 3)), axis=1) * 1e-3
+    stopped = disp.copy()
+    stopped[1, 30:] = np.nan # Second record stopped early
+    edp = calculate_drifts(stopped, building['H'])
+    PIDR, RIDR = _inline_drift_ratios(disp[1, :30], building['H'])
+    np.testing.assert_allclose(edp['PIDR'][1], PIDR, rtol=1e-12)
+    np.testing.assert_allclose(edp['RIDR'][1], RIDR, rtol=1e-12)
+
+def test_cumulative_plastic_drift_bilinear_loop():
+    # 0 -> 0.03 (backbone, 11 N) -> 0 (back to 0 N) -> -0.03 (backbone, -11 N) -> 0: every branch
+    # is a 0.03 m increment with a 0.011 m elastic part, 4 * 0.019 m in total.
+    drifts = np.array([0.0, 0.03, 0.0, -0.03, 0.0])[:, np.newaxis]
+    assert cumulative_plastic_drift(drifts, ONE_STORY) == pytest.approx([0.076])
+
+def test_cumulative_plastic_drift_ignores_nan_tail():
+    drifts = np.linspace(0.0, 0.03, 31)[:, np.newaxis]
+    stopped = np.vstack([drifts, np.full((3, 1), np.nan)])
+    assert cumulative_plastic_drift(drifts, ONE_STORY) == pytest.approx([0.019])
+    assert cumulative_plastic_drift(stopped, ONE_STORY) == pytest.approx([0.019])
+
+def test_cumulative_plastic_drift_zero_when_elastic(building, record):
+    out = run_time_history('linear', building['M'], building['K_initial'], DT, 0.01 * record, building['H'],
+                           building['alpha_M'], building['beta_K'], K_init=building['K_initial'])
+    edp = calculate_drifts(out['disp'], building['H'], model=building)
+    np.testing.assert_allclose(edp['CPDR'], 0.0, atol=1e-15)
+
+def test_peak_floor_acceleration_against_solver(building, record):
+    out = run_time_history('nonlinear', building['M'], building['Fy'], DT, record, building['H'],
+                           building['alpha_M'], building['beta_K'], K_init=building['K_initial'], alpha=building['alpha'])
+    accel_gm = record * G_ACCEL
+    accel = _newmark_accel(out['disp'], accel_gm, DT)
+    PFA_solver = np.max(np.abs(accel / G_ACCEL + record[:, np.newaxis]), axis=0)
+    np.testing.assert_allclose(out['PFA'], PFA_solver, rtol=1e-9) # Tracked from the solver's own accelerations
+    edp = calculate_drifts(out['disp'], building['H'], dt=DT, accel_gm_g=record)
+
+    # The second difference of u is the solver's acceleration smoothed over one step,
+    # (a[n-1] + 2 a[n] + a[n+1]) / 4. A weighted mean never exceeds the peak, so PFA is a lower
+    # bound; on this white-noise input (dt = 0.01 s, yielding) it is 0.2-2% low per floor, and
+    # smoother recorded motions differ less.
+    diff_2 = np.diff(out['disp'], 2, axis=0) / DT**2
+    np.testing.assert_allclose(diff_2, (accel[:-2] + 2 * accel[1:-1] + accel[2:]) / 4, atol=1e-9 * np.max(np.abs(accel)))
+    assert np.all(edp['PFA'] <= PFA_solver * (1 + 1e-12))
+    np.testing.assert_allclose(edp['PFA'], PFA_solver, rtol=0.03)
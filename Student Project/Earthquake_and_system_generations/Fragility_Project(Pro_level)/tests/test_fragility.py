@@ -0,0 +1,90 @@
+import numpy as np
+from scipy.stats import norm
+
+from benchmarks._common import synthetic_counts
+from Fragility.bootstrap_fragility import bootstrap_fragility
+from Fragility.fit_fragility_batch import fit_fragility_curves_batch
+from Fragility.fit_fragility_censored import fit_fragility_censored, record_capacities
+from Fragility.fit_fragility_curve_MLE import fit_fragility_curve_MLE
+from Fragility.fragility_lookup import evaluate_fragility, fragility_table
+from Fragility.sample_damage_states import sample_damage_states
+
+THETA, BETA = 0.6, 0.4
+
+def _linear_edp(n_records, im_levels, limit=0.01, seed=0):
+    """EDP growing in proportion to IM and reaching limit at lognormal capacities (THETA, BETA)."""
+    capacity = THETA * np.exp(BETA * np.random.default_rng(seed).standard_normal(n_records))
+    return limit * im_levels / capacity[:, np.newaxis], capacity
+
+def test_irls_matches_batch_and_nelder_mead():
+    im_levels, num_exceed, num_trials = synthetic_counts(12, 20)
+    batch = fit_fragility_curves_batch(im_levels, num_exceed, num_trials)
+    for i in range(len(num_exceed)):
+        theta, beta, success, result = fit_fragility_curve_MLE(im_levels, num_exceed[i], num_trials[i])
+        assert success and result.message == "IRLS converged."
+        np.testing.assert_allclose([theta, beta], [batch['theta'][i], batch['beta'][i]], rtol=1e-8)
+        nm_theta, nm_beta, _, _ = fit_fragility_curve_MLE(im_levels, num_exceed[i], num_trials[i], method='nelder-mead')
+        np.testing.assert_allclose([theta, beta], [nm_theta, nm_beta], rtol=1e-3)
+
+def test_censored_fit_recovers_capacity_distribution():
+    im_levels = np.linspace(0.3, 1.2, 10)
+    EDP, capacity = _linear_edp(4000, im_levels)
+    EDP[::7, :2] = np.nan # Records whose hunt started higher up
+    capacities, censor_im, left_censor_im = record_capacities(EDP, im_levels, [0.01])
+    right, left = capacity > im_levels[-1], capacity <= im_levels[0]
+    left[::7] = capacity[::7] <= im_levels[2]
+    assert np.array_equal(np.isposinf(capacities[0]), right) and np.array_equal(np.isneginf(capacities[0]), left)
+    inside = ~right & ~left
+    np.testing.assert_allclose(capacities[0, inside], capacity[inside], rtol=1e-12) # Exact for linear EDP
+    np.testing.assert_allclose(left_censor_im[::7], im_levels[2])
+
+    fit = fit_fragility_censored(capacities, censor_im, left_censor_im)
+    assert fit['success'][0] and fit['n_censored'][0] == right.sum() and fit['n_left_censored'][0] == left.sum()
+    exact = fit_fragility_censored(capacity)
+    np.testing.assert_allclose([fit['theta'][0], fit['beta'][0]], [THETA, BETA], rtol=0.04)
+    np.testing.assert_allclose([fit['theta'][0], fit['beta'][0]], [exact['theta'], exact['beta']], rtol=0.03)
+    # Taking the left-censored records at the first level as exact capacities biases the fit upwards
+    naive = fit_fragility_censored(np.where(left, left_censor_im, capacities[0]), censor_im)
+    assert naive['theta'] > fit['theta'][0] and naive['beta'] < fit['beta'][0]
+
+def test_bootstrap_band_covers_the_true_curve():
+    im_levels = np.linspace(0.1, 1.5, 15)
+    EDP, _ = _linear_edp(200, im_levels, seed=3)
+    out = bootstrap_fragility(EDP, im_levels, 0.01, n_boot=300, seed=0)
+    assert np.all(out['n_valid'] == 300)
+    assert out['theta_band'][0, 0] < THETA < out['theta_band'][1, 0]
+    assert out['beta_band'][0, 0] < BETA < out['beta_band'][1, 0]
+    assert out['theta_band'][0, 0] < out['theta'][0] < out['theta_band'][1, 0]
+    assert np.all(out['curve_band'][0] <= out['curve'] + 1e-12) and np.all(out['curve'] <= out['curve_band'][1] + 1e-12)
+    again = bootstrap_fragility(EDP, im_levels, 0.01, n_boot=300, seed=0, chunk_size=64)
+    np.testing.assert_array_equal(again['theta_samples'], out['theta_samples']) # Seeded: same replicates
+
+def test_fragility_lookup_within_tol():
+    theta, beta = np.array([0.2, 0.6, 1.5]), np.array([0.25, 0.4, 0.7])
+    im = np.concatenate([np.geomspace(1e-3, 20, 997), [0.0, -1.0, np.nan]])
+    for tol in (1e-3, 1e-6):
+        table = fragility_table(theta, beta, tol=tol)
+        exact = norm.cdf(np.log(im[:-3] / theta[:, np.newaxis]) / beta[:, np.newaxis])
+        outer = evaluate_fragility(table, im)
+        assert outer.shape == (3, im.size) and np.max(np.abs(outer[:, :-3] - exact)) <= tol
+        assert np.all(outer[:, -3:-1] <= tol / 2) and np.all(np.isnan(outer[:, -1]))
+        curves = np.arange(im.size) % 3
+        paired = evaluate_fragility(table, im, curves)
+        np.testing.assert_array_equal(paired, outer[curves, np.arange(im.size)])
+
+def test_damage_state_frequencies_match_curves():
+    theta = np.array([[0.3, 0.6, 1.2], [0.5, 0.8, 1.0]])
+    beta = np.array([[0.4, 0.4, 0.5], [0.3, 0.6, 0.3]])
+    im = np.array([0.7, 0.9])
+    n = 200000
+    out = sample_damage_states(theta, beta, np.broadcast_to(im, (n, 2)), seed=1, chunk_size=30000)
+    P = np.minimum.accumulate(norm.cdf(np.log(im[:, np.newaxis] / theta) / beta), axis=1)
+    expected = -np.diff(np.hstack([np.ones((2, 1)), P, np.zeros((2, 1))]), axis=1)
+    freq = out['counts'] / n
+    assert np.all(np.abs(freq - expected) < 5 * np.sqrt(expected * (1 - expected) / n) + 1e-12)
+    for f in range(2):
+        np.testing.assert_array_equal(np.bincount(out['damage_states'][:, f], minlength=4), out['counts'][f])
+    # The draws do not depend on the chunking
+    again = sample_damage_states(theta, beta, lambda start, stop: np.broadcast_to(im, (stop - start, 2)),
+                                 n_scenarios=n, seed=1, chunk_size=7777)
+    np.testing.assert_array_equal(again['damage_states'], out['damage_states'])
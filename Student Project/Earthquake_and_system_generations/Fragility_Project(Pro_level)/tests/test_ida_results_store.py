@@ -0,0 +1,91 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from Analysis import run_ida as run_ida_module
+from Analysis.ida_results_store import MANIFEST_FILE, ida_matrix, read_ida_results
+from Analysis.run_ida import run_ida
+from conftest import DT, synthetic_records
+
+PGA_LEVELS = np.array([0.2, 0.6, 1.0])
+
+def _points(path, model_type):
+    rows = read_ida_results(path, ('record_id', 'pga'), model_type=model_type)
+    return list(zip(rows['record_id'].tolist(), rows['pga'].tolist()))
+
+def test_store_holds_results_and_nr_counters(tmp_path, building, records):
+    store = str(tmp_path / "store")
+    results = run_ida(records, PGA_LEVELS, building, DT, n_workers=1, results_store=store)
+    assert len(np.load(os.path.join(store, MANIFEST_FILE))) == len(records) + 1 # One chunk per record, one linear
+    for column in ('PIDR', 'converged', 'failed_steps', 'nr_iterations'):
+        stored = ida_matrix(store, 'nonlinear', column)
+        np.testing.assert_array_equal(stored[column], results[column if column != 'PIDR' else 'PIDR_Nonlinear'])
+    assert np.all(results['nr_iterations'] > 0)
+    assert np.all(ida_matrix(store, 'linear', 'nr_iterations')['nr_iterations'] == 0)
+
+def test_records_are_stored_as_they_finish(tmp_path, building, monkeypatch):
+    # Without a store five records would run in chunks of two; with it each is stored on its own
+    records = synthetic_records(5, 1000, seed=3)
+    store = str(tmp_path / "store")
+    reference = run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False)
+    analyse = run_ida_module._nonlinear_ida_record
+    calls = []
+    def counted(*args, crash_at=None, **kwargs):
+        calls.append(1)
+        if len(calls) == crash_at: raise RuntimeError("worker lost")
+        return analyse(*args, **kwargs)
+    monkeypatch.setattr(run_ida_module, '_nonlinear_ida_record', lambda *a, **k: counted(*a, crash_at=2, **k))
+    with pytest.raises(RuntimeError):
+        run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False, results_store=store)
+    assert ida_matrix(store, 'nonlinear')['record_ids'] == ['0']
+
+    calls.clear() # The rerun only analyses the lost records
+    monkeypatch.setattr(run_ida_module, '_nonlinear_ida_record', counted)
+    resumed = run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False, results_store=store)
+    assert len(calls) == len(records) - 1
+    for column in ('PIDR_Nonlinear', 'nr_iterations'):
+        np.testing.assert_array_equal(resumed[column], reference[column])
+
+def test_linear_points_keyed_on_record_and_level(tmp_path, building, records):
+    store = str(tmp_path / "store")
+    run_ida(records, PGA_LEVELS, building, DT, n_workers=1, results_store=store)
+    new_levels = np.array([0.2, 0.4, 0.6, 1.0, 1.4])
+    results = run_ida(records, new_levels, building, DT, n_workers=1, results_store=store)
+    points = _points(store, 'linear')
+    assert len(points) == len(set(points)) == len(records) * len(new_levels)
+    np.testing.assert_allclose(ida_matrix(store, 'linear')['MIDR'], results['MIDR_Linear'])
+
+def test_chunks_without_counters_read_as_unknown(tmp_path, building, records):
+    store = str(tmp_path / "store")
+    run_ida(records[:1], PGA_LEVELS, building, DT, n_workers=1, run_linear=False, results_store=store)
+    shutil.rmtree(os.path.join(store, 'nr_iterations')) # As written before the column existed
+    assert np.all(read_ida_results(store, ('nr_iterations',))['nr_iterations'] == -1)
+    assert np.all(ida_matrix(store, 'nonlinear', 'nr_iterations')['nr_iterations'] == -1)
+
+def test_store_of_other_inputs_is_rejected(tmp_path, building, records):
+    store = str(tmp_path / "store")
+    run_ida(records, PGA_LEVELS, building, DT, n_workers=1, results_store=store)
+    weaker = dict(building, Fy=0.8 * building['Fy'])
+    with pytest.raises(ValueError, match="another model"):
+        run_ida(records, PGA_LEVELS, weaker, DT, n_workers=1, results_store=store)
+    with pytest.raises(ValueError, match="another model"):
+        run_ida(records, PGA_LEVELS, building, DT, n_workers=1, collapse_drift=0.01, results_store=store)
+
+def test_points_without_fingerprint_are_recomputed(tmp_path, building, records, monkeypatch):
+    store = str(tmp_path / "store")
+    reference = run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False, results_store=store)
+    shutil.rmtree(os.path.join(store, 'fingerprint')) # As written before the column existed
+    analyse = run_ida_module._nonlinear_ida_record
+    calls = []
+    def counted(*args, **kwargs):
+        calls.append(1)
+        return analyse(*args, **kwargs)
+    monkeypatch.setattr(run_ida_module, '_nonlinear_ida_record', counted)
+    rerun = run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False, results_store=store)
+    assert len(calls) == len(records)
+    np.testing.assert_array_equal(rerun['PIDR_Nonlinear'], reference['PIDR_Nonlinear'])
+    calls.clear() # Now stored with their fingerprints
+    run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False, results_store=store)
+    assert calls == []
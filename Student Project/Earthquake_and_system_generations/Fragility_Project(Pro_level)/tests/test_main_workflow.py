@@ -0,0 +1,40 @@
+import os
+import warnings
+
+import pytest
+
+from main_workflow import STAGE_FILE, main
+
+SMALL_CONFIG = {'ground_motions': {'n_records': 3}, 'ida': {'pga_levels': [0.2, 0.6, 1.0]}}
+
+def _run(results_dir):
+    with warnings.catch_warnings(): # Three records give degenerate fits
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return main(SMALL_CONFIG, results_dir=results_dir, n_workers=1)
+
+@pytest.fixture
+def completed_run(tmp_path):
+    results_dir = str(tmp_path / "Results")
+    return results_dir, _run(results_dir)
+
+def test_second_run_skips_every_stage(completed_run):
+    results_dir, _ = completed_run
+    assert _run(results_dir)['ran'] == []
+
+def test_interrupted_stage_is_cleared_and_rerun(completed_run):
+    # An interrupted ground_motions stage leaves a record store behind but no stage file;
+    # appending the same records to it again would fail on duplicate record ids
+    results_dir, first = completed_run
+    gm_dir = first['stage_dirs']['ground_motions']
+    os.remove(os.path.join(gm_dir, STAGE_FILE))
+    open(os.path.join(gm_dir, "partial"), "w").close()
+    assert _run(results_dir)['ran'] == ['ground_motions']
+    assert not os.path.exists(os.path.join(gm_dir, "partial"))
+
+def test_interrupted_nonlinear_ida_keeps_its_results_store(completed_run):
+    results_dir, first = completed_run
+    ida_dir = first['stage_dirs']['ida_nonlinear']
+    os.remove(os.path.join(ida_dir, STAGE_FILE))
+    open(os.path.join(ida_dir, "partial"), "w").close()
+    assert _run(results_dir)['ran'] == ['ida_nonlinear']
+    assert os.path.exists(os.path.join(ida_dir, "partial"))
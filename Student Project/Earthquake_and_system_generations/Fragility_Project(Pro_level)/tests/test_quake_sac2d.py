@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from GroundMotions.quake_sac2d import QUAKE_SETS, _record_rngs, ftdsp, quake_sac2d, sac_stats2d
+
+DT = 0.01
+LONG_RECORD = 1471 # Record of ('nrfault', seed=3) whose long pulse stretches it to 11422 steps
+
+def test_records_do_not_depend_on_the_batch():
+    batch = quake_sac2d('nrfault', 3, seed=3, first_record=LONG_RECORD - 1, chunk_size=2)
+    assert batch['n_steps'][1] > batch['n_steps'][0]
+    for i in range(3):
+        alone = quake_sac2d('nrfault', 1, seed=3, first_record=LONG_RECORD - 1 + i)
+        n = alone['n_steps'][0]
+        np.testing.assert_allclose(alone['X'][0], batch['X'][i], rtol=1e-14)
+        np.testing.assert_allclose(batch['quake_data'][i, :n], alone['quake_data'][0],
+                                   rtol=0, atol=1e-12 * np.max(np.abs(alone['quake_data'][0])))
+        tail = batch['quake_data'][i, n:]
+        assert np.all(tail[:, [0, 1, 3, 4]] == 0) # Padding: at rest, displaced where the record ended
+        assert np.all(tail[:, [2, 5]] == batch['quake_data'][i, n - 1, [2, 5]])
+
+def test_ftdsp_differentiates_and_integrates_in_band():
+    t = np.arange(3000) * DT
+    w = 2 * np.pi * 1.3
+    u = np.sin(w * t)
+    inner = slice(300, 2700) # Away from the cosine windows
+    velocity = ftdsp(u, -1, 0.2, 10.0, 1 / DT)
+    np.testing.assert_allclose(velocity[inner] / w, np.cos(w * t[inner]), atol=2e-3)
+    integral = ftdsp(u, 1, 0.2, 10.0, 1 / DT)
+    np.testing.assert_allclose(integral[inner] * w, -np.cos(w * t[inner]), atol=2e-2)
+    below_band = ftdsp(np.sin(2 * np.pi * 0.05 * t), 0, 0.2, 10.0, 1 / DT)
+    assert np.max(np.abs(below_band[inner])) < 2e-2
+
+@pytest.mark.parametrize("quake_set", sorted(QUAKE_SETS))
+def test_sac_stats2d_accepts_only_bounded_parameters(quake_set):
+    N = 3
+    X = sac_stats2d(quake_set, N, 500, _record_rngs(0, 0, 500))
+    stats = QUAKE_SETS[quake_set]
+    Ex, Sx = np.asarray(stats['Ex']), np.asarray(stats['Sx'])
+    limit = Ex + N * Sx
+    assert np.all(X[:, [0, 1, 5, 6]] < limit[[0, 1, 5, 6]])
+    assert np.all(X[:, 2] < Ex[2] + N * Sx[1] + 0.8)
+    # Pulse timing adjustments
+    assert np.all(X[:, 4] >= X[:, 8] + X[:, 2] * X[:, 3] / 2 - 1e-12)
+    assert np.all(X[:, 10] >= X[:, 2] * X[:, 3] - X[:, 8] - 1e-12)
+    # Record i depends on its own generator only
+    np.testing.assert_allclose(X[7], sac_stats2d(quake_set, N, 1, _record_rngs(0, 7, 1))[0], rtol=1e-14)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from Analysis import run_ida as run_ida_module
+from Analysis import run_msa as run_msa_module
+from Analysis.run_ida import _init_store_worker, run_ida
+from Analysis.run_msa import run_msa
+from GroundMotions.record_store import append_records, get_record, open_record_store
+from conftest import DT, synthetic_records
+
+PGA_LEVELS = np.array([0.3, 0.9])
+
+@pytest.fixture
+def store(tmp_path):
+    # Four records, the third shorter; selections below skip the second, so they are not contiguous
+    path = str(tmp_path / "records")
+    records = list(synthetic_records(4, 800, seed=2))
+    records[2] = records[2][:600]
+    append_records(path, records, DT, record_ids=['a', 'b', 'c', 'd'])
+    return path
+
+def test_store_worker_slices_zero_copy_views(store, monkeypatch):
+    monkeypatch.setattr(run_ida_module, '_WORKER', {})
+    index = open_record_store(store)['index']
+    _init_store_worker(store, index['offset'][[0, 2, 3]], index['n_steps'][[0, 2, 3]], {})
+    records = run_ida_module._WORKER['records']
+    assert [len(r) for r in records] == [800, 600, 800]
+    assert not any(r.flags.owndata for r in records)
+    np.testing.assert_array_equal(records[1], get_record(open_record_store(store), 'c'))
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_store_ida_matches_each_record_alone(store, building, n_workers):
+    ids = ['a', 'c', 'd']
+    opened = open_record_store(store)
+    results = run_ida(store, PGA_LEVELS, building, DT, record_ids=ids, n_workers=n_workers, run_linear=False)
+    for row, rid in enumerate(ids):
+        alone = run_ida(np.array(get_record(opened, rid)), PGA_LEVELS, building, DT, n_workers=1, run_linear=False)
+        np.testing.assert_allclose(results['PIDR_Nonlinear'][row], alone['PIDR_Nonlinear'][0], rtol=1e-12)
+
+@pytest.mark.parametrize("n_workers, numba", [(1, True), (2, True), (1, False)])
+def test_store_msa_matches_ida(store, building, n_workers, numba, monkeypatch):
+    if not numba: # Batched path, one batch per record length
+        monkeypatch.setattr(run_msa_module, 'NUMBA_AVAILABLE', False)
+    ids = ['a', 'c', 'd']
+    stripes = [{'pga': pga, 'records': ids} for pga in PGA_LEVELS]
+    msa = run_msa(store, stripes, building, DT, record_ids=ids, n_workers=n_workers)
+    ida = run_ida(store, PGA_LEVELS, building, DT, record_ids=ids, n_workers=1, run_linear=False)
+    for level, PIDR in enumerate(msa['PIDR']):
+        np.testing.assert_allclose(PIDR, ida['PIDR_Nonlinear'][:, level], rtol=1e-12)
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from Analysis import run_ida as run_ida_module
+from Analysis.result_cache import cache_get, cache_put, cached_run_time_history
+from Analysis.run_ida import run_ida
+from conftest import DT
+
+PGA_LEVELS = np.array([0.3, 0.9])
+
+def _entries(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".npz"))
+
+def test_truncated_entry_is_a_miss(tmp_path, building, record):
+    cache_dir = str(tmp_path / "cache")
+    args = dict(M=building['M'], K_or_Fy=building['Fy'], dt=DT, accel_gm_g=record, H=building['H'],
+                alpha_M=building['alpha_M'], beta_K=building['beta_K'], K_init=building['K_initial'],
+                alpha=building['alpha'])
+    first = cached_run_time_history(cache_dir, 'nonlinear', **args)
+    (entry,) = _entries(cache_dir)
+    path = os.path.join(cache_dir, entry)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert cache_get(cache_dir, entry[:-len(".npz")]) is None
+    again = cached_run_time_history(cache_dir, 'nonlinear', **args)
+    assert not again['cache_hit']
+    np.testing.assert_array_equal(again['PIDR'], first['PIDR'])
+
+def test_garbage_entry_is_a_miss(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    cache_put(cache_dir, "key", {'PIDR': np.ones(3)})
+    with open(os.path.join(cache_dir, "key.npz"), 'wb') as f:
+        f.write(b"not a zip file")
+    assert cache_get(cache_dir, "key") is None
+
+def test_ida_cache_is_keyed_on_the_solver_path(tmp_path, building, records, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    n_analyses = len(records) * len(PGA_LEVELS)
+    run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False, cache_dir=cache_dir)
+    assert len(_entries(cache_dir)) == n_analyses
+
+    # Profiling runs the step loop: it must not be served the kernel's entries, and it adds its own
+    profiled = run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False, cache_dir=cache_dir,
+                       profile=True)
+    assert profiled['profile']['n_analyses'] == n_analyses
+    assert len(_entries(cache_dir)) == 2 * n_analyses
+
+    monkeypatch.setattr(run_ida_module, 'NUMBA_AVAILABLE', not run_ida_module.NUMBA_AVAILABLE)
+    run_ida(records, PGA_LEVELS, building, DT, n_workers=1, run_linear=False, cache_dir=cache_dir)
+    assert len(_entries(cache_dir)) == 3 * n_analyses
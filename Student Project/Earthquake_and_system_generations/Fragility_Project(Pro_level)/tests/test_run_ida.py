@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from Analysis import run_ida as run_ida_module
+from Analysis.adaptive_ida import hunt_and_fill_ida
+from Analysis.linear_ida import run_linear_ida
+from Analysis.run_ida import run_ida
+from Analysis.run_time_history import run_time_history
+from GroundMotions.record_store import append_records
+from conftest import DT
+
+PGA_LEVELS = np.array([0.3, 0.9])
+
+@pytest.fixture
+def counted(monkeypatch):
+    """Records the nonlinear IDA of each record run (one entry per record)."""
+    calls = []
+    analyse = run_ida_module._nonlinear_ida_record
+    def count(*args, **kwargs):
+        calls.append(1)
+        return analyse(*args, **kwargs)
+    monkeypatch.setattr(run_ida_module, '_nonlinear_ida_record', count)
+    return calls
+
+def _changed(building, records):
+    weaker = dict(building, Fy=0.8 * building['Fy'])
+    return {
+        'model': dict(model=weaker),
+        'dt': dict(dt=1.1 * DT),
+        'record': dict(records_g=np.roll(records, 1, axis=0)),
+        'pga_orig_g': dict(pga_orig_g=0.5 * np.max(np.abs(records), axis=1)),
+        'collapse_drift': dict(collapse_drift=0.01),
+    }
+
+@pytest.mark.parametrize("change", ['model', 'dt', 'record', 'pga_orig_g', 'collapse_drift'])
+def test_checkpoints_resume_only_the_same_inputs(tmp_path, building, records, counted, change):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    args = dict(records_g=records, pga_levels=PGA_LEVELS, model=building, dt=DT, n_workers=1, run_linear=False)
+    run_ida(checkpoint_dir=checkpoint_dir, **args)
+    counted.clear()
+    run_ida(checkpoint_dir=checkpoint_dir, **args)
+    assert counted == [] # Same inputs: every record is resumed
+
+    changed = dict(args, **_changed(building, records)[change])
+    resumed = run_ida(checkpoint_dir=checkpoint_dir, **changed)
+    assert len(counted) == len(records) # Every checkpoint is stale
+    fresh = run_ida(**changed)
+    np.testing.assert_array_equal(resumed['PIDR_Nonlinear'], fresh['PIDR_Nonlinear'])
+
+def test_worker_pool_matches_in_process(building, records):
+    # The pool starts its workers from a fork server, so they share no state with the caller
+    args = dict(records_g=records, pga_levels=PGA_LEVELS, model=building, dt=DT)
+    pooled = run_ida(n_workers=2, **args)
+    in_process = run_ida(n_workers=1, **args)
+    for key in ('PIDR_Nonlinear', 'MIDR_Linear', 'nr_iterations'):
+        np.testing.assert_array_equal(pooled[key], in_process[key])
+
+def test_linear_ida_keeps_store_record_lengths(tmp_path, building, records):
+    # Resonant sine cut off as the response still grows: zero padding to the longer record would
+    # add free vibration that exceeds every peak of the record itself
+    t = np.arange(300) * DT
+    short = 0.05 * np.sin(2 * np.pi * t / building['T'][0])
+    store = str(tmp_path / "records")
+    append_records(store, [records[0], short], DT)
+    out = run_ida(store, PGA_LEVELS, building, DT, n_workers=1)
+    args = (PGA_LEVELS, building['M'], building['K_initial'], DT, building['H'], building['alpha_M'], building['beta_K'])
+    for i, record in enumerate([records[0], short]):
+        alone = run_linear_ida(record[np.newaxis], *args, K_init=building['K_initial'])
+        np.testing.assert_allclose(out['MIDR_Linear'][i], alone['MIDR_Linear'][0], rtol=1e-12)
+
+def test_linear_ida_scales_one_analysis(building, records):
+    args = (building['M'], building['K_initial'], DT)
+    out = run_linear_ida(records, PGA_LEVELS, *args, building['H'], building['alpha_M'], building['beta_K'],
+                         K_init=building['K_initial'])
+    for i, record in enumerate(records):
+        scaled = record * PGA_LEVELS[1] / np.max(np.abs(record))
+        direct = run_time_history('linear', *args, scaled, building['H'], building['alpha_M'], building['beta_K'],
+                                  K_init=building['K_initial'])
+        np.testing.assert_allclose(out['PIDR'][i, 1], direct['PIDR'], rtol=1e-8)
+    np.testing.assert_allclose(out['PIDR'][:, 1] / out['PIDR'][:, 0], PGA_LEVELS[1] / PGA_LEVELS[0], rtol=1e-12)
+
+def test_adaptive_ida_finds_elastic_crossings(building, records):
+    # Below yield (drift 0.005) the drift is linear in PGA, so each crossing is the linear IDA's,
+    # including one below the first hunted level (interpolated from rest at PGA 0)
+    drift_per_g = run_linear_ida(records[:1], np.array([1.0]), building['M'], building['K_initial'], DT, building['H'],
+                                 building['alpha_M'], building['beta_K'], K_init=building['K_initial'])['MIDR_Linear'][0, 0]
+    thresholds = np.array([0.2, 1.3, 2.0]) * drift_per_g * 0.05 # The hunt starts at PGA 0.05
+    out = hunt_and_fill_ida(records[0], building, DT, thresholds, collapse_drift=0.05)
+    np.testing.assert_allclose(out['threshold_pga'], thresholds / drift_per_g, rtol=1e-6)
+    for threshold, (lo, hi) in zip(thresholds, out['threshold_bracket']):
+        assert lo < threshold / drift_per_g <= hi
+    assert out['threshold_bracket'][0, 0] == 0.0
+    assert out['n_runs'] <= 12 and np.isfinite(out['collapse_pga']) and out['collapse_pga'] > out['threshold_pga'][-1]
+    drifts = dict(zip(out['pga'], out['maxPIDR']))
+    assert drifts[max(p for p in out['pga'] if p < out['collapse_pga'])] < 0.05 and np.isinf(drifts[out['collapse_pga']])
@@ -0,0 +1,230 @@
+import numpy as np
+import pytest
+from scipy.signal import lsim
+
+from Analysis import nonlinear_kernel
+from Analysis.hysteresis import G_ACCEL
+from Analysis.run_time_history import _prepare_model, merge_profiles, run_time_history, run_time_history_batch
+from Analysis.shear_building import define_shear_building
+from conftest import DT
+from numba_compat import NUMBA_AVAILABLE
+
+# Paths documented as giving the same results as the serial step loop agree to rounding (~1e-12
+# of the peak displacement); RTOL leaves room for platform differences only.
+RTOL = 1e-9
+
+def _linear_args(model, K=None):
+    return dict(M=model['M'], K_or_Fy=model['K_initial'] if K is None else K, dt=DT, H=model['H'],
+                alpha_M=model['alpha_M'], beta_K=model['beta_K'], K_init=model['K_initial'])
+
+def _nonlinear_args(model):
+    return dict(M=model['M'], K_or_Fy=model['Fy'], dt=DT, H=model['H'], alpha_M=model['alpha_M'],
+                beta_K=model['beta_K'], K_init=model['K_initial'], alpha=model['alpha'])
+
+def _serial_disp(model_type, records, **args):
+    return np.stack([run_time_history(model_type, accel_gm_g=rec, **args)['disp'] for rec in records])
+
+def _assert_same_history(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=RTOL * np.max(np.abs(expected)))
+
+# --- Newmark step loop (a8/a9 signs) ---
+def test_linear_newmark_converges_to_continuous_response(building):
+    # Average acceleration Newmark is second-order accurate: at 200 steps per period of a smooth
+    # input it must be close to the exact response of M u'' + C u' + K u = -M 1 a_g.
+    dt = 0.002
+    t = np.arange(3000) * dt
+    accel_g = 0.3 * np.sin(2 * np.pi * 1.0 * t) * np.minimum(t, 1.0)
+    out = run_time_history('linear', **dict(_linear_args(building), dt=dt), accel_gm_g=accel_g)
+
+    n = building['M'].shape[0]
+    M_inv = np.linalg.inv(building['M'])
+    A = np.block([[np.zeros((n, n)), np.eye(n)], [-M_inv @ building['K_initial'], -M_inv @ building['C']]])
+    B = np.vstack([np.zeros((n, 1)), -np.ones((n, 1))])
+    _, u_exact, _ = lsim((A, B, np.hstack([np.eye(n), np.zeros((n, n))]), np.zeros((n, 1))), accel_g * G_ACCEL, t)
+    np.testing.assert_allclose(out['disp'], u_exact, rtol=0, atol=1e-3 * np.max(np.abs(u_exact)))
+
+# --- Batched engine (run_time_history_batch) ---
+def test_batch_linear_matches_serial(building, records):
+    batch = run_time_history_batch('linear', accel_gm_g=records, **_linear_args(building))
+    serial = _serial_disp('linear', records, **_linear_args(building))
+    _assert_same_history(batch['disp'], serial)
+
+def test_batch_nonlinear_matches_serial(building, records):
+    batch = run_time_history_batch('nonlinear', accel_gm_g=records, **_nonlinear_args(building))
+    serial = [run_time_history('nonlinear', accel_gm_g=rec, **_nonlinear_args(building)) for rec in records]
+    assert np.max(batch['PIDR']) > 5 * 0.005 # Well past yield (yield drift ratio 0.005)
+    _assert_same_history(batch['disp'], np.stack([s['disp'] for s in serial]))
+    np.testing.assert_allclose(batch['PIDR'], np.stack([s['PIDR'] for s in serial]), rtol=RTOL)
+    assert np.all(batch['converged'])
+
+def test_batch_scale_factors_match_scaled_records(building, record):
+    scale_factors = np.array([0.5, 1.0, 2.0])
+    batch = run_time_history_batch('nonlinear', accel_gm_g=record, scale_factors=scale_factors, **_nonlinear_args(building))
+    serial = _serial_disp('nonlinear', record * scale_factors[:, np.newaxis], **_nonlinear_args(building))
+    _assert_same_history(batch['disp'], serial)
+
+def test_batch_early_termination_matches_serial(building, records):
+    batch = run_time_history_batch('nonlinear', accel_gm_g=records, collapse_drift=0.02, record='peaks',
+                                   **_nonlinear_args(building))
+    for i, rec in enumerate(records):
+        serial = run_time_history('nonlinear', accel_gm_g=rec, collapse_drift=0.02, **_nonlinear_args(building))
+        assert (batch['stop_step'][i] if batch['stop_step'][i] >= 0 else None) == serial['stop_step']
+        np.testing.assert_allclose(batch['PIDR'][i], serial['PIDR'], rtol=RTOL)
+
+# --- Linear recurrence / modal filters (linear_method='modal') ---
+def test_modal_matches_newmark_loop(building, records):
+    serial = _serial_disp('linear', records, **_linear_args(building))
+    _assert_same_history(_serial_disp('linear', records, linear_method='modal', **_linear_args(building)), serial)
+    batch = run_time_history_batch('linear', accel_gm_g=records, linear_method='modal', **_linear_args(building))
+    _assert_same_history(batch['disp'], serial)
+
+def test_modal_non_classical_damping_matches_newmark_loop(building, records):
+    # C from K_init but a different K: not diagonal in the modes of K, so the full-state recurrence is used
+    K = building['K_initial'].copy()
+    K[0, 0] *= 1.3
+    serial = _serial_disp('linear', records, **_linear_args(building, K))
+    _assert_same_history(_serial_disp('linear', records, linear_method='modal', **_linear_args(building, K)), serial)
+
+def test_modal_early_termination_matches_newmark_loop(building, record):
+    args = dict(_linear_args(building), accel_gm_g=3 * record, collapse_drift=0.01)
+    loop = run_time_history('linear', **args)
+    modal = run_time_history('linear', linear_method='modal', **args)
+    assert loop['stop_step'] is not None
+    assert (modal['stop_step'], modal['stop_reason']) == (loop['stop_step'], loop['stop_reason'])
+    _assert_same_history(modal['disp'], loop['disp'])
+
+# --- Compiled nonlinear kernel (nonlinear_kernel=True) ---
+def test_kernel_matches_step_loop(building, records):
+    serial = [run_time_history('nonlinear', accel_gm_g=rec, **_nonlinear_args(building)) for rec in records]
+    kernel = [run_time_history('nonlinear', accel_gm_g=rec, nonlinear_kernel=True, **_nonlinear_args(building)) for rec in records]
+    _assert_same_history(np.stack([k['disp'] for k in kernel]), np.stack([s['disp'] for s in serial]))
+    np.testing.assert_allclose([k['PIDR'] for k in kernel], [s['PIDR'] for s in serial], rtol=RTOL)
+
+def test_kernel_early_termination_and_peaks_match_step_loop(building, record):
+    args = dict(_nonlinear_args(building), accel_gm_g=record, collapse_drift=0.01, record='peaks')
+    loop = run_time_history('nonlinear', **args)
+    kernel = run_time_history('nonlinear', nonlinear_kernel=True, **args)
+    assert loop['stop_step'] is not None
+    assert (kernel['stop_step'], kernel['stop_reason']) == (loop['stop_step'], loop['stop_reason'])
+    np.testing.assert_allclose(kernel['PIDR'], loop['PIDR'], rtol=RTOL)
+
+def test_nr_counters_match_step_loop(building, records):
+    # The kernel and the batch solver count NR iterations as the step loop's solver_stats do
+    serial = [run_time_history('nonlinear', accel_gm_g=rec, **_nonlinear_args(building))['solver_stats'] for rec in records]
+    batch = run_time_history_batch('nonlinear', accel_gm_g=records, record='peaks', **_nonlinear_args(building))
+    prepared = _prepare_model('nonlinear', **{k: v for k, v in _nonlinear_args(building).items() if k != 'H'})
+    kernel = [nonlinear_kernel.run_nonlinear_kernel(prepared, rec * G_ACCEL, building['H'], record_every=0) for rec in records]
+    expected = [s['nr_iterations'].sum() for s in serial]
+    assert min(expected) > len(records[0]) # Yielding steps take more than one iteration
+    assert [k['nr_iterations'] for k in kernel] == expected
+    assert batch['nr_iterations'].tolist() == expected
+    assert [k['n_failed'] for k in kernel] == batch['failed_steps'].tolist() == [s['failed_steps'] for s in serial]
+
+@pytest.mark.skipif(not NUMBA_AVAILABLE, reason="the kernel already runs as plain Python")
+def test_kernel_python_fallback_matches_compiled(building, record, monkeypatch):
+    compiled = run_time_history('nonlinear', accel_gm_g=record, nonlinear_kernel=True, **_nonlinear_args(building))
+    monkeypatch.setattr(nonlinear_kernel, 'nonlinear_newmark_kernel', nonlinear_kernel.nonlinear_newmark_kernel.py_func)
+    fallback = run_time_history('nonlinear', accel_gm_g=record, nonlinear_kernel=True, **_nonlinear_args(building))
+    _assert_same_history(fallback['disp'], compiled['disp'])
+
+# --- Banded storage / Thomas solve (N-story shear buildings) ---
+@pytest.mark.parametrize("n_stories", [10, 30])
+def test_banded_batch_matches_dense_and_serial(n_stories, records):
+    model = define_shear_building(n_stories)
+    args = _nonlinear_args(model)
+    banded = run_time_history_batch('nonlinear', accel_gm_g=records, banded=True, **args)
+    dense = run_time_history_batch('nonlinear', accel_gm_g=records, banded=False, **args)
+    _assert_same_history(banded['disp'], dense['disp'])
+    _assert_same_history(banded['disp'][:1], _serial_disp('nonlinear', records[:1], **args))
+    assert np.max(banded['PIDR']) > 0.005 # Yielded
+
+# --- Adaptive sub-stepping with a cached tangent (adaptive_substeps > 0) ---
+def test_adaptive_matches_step_loop_when_converged(building, records):
+    for rec in records:
+        loop = run_time_history('nonlinear', accel_gm_g=rec, **_nonlinear_args(building))
+        adaptive = run_time_history('nonlinear', accel_gm_g=rec, adaptive_substeps=3, **_nonlinear_args(building))
+        stats = adaptive['solver_stats']
+        assert stats['failed_steps'] == stats['step_rejections'] == 0 and np.all(stats['substeps'] == 1)
+        assert stats['tangent_reuses'] > stats['factorizations'] > 0 # Cached tangent is reused
+        _assert_same_history(adaptive['disp'], loop['disp'])
+
+def test_adaptive_runaway_response(record):
+    # Negative post-yield stiffness under a strong record: the response runs away and NR fails
+    softening = define_shear_building(3, alpha_post_yield=-0.05)
+    args = dict(_nonlinear_args(softening), dt=0.02, accel_gm_g=2.5 * record[::2])
+    with pytest.warns(RuntimeWarning, match="failed to converge"):
+        adaptive = run_time_history('nonlinear', adaptive_substeps=3, **args)
+    stats = adaptive['solver_stats']
+    assert stats['failed_steps'] > 0
+    assert stats['step_rejections'] >= 3 # The first failure is retried at 2, 4 and 8 sub-steps
+    assert stats['substeps'].max() == 8 # Unconverged steps are only accepted at the finest level
+
+    # With a collapse limit both loops stop at the same step, before NR fails
+    loop = run_time_history('nonlinear', collapse_drift=0.1, **args)
+    adaptive = run_time_history('nonlinear', adaptive_substeps=3, collapse_drift=0.1, **args)
+    assert adaptive['stop_reason'] == loop['stop_reason'] == 'collapse'
+    assert adaptive['stop_step'] == loop['stop_step']
+    assert adaptive['solver_stats']['failed_steps'] == 0
+
+# --- Peak floor accelerations ('PFA') ---
+def _pfa(model_type, records, **args):
+    return np.stack([run_time_history(model_type, accel_gm_g=rec, **args)['PFA'] for rec in records])
+
+def test_linear_peak_floor_accelerations_match_newmark_loop(building, records):
+    K = building['K_initial'].copy()
+    K[0, 0] *= 1.3 # Non-classical damping: full-state recurrence
+    for args in (_linear_args(building), _linear_args(building, K)):
+        loop = _pfa('linear', records, **args)
+        np.testing.assert_allclose(_pfa('linear', records, linear_method='modal', **args), loop, rtol=RTOL)
+        for method in ('newmark', 'modal'):
+            batch = run_time_history_batch('linear', accel_gm_g=records, linear_method=method, record='peaks', **args)
+            np.testing.assert_allclose(batch['PFA'], loop, rtol=RTOL)
+            np.testing.assert_allclose(batch['maxPFA'], np.max(loop, axis=1), rtol=RTOL)
+
+def test_nonlinear_peak_floor_accelerations_match_step_loop(building, records):
+    args = _nonlinear_args(building)
+    loop = _pfa('nonlinear', records, **args)
+    np.testing.assert_allclose(_pfa('nonlinear', records, nonlinear_kernel=True, **args), loop, rtol=RTOL)
+    np.testing.assert_allclose(_pfa('nonlinear', records, adaptive_substeps=3, **args), loop, rtol=RTOL)
+    for banded in (True, False):
+        batch = run_time_history_batch('nonlinear', accel_gm_g=records, banded=banded, record='peaks', **args)
+        np.testing.assert_allclose(batch['PFA'], loop, rtol=RTOL)
+
+def test_peak_floor_accelerations_stop_with_the_analysis(building, record):
+    linear = dict(_linear_args(building), collapse_drift=0.01)
+    nonlinear = dict(_nonlinear_args(building), collapse_drift=0.01)
+    loop = run_time_history('linear', accel_gm_g=3 * record, **linear)
+    full = run_time_history('linear', accel_gm_g=3 * record, **_linear_args(building))
+    assert loop['stop_step'] is not None and np.any(loop['PFA'] < full['PFA'])
+    np.testing.assert_allclose(run_time_history('linear', accel_gm_g=3 * record, linear_method='modal', **linear)['PFA'],
+                               loop['PFA'], rtol=RTOL)
+    np.testing.assert_allclose(run_time_history_batch('linear', accel_gm_g=3 * record, linear_method='modal', **linear)['PFA'][0],
+                               loop['PFA'], rtol=RTOL)
+    loop = run_time_history('nonlinear', accel_gm_g=record, **nonlinear)
+    assert loop['stop_step'] is not None
+    np.testing.assert_allclose(run_time_history('nonlinear', accel_gm_g=record, nonlinear_kernel=True, **nonlinear)['PFA'],
+                               loop['PFA'], rtol=RTOL)
+    np.testing.assert_allclose(run_time_history_batch('nonlinear', accel_gm_g=record, **nonlinear)['PFA'][0],
+                               loop['PFA'], rtol=RTOL)
+
+# --- Profiling (profile=True) ---
+@pytest.mark.parametrize("model_type, options", [('linear', {}), ('nonlinear', {}), ('nonlinear', {'adaptive_substeps': 3})])
+def test_profile_times_the_phases_without_changing_results(building, record, model_type, options):
+    args = dict(_linear_args(building) if model_type == 'linear' else _nonlinear_args(building), accel_gm_g=record, **options)
+    plain = run_time_history(model_type, **args)
+    profiled = run_time_history(model_type, profile=True, **args)
+    np.testing.assert_array_equal(profiled['disp'], plain['disp'])
+    assert 'profile' not in plain
+
+    profile = profiled['profile']
+    timed = [phase for phase, t in profile['phase_time'].items() if t > 0]
+    if model_type == 'linear':
+        assert timed == ['step_setup', 'solve', 'recording']
+    else:
+        assert set(timed) >= {'hysteresis', 'assembly', 'solve', 'checks', 'state_update', 'recording'}
+        assert profile['nr_histogram'].sum() == profile['n_steps'] == len(record) - 1
+    assert sum(profile['phase_time'].values()) <= profile['total_time']
+
+    merged = merge_profiles([profile, None, profile])
+    assert merged['n_analyses'] == 2 and merged['n_steps'] == 2 * profile['n_steps']
+    np.testing.assert_array_equal(merged['nr_histogram'], 2 * profile['nr_histogram'])